@@ -1,13 +1,132 @@
 # audio_processing.py
-import speech_recognition as sr
-import whisper
-import os
-import tempfile
+import gc
+import time
+import threading
 from queue import Queue
-import torch # Para la comprobación de CUDA en la transcripción
 
 # Importar configuraciones
 import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
+import Modulos.result_cache as result_cache
+import Modulos.capture_buffer as capture_buffer
+import Modulos.vad as vad
+import Modulos.transcription_backends as transcription_backends
+import Modulos.metrics as metrics
+
+# Dependencias pesadas: se importan la primera vez que se usan, no al arrancar
+sr = lazy_modules.lazy_import("speech_recognition")
+whisper = lazy_modules.lazy_import("whisper")
+np = lazy_modules.lazy_import("numpy")
+torch = lazy_modules.lazy_import("torch")  # Para la comprobación de CUDA en la transcripción
+torchaudio = lazy_modules.lazy_import("torchaudio")  # Remuestreo en memoria del audio del micrófono
+
+# whisper.audio.SAMPLE_RATE, sin importar whisper (el backend simulado del benchmark no lo necesita)
+WHISPER_SAMPLE_RATE = 16000
+
+# --- Caché de modelos Whisper ---
+# Clave: (nombre_modelo, backend) -> {"model": ..., "last_used": ...}
+_whisper_models = {}
+_whisper_models_lock = threading.Lock()
+# Whisper instala hooks de kv-cache en el modelo durante la decodificación,
+# así que dos transcripciones no pueden usar el mismo modelo a la vez.
+_whisper_inference_lock = threading.Lock()
+_idle_monitor_thread = None
+# Modelo elegido con WHISPER_MODEL_NAME = "auto", por backend (se decide una vez por proceso)
+_auto_model_names = {}
+_auto_model_lock = threading.Lock()
+
+
+def resolve_whisper_settings(model_name=None, backend_name=None):
+    """Devuelve la clave (nombre del modelo, backend) con la que se cachea un modelo."""
+    backend = transcription_backends.get_backend(backend_name)
+    model_name = model_name or config.WHISPER_MODEL_NAME
+    if model_name == "auto":
+        with _auto_model_lock:
+            if backend.name not in _auto_model_names:
+                _auto_model_names[backend.name] = transcription_backends.select_model(backend)
+                print(f"🧠 Modelo Whisper elegido automáticamente para {backend.name}: "
+                      f"'{_auto_model_names[backend.name]}' (RTF objetivo {config.TRANSCRIPTION_TARGET_RTF}).")
+            model_name = _auto_model_names[backend.name]
+    return model_name, backend.name
+
+
+def get_whisper_model(model_name=None, backend_name=None):
+    """
+    Devuelve el modelo Whisper cacheado para (nombre, backend),
+    cargándolo solo la primera vez en este proceso.
+    """
+    key = resolve_whisper_settings(model_name, backend_name)
+    with _whisper_models_lock:
+        entry = _whisper_models.get(key)
+        if entry is None:
+            name, backend_name = key
+            print(f"⏳ Cargando modelo Whisper '{name}' ({backend_name})...")
+            start = time.perf_counter()
+            model = transcription_backends.get_backend(backend_name).load(name)
+            print(f"✅ Modelo Whisper '{name}' cargado en {time.perf_counter() - start:.1f} s.")
+            entry = {"model": model, "last_used": time.monotonic()}
+            _whisper_models[key] = entry
+        entry["last_used"] = time.monotonic()
+    _start_idle_monitor()
+    return entry["model"]
+
+
+def _touch_whisper_model(key):
+    """Marca un modelo como usado recientemente (tras terminar una transcripción)."""
+    with _whisper_models_lock:
+        entry = _whisper_models.get(key)
+        if entry is not None:
+            entry["last_used"] = time.monotonic()
+
+
+def unload_idle_whisper_models(max_idle_seconds=None):
+    """
+    Descarga los modelos que llevan más de max_idle_seconds sin usarse.
+    Con max_idle_seconds=0 descarga todos. Devuelve la lista de claves descargadas.
+    """
+    if max_idle_seconds is None:
+        max_idle_seconds = config.WHISPER_MODEL_IDLE_TIMEOUT_SECONDS
+    if max_idle_seconds is None:
+        return []
+
+    now = time.monotonic()
+    with _whisper_models_lock:
+        idle_keys = [key for key, entry in _whisper_models.items()
+                     if now - entry["last_used"] >= max_idle_seconds]
+        for key in idle_keys:
+            del _whisper_models[key]
+
+    if idle_keys:
+        # Una transcripción en curso conserva su propia referencia al modelo,
+        # así que la memoria solo se libera cuando termina.
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        for name, backend_name in idle_keys:
+            print(f"\n💤 Modelo Whisper '{name}' ({backend_name}) descargado por inactividad.")
+    return idle_keys
+
+
+def _idle_monitor_loop():
+    """Hilo de fondo que revisa periódicamente los modelos inactivos."""
+    while True:
+        timeout = config.WHISPER_MODEL_IDLE_TIMEOUT_SECONDS
+        if timeout is None:
+            return
+        time.sleep(max(1.0, min(60.0, timeout / 4)))
+        unload_idle_whisper_models(timeout)
+
+
+def _start_idle_monitor():
+    global _idle_monitor_thread
+    if config.WHISPER_MODEL_IDLE_TIMEOUT_SECONDS is None:
+        return
+    with _whisper_models_lock:
+        if _idle_monitor_thread is None or not _idle_monitor_thread.is_alive():
+            _idle_monitor_thread = threading.Thread(target=_idle_monitor_loop,
+                                                    name="whisper-idle-monitor", daemon=True)
+            _idle_monitor_thread.start()
+
 
 def listar_y_seleccionar_microfono():
     """Lista los micrófonos disponibles y permite al usuario seleccionar uno."""
@@ -52,14 +171,15 @@ def listar_y_seleccionar_microfono():
             return None
 
 
-def record_audio_until_stopped(stop_event_text="parar grabación"):
+@metrics.instrument("grabacion")
+def record_audio_until_stopped(stop_event_text="parar grabación", on_phrase=None):
     """
     Graba audio continuamente usando el micrófono seleccionado en config
     hasta que el usuario escribe un texto de parada o presiona Ctrl+C.
-    Devuelve el objeto AudioData combinado o una señal de parada.
+    Si se indica on_phrase, se llama con cada frase (AudioData) en cuanto llega.
+    Devuelve el audio combinado (CapturedAudio, con la interfaz de AudioData) o una señal de parada.
     """
     r = sr.Recognizer()
-    audio_queue = Queue()
 
     device_idx = config.SELECTED_MICROPHONE_INDEX
 
@@ -74,17 +194,22 @@ def record_audio_until_stopped(stop_event_text="parar grabación"):
         print(f"❌ Error al inicializar el micrófono: {e}")
         return None
 
-    print(f"   (Modelo Whisper a usar: {config.WHISPER_MODEL_NAME})")
+    print(f"   (Modelo Whisper a usar: {resolve_whisper_settings()[0]})")
+
+    # Cada frase se copia una sola vez al búfer de captura (RAM o archivo temporal)
+    capture = capture_buffer.CaptureBuffer()
 
     def record_callback(_, audio: sr.AudioData):
-        audio_queue.put(audio.get_raw_data())
+        capture.append(audio.get_raw_data())
+        if on_phrase is not None:
+            on_phrase(audio)
 
     stop_listening = r.listen_in_background(mic, record_callback, phrase_time_limit=5)
 
     print(f"🎤 ¡Grabación iniciada! Habla libremente.")
     print(f"   Cuando termines, escribe '{stop_event_text}' y presiona Enter, o presiona Ctrl+C para abortar.")
 
-    recorded_data = []
+    stop_program = failed = False
     try:
         while True:
             user_input = input()
@@ -94,59 +219,403 @@ def record_audio_until_stopped(stop_event_text="parar grabación"):
     except KeyboardInterrupt:
         print("\n🛑 Programa detenido por el usuario (Ctrl+C) durante la espera de la señal de parada.")
         stop_listening(wait_for_stop=False)
-        return "STOP_PROGRAM"
+        stop_program = True
     except Exception as e:
         print(f"Error inesperado durante la espera de la señal de parada: {e}")
         stop_listening(wait_for_stop=False)
-        return None
+        failed = True
     finally:
         stop_listening(wait_for_stop=True)
-        while not audio_queue.empty():
-            recorded_data.append(audio_queue.get())
 
-    if not recorded_data:
-        print("No se grabó ningún audio.")
-        return None
+    if stop_program or failed or capture.size == 0:
+        if not (stop_program or failed):
+            print("No se grabó ningún audio.")
+        capture.close()  # Nada que transcribir: el búfer (y su archivo temporal) se libera ya
+        return "STOP_PROGRAM" if stop_program else None
 
-    sample_rate = mic.SAMPLE_RATE
-    sample_width = mic.SAMPLE_WIDTH
-    full_raw_data = b''.join(recorded_data)
-    combined_audio_data = sr.AudioData(full_raw_data, sample_rate, sample_width)
-    print("🎧 Audio completo capturado, procesando...")
+    combined_audio_data = capture_buffer.CapturedAudio(capture, mic.SAMPLE_RATE, mic.SAMPLE_WIDTH)
+    storage = "archivo temporal" if capture.spilled else "memoria"
+    print(f"🎧 Audio completo capturado ({combined_audio_data.duration_seconds:.0f} s, en {storage}), procesando...")
+    metrics.annotate(audio_seconds=combined_audio_data.duration_seconds, spilled_to_disk=capture.spilled)
     return combined_audio_data
 
 
+def pcm_to_float32(raw_data, sample_width):
+    """
+    Convierte bytes PCM little-endian (mono) en un array float32 en [-1, 1]
+    sin copias intermedias más allá de la conversión de tipo.
+    """
+    if sample_width == 1:
+        # AudioData.get_raw_data() devuelve 8 bits sin signo
+        samples = np.frombuffer(raw_data, dtype=np.uint8).astype(np.float32)
+        return (samples - 128.0) / 128.0
+    if sample_width == 2:
+        return np.frombuffer(raw_data, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_width == 3:
+        # 24 bits: se amplía cada muestra a 32 bits colocando los 3 bytes en la parte alta
+        packed = np.frombuffer(raw_data, dtype=np.uint8).reshape(-1, 3)
+        widened = np.zeros((packed.shape[0], 4), dtype=np.uint8)
+        widened[:, 1:] = packed
+        return widened.view("<i4").reshape(-1).astype(np.float32) / 2147483648.0
+    if sample_width == 4:
+        return np.frombuffer(raw_data, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise ValueError(f"Ancho de muestra no soportado: {sample_width}")
+
+
+def resample_to_whisper_rate(samples, sample_rate):
+    """Remuestrea un array float32 mono a la frecuencia que espera Whisper (16 kHz)."""
+    if sample_rate == WHISPER_SAMPLE_RATE:
+        return samples
+    try:
+        resample = torchaudio.functional.resample
+    except ImportError:
+        # Sin torchaudio: interpolación lineal con NumPy (sin filtro antialiasing, suficiente para la voz)
+        output_length = int(len(samples) * WHISPER_SAMPLE_RATE / sample_rate)
+        positions = np.arange(output_length) * (sample_rate / WHISPER_SAMPLE_RATE)
+        return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return resample(torch.from_numpy(samples), orig_freq=sample_rate, new_freq=WHISPER_SAMPLE_RATE).numpy()
+
+
+def apply_vad(audio_array):
+    """
+    Recorta los silencios largos si config.VAD_ENABLED. Devuelve el VadResult, o None
+    si el VAD está desactivado.
+    """
+    if not config.VAD_ENABLED:
+        return None
+    return vad.trim_silence(audio_array, WHISPER_SAMPLE_RATE)
+
+
+def trim_for_transcription(audio_array):
+    """Audio a transcribir: sin silencios largos, o completo si el VAD no encontró voz."""
+    vad_result = apply_vad(audio_array)
+    if vad_result is None:
+        return audio_array
+    if len(vad_result.samples) == 0:
+        print("🔇 VAD: no se detectó voz; se transcribe el audio completo.")
+        return audio_array
+    print(vad_result.summary_line())
+    return vad_result.samples
+
+
+def audio_data_to_whisper_array(audio_data):
+    """
+    Convierte un AudioData (PCM crudo del micrófono) directamente en el array
+    float32 a 16 kHz que acepta model.transcribe, sin archivo temporal ni FFmpeg.
+    """
+    samples = pcm_to_float32(audio_data.get_raw_data(), audio_data.sample_width)
+    return resample_to_whisper_rate(samples, audio_data.sample_rate)
+
+
+class StreamingTranscriber:
+    """
+    Transcribe las frases del micrófono en un hilo de trabajo mientras se sigue
+    grabando. Las frases se agrupan en ventanas de STREAMING_WINDOW_SECONDS y cada
+    ventana se condiciona con el final del texto ya transcrito, de modo que al
+    parar solo queda pendiente la última ventana.
+    """
+
+    def __init__(self):
+        self._phrases = Queue()
+        self._texts = []
+        self._errors = []
+        self._removed_seconds = 0.0
+        self._audio_seconds = 0.0
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name="whisper-streaming", daemon=True)
+        self._thread.start()
+
+    def feed(self, audio_data):
+        """Encola una frase (AudioData) para transcribir. Pensado como callback on_phrase."""
+        self._phrases.put(audio_data)
+
+    # Etapa propia: si falla, transcribe_with_whisper registra después su "transcripcion" y no se cuenta dos veces
+    @metrics.instrument("transcripcion_streaming")
+    def finish(self):
+        """
+        Espera a que se transcriba el audio pendiente y devuelve el texto completo.
+        Devuelve None si alguna ventana falló: el texto tendría huecos (ver transcribe_with_whisper).
+        """
+        self._phrases.put(None)
+        self._thread.join()
+        metrics.annotate(audio_seconds=self._audio_seconds, vad_removed_seconds=self._removed_seconds)
+        if self._removed_seconds:
+            print(f"✂️ VAD: {self._removed_seconds:.1f} s de silencio omitidos durante la grabación.")
+        if self._errors:
+            print(f"⚠️ {len(self._errors)} ventana(s) sin transcribir en streaming; el texto estaría incompleto.")
+            metrics.annotate(failed_windows=len(self._errors))
+            return None
+        return " ".join(self._texts).strip()
+
+    def cancel(self):
+        """Descarta el audio pendiente y termina el hilo de trabajo sin esperar."""
+        self._cancelled = True
+        self._phrases.put(None)
+
+    def _transcribe_window(self, window):
+        audio_array = np.concatenate(window)
+        vad_result = apply_vad(audio_array)
+        if vad_result is not None:
+            self._removed_seconds += vad_result.removed_seconds
+            if len(vad_result.samples) == 0:
+                return  # Ventana sin voz (p. ej. mientras se camina por la obra)
+            audio_array = vad_result.samples
+        previous_text = " ".join(self._texts)[-config.STREAMING_PROMPT_CHARS:]
+        result = run_whisper(audio_array, initial_prompt=previous_text or None)
+        text = result["text"].strip()
+        if text:
+            self._texts.append(text)
+            print(f"   📝 ...{text}")
+
+    def _run(self):
+        window = []
+        window_samples = 0
+        min_samples = config.STREAMING_WINDOW_SECONDS * WHISPER_SAMPLE_RATE
+        while True:
+            audio_data = self._phrases.get()
+            if self._cancelled:
+                return
+            try:
+                if audio_data is not None:
+                    samples = audio_data_to_whisper_array(audio_data)
+                    self._audio_seconds += len(samples) / WHISPER_SAMPLE_RATE
+                    window.append(samples)
+                    window_samples += len(samples)
+                if window and (audio_data is None or window_samples >= min_samples):
+                    self._transcribe_window(window)
+                    window = []
+                    window_samples = 0
+            except Exception as e:
+                print(f"\n❌ Error durante la transcripción en streaming: {e}")
+                self._errors.append(e)
+                window = []
+                window_samples = 0
+            if audio_data is None:
+                return
+
+
+def record_and_transcribe_streaming(stop_event_text="parar grabación"):
+    """
+    Graba hasta la señal de parada transcribiendo en paralelo.
+    Devuelve el texto transcrito, None si falló o "STOP_PROGRAM".
+    """
+    transcriber = StreamingTranscriber()
+    audio_data = record_audio_until_stopped(stop_event_text=stop_event_text, on_phrase=transcriber.feed)
+    if audio_data == "STOP_PROGRAM" or not audio_data:
+        transcriber.cancel()  # Sin esperar a las ventanas pendientes
+        return audio_data
+    try:
+        print(f"🤫 Terminando la transcripción en streaming ({resolve_whisper_settings()[0]})...")
+        transcribed_text = transcriber.finish()
+        if transcribed_text is None:
+            print("↩️ Se transcribe la grabación completa.")
+            return transcribe_with_whisper(audio_data) or None
+    finally:
+        audio_data.close()
+    if not transcribed_text:
+        return None
+    print(f"🗣️ Texto transcrito: {transcribed_text}")
+    return transcribed_text
+
+
+def _transcription_cache_key(audio_hash, model_key):
+    return result_cache.make_cache_key("whisper", audio_hash, list(model_key), "de", vad.settings_signature())
+
+
+def run_whisper(audio_array, **options):
+    """
+    Transcribe un array float32 a 16 kHz con el modelo y el backend configurados
+    e informa del RTF conseguido. Devuelve el resultado de model.transcribe.
+    """
+    model_key = resolve_whisper_settings()
+    model = get_whisper_model()
+    backend = transcription_backends.get_backend(model_key[1])
+    with _whisper_inference_lock:
+        start = time.perf_counter()
+        result = backend.transcribe(model, audio_array, language="de", **options)
+        elapsed = time.perf_counter() - start
+    _touch_whisper_model(model_key)
+    transcribed_seconds = len(audio_array) / WHISPER_SAMPLE_RATE
+    rtf = transcription_backends.record_rtf(backend.name, model_key[0], transcribed_seconds, elapsed)
+    metrics.annotate(rtf=rtf, transcribed_seconds=transcribed_seconds, model=model_key[0], backend=backend.name)
+    return result
+
+
+@metrics.instrument("transcripcion")
 def transcribe_with_whisper(audio_data):
     """Transcribe un objeto AudioData usando Whisper."""
     if not audio_data:
         return None
 
-    tmp_audio_file_path = None
     try:
-        # Guardar temporalmente el audio para Whisper
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_audio_file:
-            tmp_audio_file.write(audio_data.get_wav_data())
-            tmp_audio_file_path = tmp_audio_file.name
-
-        print(f"🤫 Transcribiendo con Whisper ({config.WHISPER_MODEL_NAME})...")
-        model = whisper.load_model(config.WHISPER_MODEL_NAME)
-        # Usar fp16 si CUDA está disponible y es soportado
-        use_fp16 = torch.cuda.is_available()
-        result = model.transcribe(tmp_audio_file_path, language="de", fp16=use_fp16)
+        model_key = resolve_whisper_settings()
+        raw_data = audio_data.get_raw_data()
+        audio_hash = result_cache.make_cache_key("pcm", audio_data.sample_rate, audio_data.sample_width, raw_data)
+        cache_key = _transcription_cache_key(audio_hash, model_key)
+        transcribed_text = result_cache.transcription_cache.get(cache_key)
+        if transcribed_text is not None:
+            print(f"♻️ Transcripción recuperada de la caché: {transcribed_text}")
+            metrics.annotate(cache_hit=True)
+            return transcribed_text
+
+        audio_array = audio_data_to_whisper_array(audio_data)
+        metrics.annotate(audio_seconds=len(audio_array) / WHISPER_SAMPLE_RATE)
+        audio_array = trim_for_transcription(audio_array)
+
+        print(f"🤫 Transcribiendo con Whisper ({model_key[0]}, {model_key[1]})...")
+        result = run_whisper(audio_array)
         transcribed_text = result["text"]
+        result_cache.transcription_cache.put(cache_key, transcribed_text)
         print(f"🗣️ Texto transcrito: {transcribed_text}")
         return transcribed_text
     except Exception as e:
         print(f"❌ Error durante la transcripción con Whisper: {e}")
-        if "ffmpeg" in str(e).lower() or "winerror 2" in str(e).lower():
-            print("🆘  Este error podría estar relacionado con FFmpeg. Asegúrate de que esté instalado y en el PATH.")
-        elif "out of memory" in str(e).lower():
+        if "out of memory" in str(e).lower():
             print("🆘  ¡Error de falta de memoria! El modelo Whisper es demasiado grande para tu VRAM/RAM.")
             print("    Considera usar un modelo más pequeño (ej. 'base', 'small', 'medium').")
         return None
-    finally:
-        if tmp_audio_file_path and os.path.exists(tmp_audio_file_path):
-            try:
-                os.remove(tmp_audio_file_path)
-            except Exception as e_del:
-                print(f"Advertencia: No se pudo eliminar el archivo temporal {tmp_audio_file_path}: {e_del}")
\ No newline at end of file
+
+
+def transcribe_audio_file(file_path, content_hash=None):
+    """
+    Transcribe un archivo de audio grabado (p. ej. desde un móvil) con el modelo cacheado.
+    Los formatos comprimidos (m4a, mp3, ...) se decodifican con FFmpeg a través de Whisper.
+    content_hash (SHA-256 del archivo) evita volver a leerlo si quien llama ya lo calculó.
+    """
+    try:
+        model_key = resolve_whisper_settings()
+        content_hash = content_hash or result_cache.file_content_hash(file_path)
+        cache_key = _transcription_cache_key(content_hash, model_key)
+        transcribed_text = result_cache.transcription_cache.get(cache_key)
+        if transcribed_text is not None:
+            print(f"♻️ Transcripción de {file_path} recuperada de la caché.")
+            return transcribed_text
+
+        # FFmpeg decodifica a 16 kHz mono; así el VAD también se aplica a los archivos
+        audio_array = trim_for_transcription(whisper.audio.load_audio(file_path))
+        result = run_whisper(audio_array)
+        transcribed_text = result["text"].strip()
+        result_cache.transcription_cache.put(cache_key, transcribed_text)
+        return transcribed_text
+    except Exception as e:
+        print(f"❌ Error al transcribir {file_path}: {e}")
+        if "ffmpeg" in str(e).lower() or "winerror 2" in str(e).lower():
+            print("🆘  Este error podría estar relacionado con FFmpeg. Asegúrate de que esté instalado y en el PATH.")
+        return None
+
+
+# --- Transcripción por lotes ---
+# Mismos umbrales que model.transcribe para repetir una ventana con temperatura o descartarla como silencio
+_TEMPERATURE_FALLBACK = (0.2, 0.4, 0.6, 0.8, 1.0)
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+_LOGPROB_THRESHOLD = -1.0
+_NO_SPEECH_THRESHOLD = 0.6
+
+
+def _log_mel_windows(model, audio_array):
+    """Ventanas de 30 s del log-mel de una grabación, con el mismo relleno que model.transcribe."""
+    mel = whisper.log_mel_spectrogram(audio_array, model.dims.n_mels, padding=whisper.audio.N_SAMPLES)
+    content_frames = mel.shape[-1] - whisper.audio.N_FRAMES
+    return [whisper.audio.pad_or_trim(mel[:, start:start + whisper.audio.N_FRAMES], whisper.audio.N_FRAMES)
+            for start in range(0, max(content_frames, 1), whisper.audio.N_FRAMES)]
+
+
+def _is_silent(result):
+    return result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob <= _LOGPROB_THRESHOLD
+
+
+def _needs_fallback(result):
+    if _is_silent(result):
+        return False
+    return result.compression_ratio > _COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < _LOGPROB_THRESHOLD
+
+
+def _decode_windows(model, backend, mels):
+    """Decodifica un lote de ventanas log-mel de una vez. Devuelve el texto de cada ventana."""
+    options = whisper.DecodingOptions(language="de", without_timestamps=True, fp16=backend.fp16)
+    results = whisper.decode(model, torch.stack(mels).to(model.device), options)
+    texts = []
+    for mel, result in zip(mels, results):
+        # Las ventanas dudosas se repiten solas, subiendo la temperatura como hace model.transcribe
+        for temperature in _TEMPERATURE_FALLBACK:
+            if not _needs_fallback(result):
+                break
+            result = whisper.decode(model, mel.to(model.device),
+                                    whisper.DecodingOptions(language="de", without_timestamps=True,
+                                                            fp16=backend.fp16, temperature=temperature))
+        texts.append("" if _is_silent(result) else result.text.strip())
+    return texts
+
+
+def transcribe_batch(audio_arrays, batch_size=None):
+    """
+    Transcribe varias grabaciones (arrays float32 a 16 kHz) a la vez: sus ventanas de 30 s
+    se agrupan en lotes de batch_size y el codificador y el decodificador procesan cada lote
+    en una sola pasada. Devuelve el texto de cada grabación, en el mismo orden.
+    A diferencia de model.transcribe, las ventanas no se condicionan con el texto anterior.
+    """
+    batch_size = batch_size or config.WHISPER_BATCH_SIZE
+    model_key = resolve_whisper_settings()
+    model = get_whisper_model()
+    backend = transcription_backends.get_backend(model_key[1])
+
+    windows = [(index, mel) for index, audio_array in enumerate(audio_arrays)
+               for mel in _log_mel_windows(model, audio_array)]
+    texts = [[] for _ in audio_arrays]
+    elapsed = 0.0
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        with _whisper_inference_lock:
+            start = time.perf_counter()
+            decoded = _decode_windows(model, backend, [mel for _, mel in batch])
+            elapsed += time.perf_counter() - start
+        for (index, _), text in zip(batch, decoded):
+            if text:
+                texts[index].append(text)
+    _touch_whisper_model(model_key)
+
+    audio_seconds = sum(len(audio_array) for audio_array in audio_arrays) / WHISPER_SAMPLE_RATE
+    print(f"📦 {len(audio_arrays)} grabación(es), {len(windows)} ventana(s) de 30 s en lotes de {batch_size}.")
+    transcription_backends.record_rtf(backend.name, model_key[0], audio_seconds, elapsed)
+    return [" ".join(parts) for parts in texts]
+
+
+def transcribe_audio_files(file_paths, content_hashes=None):
+    """
+    Transcribe varios archivos con transcribe_batch (los que no estén ya en la caché).
+    Devuelve una lista con el texto de cada archivo, o None en los que fallaron.
+    Con WHISPER_BATCH_SIZE = 1 se transcriben uno a uno con transcribe_audio_file.
+    """
+    content_hashes = content_hashes or [None] * len(file_paths)
+    if config.WHISPER_BATCH_SIZE <= 1:
+        return [transcribe_audio_file(path, content_hash) for path, content_hash in zip(file_paths, content_hashes)]
+
+    texts = [None] * len(file_paths)
+    pending = []  # (posición, clave de caché, audio)
+    model_key = resolve_whisper_settings()
+    for position, (file_path, content_hash) in enumerate(zip(file_paths, content_hashes)):
+        try:
+            content_hash = content_hash or result_cache.file_content_hash(file_path)
+            cache_key = _transcription_cache_key(content_hash, model_key)
+            cached_text = result_cache.transcription_cache.get(cache_key)
+            if cached_text is not None:
+                print(f"♻️ Transcripción de {file_path} recuperada de la caché.")
+                texts[position] = cached_text
+                continue
+            pending.append((position, cache_key, trim_for_transcription(whisper.audio.load_audio(file_path))))
+        except Exception as e:
+            print(f"❌ Error al leer {file_path}: {e}")
+            if "ffmpeg" in str(e).lower() or "winerror 2" in str(e).lower():
+                print("🆘  Este error podría estar relacionado con FFmpeg. Asegúrate de que esté instalado y en el PATH.")
+
+    if not pending:
+        return texts
+    try:
+        batch_texts = transcribe_batch([audio_array for _, _, audio_array in pending])
+    except Exception as e:
+        print(f"❌ Error durante la transcripción por lotes: {e}")
+        return texts
+    for (position, cache_key, _), transcribed_text in zip(pending, batch_texts):
+        result_cache.transcription_cache.put(cache_key, transcribed_text)
+        texts[position] = transcribed_text
+    return texts
\ No newline at end of file
@@ -0,0 +1,247 @@
+# batch_processing.py
+# Modo lote: procesa una carpeta (o glob) de dictados grabados sin interacción.
+#
+# Las etapas se encadenan: el proceso principal es el único que tiene el modelo Whisper
+# y transcribe los archivos por grupos de WHISPER_BATCH_SIZE, decodificando sus ventanas
+# de 30 s por lotes; cada transcripción pasa a un pool de hilos
+# que hace las peticiones a Ollama en paralelo, y cada resultado se escribe en Excel
+# en un pool de procesos aparte.
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+# Importar módulos del proyecto
+import Modulos.config as config
+import Modulos.audio_processing as audio_processing
+import Modulos.llm_interaction as llm_interaction
+import Modulos.entry_processing as entry_processing
+import Modulos.result_cache as result_cache
+import Modulos.site_workbooks as site_workbooks
+import Modulos.metrics as metrics
+
+
+class StageStats:
+    """Acumula los tiempos de una etapa del lote para el resumen final."""
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, start, end, ok=True):
+        """Registra una ejecución de la etapa (tiempos de time.time())."""
+        with self._lock:
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def summary_line(self):
+        total = self.ok + self.failed
+        if not total:
+            return f"  {self.name}: sin ejecuciones"
+        span = max(self.last_end - self.first_start, 1e-9)
+        return (f"  {self.name}: {self.ok} ok / {self.failed} errores, "
+                f"media {self.busy_seconds / total:.2f} s/archivo, "
+                f"{total / span * 60:.1f} archivos/min")
+
+
+def collect_audio_files(source):
+    """Devuelve la lista ordenada de archivos de audio de una carpeta o patrón glob."""
+    if os.path.isdir(source):
+        candidates = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        candidates = glob.glob(source, recursive=True)
+    return sorted(path for path in candidates
+                  if os.path.isfile(path) and path.lower().endswith(config.BATCH_AUDIO_EXTENSIONS))
+
+
+def load_manifest(manifest_path=None):
+    """Carga el registro de archivos ya procesados (hash -> resultado)."""
+    manifest_path = manifest_path or config.BATCH_MANIFEST_PATH
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ No se pudo leer el registro del lote ({manifest_path}): {e}. Se empieza uno nuevo.")
+        return {}
+
+
+def save_manifest(manifest, manifest_path=None):
+    """Guarda el registro de forma atómica para no corromperlo si el proceso se interrumpe."""
+    manifest_path = manifest_path or config.BATCH_MANIFEST_PATH
+    config.ensure_dir(os.path.dirname(manifest_path))
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def _date_for_file(file_path):
+    """La fecha del informe es la de la grabación (fecha de modificación del archivo)."""
+    return datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d")
+
+
+def _output_basename(file_path, content_hash, date_str):
+    stem = os.path.splitext(os.path.basename(file_path))[0].replace(" ", "_")
+    valid_stem = "".join(c for c in stem if c.isalnum() or c in ('_', '-')) or "Aufnahme"
+    return f"Bautagebuch_{date_str.replace('-', '')}_{valid_stem}_{content_hash[:8]}"
+
+
+def _render_entry_job(bautagebuch_data, date_str, output_basename, transcribed_text, trace_id=None, on_saved=None):
+    """Se ejecuta en un proceso del pool de Excel. Devuelve (ruta_excel, inicio, fin)."""
+    start = time.time()
+    with metrics.trace(trace_id):
+        excel_path = entry_processing.render_entry(bautagebuch_data, date_str, output_basename=output_basename,
+                                                   transcribed_text=transcribed_text, on_saved=on_saved)
+    return excel_path, start, time.time()
+
+
+def run_batch(source, llm_workers=None, excel_workers=None, force=False):
+    """
+    Procesa todos los archivos de audio de source (carpeta o glob).
+    Los archivos cuyo contenido ya figura como procesado en el registro se omiten,
+    salvo que force sea True. Devuelve el número de archivos procesados con éxito.
+    """
+    llm_workers = llm_workers or config.BATCH_LLM_WORKERS
+    excel_workers = excel_workers or config.BATCH_EXCEL_WORKERS
+
+    files = collect_audio_files(source)
+    if not files:
+        print(f"❌ No se encontraron archivos de audio en: {source}")
+        return 0
+
+    manifest = load_manifest()
+    manifest_lock = threading.Lock()
+    pending = []
+    skipped = 0
+    for file_path in files:
+        content_hash = result_cache.file_content_hash(file_path)
+        if not force and manifest.get(content_hash, {}).get("status") == "ok":
+            skipped += 1
+            continue
+        pending.append((file_path, content_hash))
+
+    print(f"📂 {len(files)} archivos encontrados, {skipped} ya procesados, {len(pending)} pendientes.")
+    print(f"   (Lote Whisper: {config.WHISPER_BATCH_SIZE}, hilos LLM: {llm_workers}, procesos Excel: {excel_workers})")
+
+    per_site_month = config.OUTPUT_MODE == "per_site_month"
+    stats = {
+        "transcripcion": StageStats("Transcripción"),
+        "llm": StageStats("Extracción LLM"),
+        "excel": StageStats("Excel/txt"),
+    }
+
+    def record_result(file_path, content_hash, status, excel_path=None):
+        with manifest_lock:
+            manifest[content_hash] = {
+                "file": file_path,
+                "status": status,
+                "excel": excel_path,
+                "processed_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            save_manifest(manifest)
+
+    def on_excel_done(file_path, content_hash):
+        def _callback(future):
+            try:
+                excel_path, start, end = future.result()
+            except Exception as e:
+                print(f"❌ Error al escribir el Excel de {file_path}: {e}")
+                record_result(file_path, content_hash, "error")
+                return
+            stats["excel"].record(start, end, ok=bool(excel_path))
+            if not excel_path:
+                record_result(file_path, content_hash, "error")
+            elif not per_site_month:
+                record_result(file_path, content_hash, "ok", excel_path)
+            # En per_site_month el "ok" se registra al guardarse el libro (on_saved)
+        return _callback
+
+    def on_workbook_saved(file_path, content_hash):
+        return lambda workbook_path: record_result(file_path, content_hash, "ok", workbook_path)
+
+    def llm_job(file_path, content_hash, transcribed_text, excel_pool):
+        date_str = _date_for_file(file_path)
+        start = time.time()
+        try:
+            # En el log de métricas cada archivo se identifica por el inicio de su hash de contenido
+            with metrics.trace(content_hash[:12]):
+                bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(transcribed_text, date_str)
+            stats["llm"].record(start, time.time(), ok=bool(bautagebuch_data))
+            if not bautagebuch_data:
+                record_result(file_path, content_hash, "error")
+                return
+            entry_processing.complete_bautagebuch_data(bautagebuch_data, date_str)
+            on_saved = None
+            if per_site_month:
+                # Hasta que el libro se guarde, el archivo no cuenta como procesado
+                record_result(file_path, content_hash, "pendiente")
+                on_saved = on_workbook_saved(file_path, content_hash)
+            excel_future = excel_pool.submit(_render_entry_job, bautagebuch_data, date_str,
+                                             _output_basename(file_path, content_hash, date_str), transcribed_text,
+                                             content_hash[:12], on_saved)
+            excel_future.add_done_callback(on_excel_done(file_path, content_hash))
+        except Exception as e:
+            # Los futuros de este pool no se consultan: el error se registra aquí
+            print(f"❌ Error al procesar {file_path}: {e}")
+            stats["llm"].record(start, time.time(), ok=False)
+            record_result(file_path, content_hash, "error")
+
+    batch_start = time.time()
+    if per_site_month:
+        # Los libros por Baustelle y mes se comparten entre entradas: un único escritor en este proceso
+        excel_pool_context = ThreadPoolExecutor(max_workers=1)
+    else:
+        excel_pool_context = ProcessPoolExecutor(max_workers=excel_workers)
+    with excel_pool_context as excel_pool:
+        with ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+            group_size = max(config.WHISPER_BATCH_SIZE, 1)
+            for group_start in range(0, len(pending), group_size):
+                group = pending[group_start:group_start + group_size]
+                print(f"\n🎧 [{group_start + 1}-{group_start + len(group)}/{len(pending)}] "
+                      f"Transcribiendo {len(group)} archivo(s)...")
+                start = time.time()
+                transcribed_texts = audio_processing.transcribe_audio_files(
+                    [file_path for file_path, _ in group], [content_hash for _, content_hash in group])
+                # El tiempo del grupo se reparte entre sus archivos para las estadísticas
+                share = (time.time() - start) / len(group)
+                for offset, ((file_path, content_hash), transcribed_text) in enumerate(zip(group, transcribed_texts)):
+                    file_start = start + offset * share
+                    stats["transcripcion"].record(file_start, file_start + share, ok=bool(transcribed_text))
+                    with metrics.trace(content_hash[:12]):
+                        metrics.record("transcripcion", share, "ok" if transcribed_text else "sin_resultado",
+                                       batch_size=len(group))
+                    if not transcribed_text:
+                        record_result(file_path, content_hash, "error")
+                        continue
+                    llm_pool.submit(llm_job, file_path, content_hash, transcribed_text, excel_pool)
+        # Al salir del pool de hilos ya se han enviado todos los trabajos de Excel;
+        # al salir del pool de procesos han terminado y sus callbacks se han ejecutado.
+    site_workbooks.flush_all()
+    for file_path, content_hash in pending:
+        if manifest.get(content_hash, {}).get("status") == "pendiente":
+            record_result(file_path, content_hash, "error")  # Su libro no se pudo guardar
+    elapsed = time.time() - batch_start
+
+    processed_ok = sum(1 for _, content_hash in pending if manifest.get(content_hash, {}).get("status") == "ok")
+    print("\n--- Resumen del lote ---")
+    print(f"Archivos: {processed_ok} procesados, {skipped} omitidos, "
+          f"{len(pending) - processed_ok} con errores, en {elapsed:.1f} s")
+    for stage in stats.values():
+        print(stage.summary_line())
+    result_cache.print_cache_stats()
+    return processed_ok
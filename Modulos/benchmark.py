@@ -0,0 +1,375 @@
+# benchmark.py
+# Benchmark de extremo a extremo sin micrófono, sin GPU y sin red: dictados sintéticos (o WAV
+# grabados) pasan por el búfer de captura, Whisper (modelo "tiny" o un backend simulado), el LLM
+# (servidor local que imita a Ollama, ver fake_ollama.py), el Excel y el txt. Además se mide
+# calculate_arbeitszeit a escala. Los tiempos salen del log de métricas (ver metrics.py) y se
+# comparan con una base guardada; el código de salida es 1 si alguna etapa empeora.
+#
+#   python -m Modulos.benchmark --guardar-base             # backend simulado, guarda la base
+#   python -m Modulos.benchmark                            # compara con la base guardada
+#   python -m Modulos.benchmark --backend cpu-int8 --modelo tiny --audio dictado1.wav dictado2.wav
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime
+
+# Importar configuraciones y módulos del proyecto
+import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
+import Modulos.metrics as metrics
+import Modulos.capture_buffer as capture_buffer
+import Modulos.transcription_backends as transcription_backends
+import Modulos.audio_processing as audio_processing
+import Modulos.llm_interaction as llm_interaction
+import Modulos.entry_processing as entry_processing
+import Modulos.excel_processing as excel_processing
+import Modulos.timesheet as timesheet
+import Modulos.fake_ollama as fake_ollama
+
+np = lazy_modules.lazy_import("numpy")
+
+SAMPLE_RATE = audio_processing.WHISPER_SAMPLE_RATE
+SAMPLE_WIDTH = 2
+
+# Orden del informe; la unidad es la de "throughput" (elementos por segundo)
+STAGES = (
+    ("captura", "dictados/s"),
+    ("transcripcion", "dictados/s"),
+    ("llm", "entradas/s"),
+    ("excel", "archivos/s"),
+    ("txt", "archivos/s"),
+    ("arbeitszeit", "filas/s"),
+    ("arbeitszeit_lote", "filas/s"),
+)
+
+# Por debajo de esta diferencia de p50 no se considera regresión (ruido del temporizador)
+_MIN_REGRESSION_SECONDS = 0.005
+
+STUB_TEXT = ("Baustelle Musterstraße zwölf in Köln. Heute bewölkt, acht Grad, schwacher Wind. "
+             "Jan Kowalski und Piotr Nowak von sieben bis sechzehn Uhr, fünfundvierzig Minuten Pause. "
+             "Zwölf Fensterelemente im zweiten OG gesetzt und abgedichtet.")
+
+
+class StubBackend(transcription_backends.TranscriptionBackend):
+    """Backend sin modelo: tarda duración del audio * rtf y devuelve siempre el mismo texto."""
+
+    name = "stub"
+    device = "cpu"
+
+    def __init__(self, rtf=0.05, text=STUB_TEXT):
+        self.rtf = rtf
+        self.text = text
+
+    def load(self, model_name):
+        return None
+
+    def transcribe(self, model, audio, **options):
+        time.sleep(len(audio) / SAMPLE_RATE * self.rtf)
+        return {"text": self.text, "segments": [], "language": "de"}
+
+
+def synthetic_dictation(seconds, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    PCM de 16 bits mono que imita un dictado: sílabas sonoras (armónicos de 100-220 Hz),
+    consonantes fricativas (ruido) y pausas cortas entre sílabas y largas entre frases,
+    para que el VAD y Whisper trabajen con una señal realista en duración y silencios.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    signal = np.zeros(total, dtype=np.float32)
+    position = int(rng.uniform(0.3, 1.0) * sample_rate)
+    syllables_left = rng.integers(6, 16)
+    while position < total:
+        length = int(rng.uniform(0.12, 0.3) * sample_rate)
+        end = min(position + length, total)
+        t = np.arange(end - position, dtype=np.float32) / sample_rate
+        f0 = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in (1, 2, 3))
+        if rng.random() < 0.3:
+            voiced = voiced + rng.normal(0, 0.6, len(t))  # "s", "sch", "f"
+        signal[position:end] = 0.25 * voiced * np.hanning(len(t))
+        syllables_left -= 1
+        if syllables_left == 0:
+            syllables_left = rng.integers(6, 16)
+            position = end + int(rng.uniform(1.0, 3.0) * sample_rate)  # Pausa entre frases
+        else:
+            position = end + int(rng.uniform(0.05, 0.2) * sample_rate)
+    signal += rng.normal(0, 0.002, total).astype(np.float32)  # Ruido de fondo
+    return (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def read_wav(path):
+    """(PCM crudo, frecuencia, ancho de muestra) de un WAV PCM; el estéreo se mezcla a mono."""
+    with wave.open(path, "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        raw = wav_file.readframes(wav_file.getnframes())
+    if channels > 1:
+        if sample_width != 2:
+            raise ValueError(f"{path}: solo se admiten WAV estéreo de 16 bits")
+        samples = np.frombuffer(raw, dtype="<i2").reshape(-1, channels)
+        raw = samples.mean(axis=1).astype("<i2").tobytes()
+    return raw, sample_rate, sample_width
+
+
+def _capture(raw, sample_rate, sample_width, chunk_seconds=0.5):
+    """Mete el PCM en el búfer de captura en trozos, como llegan las frases del micrófono."""
+    chunk_bytes = int(chunk_seconds * sample_rate) * sample_width
+    start = time.perf_counter()
+    buffer = capture_buffer.CaptureBuffer()
+    for offset in range(0, len(raw), chunk_bytes):
+        buffer.append(raw[offset:offset + chunk_bytes])
+    captured = capture_buffer.CapturedAudio(buffer, sample_rate, sample_width)
+    metrics.record("captura", time.perf_counter() - start, audio_seconds=captured.duration_seconds,
+                   spilled_to_disk=buffer.spilled)
+    return captured, buffer
+
+
+def _prepare_environment(workdir, args, ollama_url):
+    """Todas las salidas van al directorio temporal; sin cachés ni almacén para medir el trabajo real."""
+    config.FILLED_EXCEL_DIR = os.path.join(workdir, "excel")
+    config.EXTENDED_TASKS_DIR = os.path.join(workdir, "txt")
+    config.CAPTURE_SPILL_DIR = os.path.join(workdir, "captura")
+    config.METRICS_LOG_PATH = os.path.join(workdir, "metrics.jsonl")
+    config.METRICS_PROMETHEUS_PATH = None
+    config.METRICS_ENABLED = True
+    config.TRANSCRIPTION_STATS_PATH = os.path.join(workdir, "transcription_rtf.json")
+    config.CACHE_ENABLED = False
+    config.ENTRY_STORE_ENABLED = False
+    # Sin personal aprendido de ejecuciones anteriores (ni escribir en el archivo real)
+    config.KNOWN_WORKERS_PATH = os.path.join(workdir, "personal.json")
+    config.KNOWN_WORKERS_LEARN = False
+    config.OUTPUT_MODE = "per_entry"
+    config.OLLAMA_HOST = ollama_url
+    config.TRANSCRIPTION_BACKEND = args.backend
+    config.WHISPER_MODEL_NAME = args.modelo
+    if not os.path.exists(config.EXCEL_TEMPLATE_PATH):
+        # Plantilla incluida en el repositorio
+        config.EXCEL_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  "BautagebuchVorlage.xlsx")
+    llm_interaction._ollama_client = None  # Un cliente nuevo que apunte al servidor simulado
+    if args.backend == "stub":
+        transcription_backends.BACKENDS["stub"] = StubBackend(rtf=args.rtf_simulado)
+
+
+def run_dictations(dictations, current_date_str):
+    """Cada dictado recorre captura, transcripción, LLM, txt y Excel como una entrada interactiva."""
+    for index, (raw, sample_rate, sample_width) in enumerate(dictations, start=1):
+        print(f"\n--- Dictado {index}/{len(dictations)} ({len(raw) / sample_rate / sample_width:.0f} s) ---")
+        with metrics.trace(f"bench-{index}"):
+            captured, buffer = _capture(raw, sample_rate, sample_width)
+            try:
+                transcribed_text = audio_processing.transcribe_with_whisper(captured)
+            finally:
+                buffer.close()
+            if not transcribed_text:
+                # Una etapa que falla invalida la medida: no se sigue con un texto de ejemplo
+                raise RuntimeError(f"La transcripción del dictado {index} falló.")
+            bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(transcribed_text, current_date_str)
+            if not bautagebuch_data:
+                raise RuntimeError("El servidor simulado de Ollama no devolvió datos utilizables.")
+            entry_processing.complete_bautagebuch_data(bautagebuch_data, current_date_str)
+            excel_processing.save_extended_text_details(bautagebuch_data, current_date_str,
+                                                        output_filename=f"bench_{index}.txt")
+            excel_processing.fill_excel_bautagebuch(bautagebuch_data, output_filename=f"bench_{index}.xlsx")
+
+
+def run_excel_scale(count, current_date_str):
+    """Rellena count Excel más con la entrada de ejemplo (muchas entradas seguidas, como en modo lote)."""
+    bautagebuch_data = json.loads(json.dumps(fake_ollama.DEFAULT_RESPONSE))
+    bautagebuch_data["Datum"] = current_date_str
+    for index in range(count):
+        with metrics.trace(f"excel-{index}"):
+            excel_processing.fill_excel_bautagebuch(bautagebuch_data, output_filename=f"escala_{index}.xlsx")
+
+
+def _random_timesheet_rows(count, seed=0):
+    """Horas de inicio/fin y pausas como las dicta la gente, con algunos valores no válidos."""
+    rng = random.Random(seed)
+    starts = [f"{h:02d}:{m:02d}" for h in range(5, 10) for m in (0, 15, 30, 45)]
+    ends = [f"{h:02d}:{m:02d}" for h in range(13, 20) for m in (0, 15, 30, 45)] + ["22:00", "02:30"]
+    invalid = ["Unbekannt", "HH:MM", "", "7 Uhr"]
+    pauses = ["0", "15", "30", "45", "60", "None", "abc"]
+    von = [rng.choice(invalid) if rng.random() < 0.02 else rng.choice(starts) for _ in range(count)]
+    bis = [rng.choice(invalid) if rng.random() < 0.02 else rng.choice(ends) for _ in range(count)]
+    pause = [rng.choice(pauses) for _ in range(count)]
+    return von, bis, pause
+
+
+def run_arbeitszeit(rows, repetitions):
+    """Horas trabajadas de rows filas con la función escalar y con la versión vectorizada."""
+    von, bis, pause = _random_timesheet_rows(rows)
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        for row in zip(von, bis, pause):
+            excel_processing.calculate_arbeitszeit(*row)
+        metrics.record("arbeitszeit", time.perf_counter() - start, items=rows)
+
+        start = time.perf_counter()
+        timesheet.calculate_arbeitszeit_batch(von, bis, pause)
+        metrics.record("arbeitszeit_lote", time.perf_counter() - start, items=rows)
+
+
+def summarize_records(records):
+    """{etapa: {"runs", "p50_seconds", "p95_seconds", "throughput_per_second"[, "rtf_p50"]}}."""
+    results = {}
+    for stage, _ in STAGES:
+        entries = [entry for entry in records if entry.get("stage") == stage and entry.get("status") == "ok"]
+        if not entries:
+            continue
+        walls = [entry["wall_seconds"] for entry in entries]
+        items = sum(entry.get("items", 1) for entry in entries)
+        stage_result = {
+            "runs": len(entries),
+            "p50_seconds": metrics.percentile(walls, 50),
+            "p95_seconds": metrics.percentile(walls, 95),
+            "throughput_per_second": items / sum(walls) if sum(walls) > 0 else None,
+        }
+        rtfs = [entry["rtf"] for entry in entries if isinstance(entry.get("rtf"), (int, float))]
+        if rtfs:
+            stage_result["rtf_p50"] = metrics.percentile(rtfs, 50)
+        results[stage] = stage_result
+    return results
+
+
+def _change(value, base):
+    if value is None or not base:
+        return ""
+    return f"{100.0 * (value - base) / base:+.0f}%"
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Imprime la tabla de resultados (y los cambios respecto a la base). Devuelve las etapas que empeoran."""
+    base_stages = (baseline or {}).get("stages", {})
+    # Una etapa de la base sin ninguna medida correcta ahora también es una regresión
+    regressions = [stage for stage, _ in STAGES if stage in base_stages and stage not in results["stages"]]
+    print(f"\n{'etapa':<18}{'n':>4}{'p50 (s)':>11}{'p95 (s)':>11}{'throughput':>22}{'Δ p50':>9}{'Δ thr.':>9}")
+    for stage, unit in STAGES:
+        result = results["stages"].get(stage)
+        if result is None:
+            continue
+        base = base_stages.get(stage, {})
+        throughput = result["throughput_per_second"]
+        throughput_text = f"{throughput:,.1f} {unit}" if throughput is not None else "-"
+        print(f"{stage:<18}{result['runs']:>4}{result['p50_seconds']:>11.4f}{result['p95_seconds']:>11.4f}"
+              f"{throughput_text:>22}{_change(result['p50_seconds'], base.get('p50_seconds')):>9}"
+              f"{_change(throughput, base.get('throughput_per_second')):>9}")
+        base_p50 = base.get("p50_seconds")
+        if base_p50 and result["p50_seconds"] > base_p50 * (1 + tolerance) \
+                and result["p50_seconds"] - base_p50 > _MIN_REGRESSION_SECONDS:
+            regressions.append(stage)
+    if "rtf_p50" in results["stages"].get("transcripcion", {}):
+        print(f"\nRTF p50 de la transcripción: {results['stages']['transcripcion']['rtf_p50']:.3f}")
+    return regressions
+
+
+def _load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ No se pudo leer la base {path}: {e}")
+        return None
+
+
+def _save_json(path, data):
+    config.ensure_dir(os.path.dirname(os.path.abspath(path)))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo con dictados sintéticos y "
+                                                 "un Ollama simulado (sin micrófono, GPU ni red)")
+    parser.add_argument("--audio", nargs="+", metavar="WAV", help="Dictados grabados (WAV PCM) en lugar de sintéticos")
+    parser.add_argument("--dictados", type=int, default=5, help="Número de dictados sintéticos")
+    parser.add_argument("--segundos", type=float, default=60.0, help="Duración de cada dictado sintético")
+    parser.add_argument("--backend", default="stub",
+                        choices=["stub", "default", "auto"] + sorted(transcription_backends.BACKENDS),
+                        help="Backend de transcripción ('stub' no carga Whisper)")
+    parser.add_argument("--modelo", default="tiny", help="Modelo Whisper con un backend real")
+    parser.add_argument("--rtf-simulado", type=float, default=0.05, help="RTF del backend 'stub'")
+    parser.add_argument("--latencia-llm", type=float, default=0.5, help="Segundos hasta el primer token del LLM simulado")
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0)
+    parser.add_argument("--excel", type=int, default=50, help="Excel adicionales rellenados a escala")
+    parser.add_argument("--filas", type=int, default=100_000, help="Filas para calculate_arbeitszeit")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones de la prueba de horas")
+    parser.add_argument("--base", default=config.BENCHMARK_BASELINE_PATH, help="Archivo JSON de la base")
+    parser.add_argument("--guardar-base", action="store_true", help="Guarda estos resultados como nueva base")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Empeoramiento relativo del p50 admitido antes de marcar regresión")
+    parser.add_argument("--salida", help="Guarda también los resultados en este archivo JSON")
+    parser.add_argument("--conservar", action="store_true", help="No borra el directorio temporal con las salidas")
+    args = parser.parse_args(argv)
+
+    params = {key: getattr(args, key) for key in ("backend", "modelo", "rtf_simulado", "latencia_llm",
+                                                  "tokens_por_segundo", "excel", "filas")}
+    if args.audio:
+        dictations = [read_wav(path) for path in args.audio]
+        params["audio"] = [os.path.basename(path) for path in args.audio]
+    else:
+        dictations = [(synthetic_dictation(args.segundos, seed=i), SAMPLE_RATE, SAMPLE_WIDTH)
+                      for i in range(args.dictados)]
+        params.update(dictados=args.dictados, segundos=args.segundos)
+
+    workdir = tempfile.mkdtemp(prefix="bautagebuch_bench_")
+    server = fake_ollama.FakeOllamaServer(latency_seconds=args.latencia_llm, tokens_per_second=args.tokens_por_segundo)
+    try:
+        _prepare_environment(workdir, args, server.start_in_background())
+        current_date_str = config.get_current_date_str()
+        print(f"🏁 Benchmark en {workdir} (backend {args.backend}, LLM simulado en {server.url})")
+        started = time.perf_counter()
+        try:
+            run_dictations(dictations, current_date_str)
+            run_excel_scale(args.excel, current_date_str)
+            run_arbeitszeit(args.filas, args.repeticiones)
+        except Exception as e:
+            print(f"❌ El benchmark se detiene: {e}")
+            return 1
+        total_seconds = time.perf_counter() - started
+        results = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "params": params,
+            "total_seconds": total_seconds,
+            "stages": summarize_records(metrics.load_records(config.METRICS_LOG_PATH)),
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        if args.conservar:
+            print(f"📁 Salidas del benchmark conservadas en {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None if args.guardar_base else _load_baseline(args.base)
+    if baseline and baseline.get("params") != params:
+        print(f"⚠️ La base ({baseline.get('created_at')}) se midió con otros parámetros: {baseline.get('params')}")
+    regressions = compare_with_baseline(results, baseline, args.tolerancia)
+    print(f"\n⏱️ Tiempo total: {total_seconds:.1f} s")
+
+    if args.salida:
+        _save_json(args.salida, results)
+    if args.guardar_base:
+        _save_json(args.base, results)
+        print(f"💾 Base guardada en {args.base}")
+    elif baseline is None:
+        print(f"ℹ️ No hay base en {args.base}; usa --guardar-base para crearla.")
+    elif regressions:
+        print(f"❌ Regresión (p50 > base + {args.tolerancia:.0%} o sin medidas) en: {', '.join(regressions)}")
+        return 1
+    else:
+        print("✅ Sin regresiones respecto a la base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# capture_buffer.py
+# Búfer de captura para grabaciones largas: los fragmentos del micrófono se copian una sola
+# vez a un bytearray que crece por duplicación y, a partir de un umbral, a un archivo temporal
+# mapeado en memoria. El resultado se entrega como memoryview, sin concatenar bytes.
+import mmap
+import tempfile
+import threading
+
+# Importar configuraciones
+import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
+
+sr = lazy_modules.lazy_import("speech_recognition")
+
+
+class CaptureBuffer:
+    """
+    Búfer de solo escritura al final. Mientras se graba solo se llama a append();
+    view() devuelve una vista sin copia del audio acumulado. No se puede seguir
+    añadiendo datos mientras haya vistas vivas (el búfer no puede moverse).
+    """
+
+    def __init__(self, spill_threshold_bytes=None, initial_capacity=None):
+        self.spill_threshold_bytes = spill_threshold_bytes or config.CAPTURE_SPILL_THRESHOLD_BYTES
+        capacity = initial_capacity or config.CAPTURE_INITIAL_BUFFER_BYTES
+        self._memory = bytearray(min(capacity, self.spill_threshold_bytes))
+        self._file = None
+        self._mmap = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def spilled(self):
+        """True si el audio ya está en el archivo temporal en lugar de en RAM."""
+        return self._file is not None
+
+    def _storage(self):
+        return self._mmap if self._file is not None else self._memory
+
+    def _spill_to_disk(self, capacity):
+        self._file = tempfile.TemporaryFile(prefix="bautagebuch_audio_", dir=config.ensure_dir(config.CAPTURE_SPILL_DIR))
+        self._file.truncate(capacity)
+        self._mmap = mmap.mmap(self._file.fileno(), capacity)
+        self._mmap[:self._size] = memoryview(self._memory)[:self._size]
+        self._memory = None  # La copia en RAM se libera en cuanto está en disco
+
+    def _grow_file(self, capacity):
+        self._mmap.close()
+        self._file.truncate(capacity)
+        self._mmap = mmap.mmap(self._file.fileno(), capacity)
+
+    def _ensure_capacity(self, needed):
+        current = len(self._storage())
+        if needed <= current:
+            return
+        capacity = max(needed, current * 2)
+        if self._file is None and capacity > self.spill_threshold_bytes:
+            self._spill_to_disk(capacity)
+        elif self._file is None:
+            self._memory.extend(bytes(capacity - current))
+        else:
+            self._grow_file(capacity)
+
+    def append(self, data):
+        """Copia un fragmento de PCM al final del búfer."""
+        data = memoryview(data).cast("B")
+        with self._lock:
+            end = self._size + len(data)
+            self._ensure_capacity(end)
+            self._storage()[self._size:end] = data
+            self._size = end
+
+    def view(self):
+        """memoryview (sin copia) de los bytes grabados hasta ahora."""
+        with self._lock:
+            return memoryview(self._storage())[:self._size]
+
+    def close(self):
+        """Libera la memoria y borra el archivo temporal, si lo hay."""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()  # TemporaryFile se borra al cerrarse
+            self._memory = None
+            self._size = 0
+
+
+class CapturedAudio:
+    """
+    Audio grabado con la misma interfaz que sr.AudioData (sample_rate, sample_width,
+    get_raw_data, get_wav_data), pero respaldado por un CaptureBuffer: get_raw_data()
+    sin conversión devuelve un memoryview en lugar de una copia en bytes.
+    """
+
+    def __init__(self, buffer, sample_rate, sample_width):
+        self.buffer = buffer
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    @property
+    def duration_seconds(self):
+        return self.buffer.size / float(self.sample_rate * self.sample_width)
+
+    def get_raw_data(self, convert_rate=None, convert_width=None):
+        if (convert_rate is None or convert_rate == self.sample_rate) and \
+                (convert_width is None or convert_width == self.sample_width):
+            return self.buffer.view()
+        # Las conversiones de speech_recognition necesitan bytes; solo se copian en ese caso
+        return self.to_audio_data().get_raw_data(convert_rate, convert_width)
+
+    def get_wav_data(self, convert_rate=None, convert_width=None):
+        return self.to_audio_data().get_wav_data(convert_rate, convert_width)
+
+    def to_audio_data(self):
+        """Copia completa como sr.AudioData, para APIs que no aceptan vistas."""
+        return sr.AudioData(self.buffer.view().tobytes(), self.sample_rate, self.sample_width)
+
+    def close(self):
+        """Libera el búfer (y borra su archivo temporal) cuando la grabación ya está transcrita."""
+        self.buffer.close()
@@ -3,9 +3,70 @@ import os
 from datetime import datetime
 
 # --- Model and API Configurations ---
+# Nombre fijo ("large-v2", "medium", "small", ...) o "auto" = el mayor modelo que cabe en la
+# memoria libre y cumple TRANSCRIPTION_TARGET_RTF (puede elegir uno menor que large-v2)
 WHISPER_MODEL_NAME = "large-v2"
 OLLAMA_MODEL_NAME = "llama3"
 OLLAMA_HOST = "http://localhost:11434"
+# Tiempo que Ollama mantiene el modelo cargado entre peticiones (formato de Ollama, p. ej. "30m", -1 = siempre)
+OLLAMA_KEEP_ALIVE = "30m"
+# Recibir la respuesta en streaming y cortar la generación al cerrarse el objeto JSON
+OLLAMA_STREAM_RESPONSE = True
+# Salida estructurada de Ollama (format con JSON Schema); requiere Ollama >= 0.5. Si el servidor la
+# rechaza se repite la petición sin schema. Con False se busca el bloque JSON en el texto libre de la respuesta.
+OLLAMA_STRUCTURED_OUTPUT = True
+
+# --- Transcription Backend ---
+# "default" (CUDA fp16 si hay GPU, si no CPU fp32, como Whisper sin configurar), "auto" (igual pero en CPU
+# con cuantización int8: más rápido, la transcripción puede cambiar), "cuda-fp16", "cpu-int8" o "cpu-fp32"
+TRANSCRIPTION_BACKEND = "default"
+# RTF máximo (segundos de cálculo por segundo de audio) al elegir el modelo automáticamente
+TRANSCRIPTION_TARGET_RTF = 0.5
+# Hilos de PyTorch en CPU (None = núcleos físicos)
+TORCH_NUM_THREADS = None
+# Ventanas de 30 s que se decodifican juntas en modo lote (y archivos que se transcriben por grupo);
+# 1 = un archivo tras otro con model.transcribe. Con más (p. ej. 8) el lote va más rápido en GPU, pero la
+# decodificación por ventanas sin contexto previo puede cambiar la transcripción
+WHISPER_BATCH_SIZE = 1
+
+# --- Whisper Model Cache ---
+# Cargar el modelo en segundo plano al arrancar, mientras se elige el micrófono
+WHISPER_PRELOAD_AT_STARTUP = True
+# Segundos sin uso tras los que se descarga el modelo de memoria (None = nunca)
+WHISPER_MODEL_IDLE_TIMEOUT_SECONDS = 15 * 60
+
+# --- Streaming Transcription ---
+# Transcribir las frases mientras se sigue grabando, en lugar de esperar a "parar"
+STREAMING_TRANSCRIPTION = False
+# Segundos de audio acumulados antes de enviar una ventana a Whisper
+STREAMING_WINDOW_SECONDS = 10
+# Caracteres del texto ya transcrito que se pasan como contexto (initial_prompt)
+STREAMING_PROMPT_CHARS = 200
+
+# --- Audio Capture Buffer ---
+# Tamaño inicial del búfer de grabación en RAM (crece por duplicación)
+CAPTURE_INITIAL_BUFFER_BYTES = 4 * 1024 * 1024
+# A partir de este tamaño la grabación pasa a un archivo temporal mapeado en memoria
+# (64 MB son unos 11 minutos de audio de 16 bits a 48 kHz)
+CAPTURE_SPILL_THRESHOLD_BYTES = 64 * 1024 * 1024
+# Carpeta del archivo temporal; None usa la carpeta temporal del sistema
+CAPTURE_SPILL_DIR = None
+
+# --- Voice Activity Detection ---
+# Recortar los silencios largos (energía + cruces por cero) antes de transcribir
+VAD_ENABLED = False
+# Duración de cada trama analizada
+VAD_FRAME_MS = 30
+# dB por encima del ruido de fondo (percentil 10 de la grabación) para considerar voz
+VAD_ENERGY_MARGIN_DB = 12
+# Umbral mínimo absoluto en dBFS, para grabaciones casi sin ruido de fondo
+VAD_MIN_ENERGY_DB = -55
+# Fracción de cruces por cero a partir de la cual una trama débil cuenta como consonante sorda
+VAD_ZCR_THRESHOLD = 0.25
+# Margen que se conserva antes y después de cada tramo con voz
+VAD_PADDING_MS = 300
+# Los silencios más cortos que esto se conservan (pausas normales del habla)
+VAD_MIN_SILENCE_MS = 800
 
 # --- Microphone Configuration ---
 # Esta variable será actualizada en tiempo de ejecución por audio_processing.py
@@ -18,9 +79,110 @@ EXCEL_TEMPLATE_PATH = r"C:\Users\NARUO\Documents\test\BautagebuchVorlage.xlsx"
 FILLED_EXCEL_DIR = r"C:\Users\NARUO\Documents\test\bautagebuch_filled_excel"
 EXTENDED_TASKS_DIR = r"C:\Users\NARUO\Documents\test\bautagebuch_extended_logs" # Nombre consistente
 
-# Crear directorios si no existen
-os.makedirs(FILLED_EXCEL_DIR, exist_ok=True)
-os.makedirs(EXTENDED_TASKS_DIR, exist_ok=True)
+SITE_WORKBOOKS_DIR = r"C:\Users\NARUO\Documents\test\bautagebuch_baustellen"
+# Almacén SQLite con todas las entradas extraídas (fuente de los Excel/txt)
+ENTRY_STORE_PATH = r"C:\Users\NARUO\Documents\test\bautagebuch_entries.sqlite3"
+CACHE_DIR = r"C:\Users\NARUO\Documents\test\bautagebuch_cache"
+# RTF medidos por backend y modelo (para la elección automática del modelo)
+TRANSCRIPTION_STATS_PATH = os.path.join(CACHE_DIR, "transcription_rtf.json")
+
+# Registro de archivos ya procesados en modo lote (hash del contenido -> resultado)
+BATCH_MANIFEST_PATH = os.path.join(FILLED_EXCEL_DIR, "batch_manifest.json")
+# Resultados de referencia del benchmark (python -m Modulos.benchmark --guardar-base)
+BENCHMARK_BASELINE_PATH = os.path.join(CACHE_DIR, "benchmark_baseline.json")
+
+# Los directorios se crean al escribir el primer archivo en ellos (ensure_dir), no al importar config
+_created_dirs = set()
+
+
+def ensure_dir(path):
+    """Crea el directorio si no existe (solo se comprueba una vez por proceso) y lo devuelve."""
+    if path and path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+    return path
+
+# --- Sectioned LLM Extraction ---
+# En dictados largos, pedir las secciones del schema en peticiones pequeñas y simultáneas
+# (para que Ollama las atienda de verdad en paralelo hay que arrancarlo con OLLAMA_NUM_PARALLEL > 1)
+LLM_SECTIONED_EXTRACTION = False
+# Longitud mínima de la transcripción (caracteres) para usar el modo por secciones
+LLM_SECTIONED_MIN_CHARS = 1500
+# Peticiones simultáneas a Ollama en el modo por secciones
+LLM_SECTION_PARALLELISM = 3
+# Secciones independientes del schema (deben cubrir todos los campos de JSON_SCHEMA_FOR_LLM)
+LLM_EXTRACTION_SECTIONS = {
+    "Kopfdaten": ["Baustelle", "Auftraggeber_Bauleiter", "Bauueberwachung_Verantwortlicher", "Datum",
+                  "Auftrag", "Wetter", "Temperatur", "Wind"],
+    "Personal": ["Personal"],
+    "Arbeiten": ["Ausgefuehrte_Arbeiten", "Montagegeraete", "Sonstige_Geraeteeinsaetze", "Materialanlieferungen"],
+    "Hinweise": ["Kundenanweisungen", "Informationen_Fremdfirmen_Fremdleistungen", "Maengel_Nachtragsleistungen"],
+}
+
+# --- Rule-based Pre-extraction ---
+# Rellenar con reglas (sin LLM) horarios, pausas, temperatura, viento, tiempo y el personal conocido;
+# el LLM solo recibe los campos que las reglas no pudieron fijar con seguridad
+PRE_EXTRACTION_ENABLED = False
+# Caracteres de JSON que deben aportar las reglas para usar el prompt reducido: un schema distinto
+# pierde el prefijo del prompt ya evaluado por Ollama, así que no compensa por un par de campos
+PRE_EXTRACTION_MIN_CHARS = 120
+# Personal conocido por Baustelle (formato en Modulos/pre_extraction.py)
+KNOWN_WORKERS_PATH = r"C:\Users\NARUO\Documents\test\bautagebuch_personal.json"
+# Añadir a ese archivo el personal de cada entrada extraída correctamente
+KNOWN_WORKERS_LEARN = False
+
+# --- Interactive Pipeline ---
+# Procesar cada entrada (transcripción, LLM, Excel) en segundo plano mientras se graba la siguiente
+PIPELINE_MODE = False
+
+# --- Excel Output ---
+# Escribir el Excel parcheando solo el XML de la hoja de la plantilla (preprocesada una vez)
+# en lugar de cargar y guardar la plantilla completa con openpyxl en cada entrada
+EXCEL_FAST_WRITER = True
+# "per_entry": un Excel y un txt por entrada en FILLED_EXCEL_DIR / EXTENDED_TASKS_DIR
+# "per_site_month": una hoja por entrada en un libro por Baustelle y mes (SITE_WORKBOOKS_DIR)
+OUTPUT_MODE = "per_entry"
+# Entradas que se acumulan en memoria antes de guardar los libros por Baustelle y mes
+SITE_WORKBOOK_FLUSH_EVERY = 10
+
+# --- Entry Store ---
+# Guardar cada entrada extraída (y sus filas de Personal) en el almacén SQLite (ENTRY_STORE_PATH).
+# Desactivado por defecto; hace falta para las consultas y "regenerar" de entry_store y para timesheet
+ENTRY_STORE_ENABLED = False
+
+# --- Metrics ---
+# Registrar tiempos y recursos de cada etapa (grabación, Whisper, Ollama, Excel, txt) en METRICS_LOG_PATH.
+# Desactivado por defecto; el benchmark lo activa para su propio log
+METRICS_ENABLED = False
+METRICS_LOG_PATH = r"C:\Users\NARUO\Documents\test\bautagebuch_metrics.jsonl"
+# Archivo en formato de texto de Prometheus (p. ej. para el textfile collector); None = desactivado
+METRICS_PROMETHEUS_PATH = None
+
+# --- Batch Mode ---
+# Peticiones simultáneas a Ollama y procesos que escriben Excel en modo lote
+BATCH_LLM_WORKERS = 2
+BATCH_EXCEL_WORKERS = 2
+BATCH_AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".aac", ".amr", ".webm", ".mp4")
+
+# --- Server Mode (python main.py --serve) ---
+# Solo en este equipo por defecto; "0.0.0.0" para aceptar dictados de las tabletas de la red local
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+# Si se indica, las peticiones deben llevar la cabecera "Authorization: Bearer <token>"
+SERVER_TOKEN = None
+# Dictados aceptados y aún sin terminar; por encima se responde 429 (vuelve a intentarlo más tarde)
+SERVER_MAX_QUEUED_JOBS = 20
+SERVER_MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+# Dónde se guardan los audios recibidos hasta transcribirlos (None = carpeta temporal del sistema)
+SERVER_UPLOAD_DIR = None
+# Trabajos terminados cuyo estado y Excel se pueden seguir consultando
+SERVER_FINISHED_JOBS_KEPT = 500
+
+# --- Result Cache ---
+# Caché en disco de extracciones del LLM y transcripciones de Whisper
+CACHE_ENABLED = True
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+TRANSCRIPTION_CACHE_MAX_BYTES = 20 * 1024 * 1024
 
 # --- JSON Schema for LLM ---
 JSON_SCHEMA_FOR_LLM = """
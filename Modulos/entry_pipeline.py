@@ -0,0 +1,152 @@
+# entry_pipeline.py
+# Cola de trabajos en segundo plano para el modo interactivo: mientras el usuario
+# dicta la siguiente entrada, las anteriores se transcriben, se extraen con el LLM
+# y se guardan en txt/Excel. Los resultados se informan según va terminando cada trabajo.
+import threading
+import traceback
+from queue import Queue
+
+# Importar módulos del proyecto
+import Modulos.config as config
+import Modulos.audio_processing as audio_processing
+import Modulos.llm_interaction as llm_interaction
+import Modulos.entry_processing as entry_processing
+import Modulos.site_workbooks as site_workbooks
+import Modulos.metrics as metrics
+
+
+class EntryPipeline:
+    """
+    Dos etapas conectadas por colas: un hilo de transcripción (dueño del uso de Whisper)
+    y un hilo que hace la extracción con el LLM y escribe los archivos. Así la
+    transcripción de una entrada se solapa con la extracción de la anterior.
+    """
+
+    def __init__(self):
+        self._transcription_queue = Queue()
+        self._processing_queue = Queue()
+        self._lock = threading.Lock()
+        self._next_job_id = 1
+        self._pending = 0
+        self._results = []  # (job_id, excel_path o None, mensaje de error o None)
+        self._awaiting_save = {}  # job_id -> trabajo cuya hoja espera al guardado por lotes (per_site_month)
+        self._threads = [
+            threading.Thread(target=self._transcription_worker, name="pipeline-transcripcion", daemon=True),
+            threading.Thread(target=self._processing_worker, name="pipeline-procesamiento", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, current_date_str, audio_data=None, transcriber=None):
+        """
+        Encola una grabación terminada. Se pasa el AudioData o, en modo streaming,
+        el StreamingTranscriber que ya ha ido transcribiendo la grabación.
+        Devuelve el número de trabajo.
+        """
+        with self._lock:
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            self._pending += 1
+        # Las etapas en segundo plano se registran bajo el trace_id de la grabación
+        job = {"id": job_id, "date": current_date_str, "audio_data": audio_data, "transcriber": transcriber,
+               "trace_id": metrics.current_trace_id()}
+        self._transcription_queue.put(job)
+        print(f"📥 Entrada #{job_id} en cola para procesar en segundo plano.")
+        return job_id
+
+    def pending_count(self):
+        """Número de trabajos encolados o en proceso."""
+        with self._lock:
+            return self._pending
+
+    def close(self):
+        """Espera a que terminen todos los trabajos pendientes e imprime el resumen."""
+        pending = self.pending_count()
+        if pending:
+            print(f"\n⏳ Esperando a que terminen {pending} entrada(s) en segundo plano...")
+        self._transcription_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        site_workbooks.flush_all()
+        with self._lock:
+            unsaved = list(self._awaiting_save.values())
+        for job in unsaved:
+            self._finish(job, error="No se pudo guardar el libro de la Baustelle (¿está abierto en Excel?).")
+
+        if not self._results:
+            return
+        failed = [result for result in self._results if result[2]]
+        print(f"\n--- Resumen: {len(self._results) - len(failed)} entrada(s) guardada(s), {len(failed)} con errores ---")
+        for job_id, _, error in sorted(failed):
+            print(f"  ❌ Entrada #{job_id}: {error}")
+
+    def _finish(self, job, excel_path=None, error=None):
+        with self._lock:
+            self._awaiting_save.pop(job["id"], None)
+            self._pending -= 1
+            self._results.append((job["id"], excel_path, error))
+        if error:
+            print(f"\n❌ [Entrada #{job['id']}] {error}")
+        else:
+            print(f"\n✅ [Entrada #{job['id']}] Terminada: {excel_path}")
+
+    def _transcription_worker(self):
+        while True:
+            job = self._transcription_queue.get()
+            if job is None:
+                self._processing_queue.put(None)
+                return
+            with metrics.trace(job["trace_id"]):
+                try:
+                    transcribed_text = None
+                    if job["transcriber"] is not None:
+                        transcribed_text = job["transcriber"].finish()
+                        if transcribed_text is None:
+                            print(f"\n↩️ [Entrada #{job['id']}] Se transcribe la grabación completa.")
+                    if transcribed_text is None:
+                        transcribed_text = audio_processing.transcribe_with_whisper(job["audio_data"])
+                except Exception as e:
+                    traceback.print_exc()
+                    self._finish(job, error=f"Error durante la transcripción: {e}")
+                    continue
+                finally:
+                    # El audio ya no hace falta; se libera (con su archivo temporal) antes de esperar al LLM
+                    if job["audio_data"] is not None:
+                        job["audio_data"].close()
+                job["audio_data"] = None
+                job["transcriber"] = None
+                if not transcribed_text:
+                    self._finish(job, error="No se pudo obtener la transcripción. Vuelve a dictar esta entrada.")
+                    continue
+                job["text"] = transcribed_text
+                self._processing_queue.put(job)
+
+    def _processing_worker(self):
+        while True:
+            job = self._processing_queue.get()
+            if job is None:
+                return
+            with metrics.trace(job["trace_id"]):
+                try:
+                    bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(job["text"], job["date"])
+                    if not bautagebuch_data:
+                        self._finish(job, error="No se pudieron extraer los datos del Bautagebuch. "
+                                                f"Texto transcrito: {job['text']}")
+                        continue
+                    entry_processing.complete_bautagebuch_data(bautagebuch_data, job["date"])
+                    if config.OUTPUT_MODE == "per_site_month":
+                        # La hoja se guarda por lotes: el trabajo termina cuando el libro está en disco
+                        with self._lock:
+                            self._awaiting_save[job["id"]] = job
+                        entry_processing.render_entry(bautagebuch_data, job["date"], transcribed_text=job["text"],
+                                                      on_saved=lambda path, job=job: self._finish(job, path))
+                        continue
+                    excel_output_path = entry_processing.render_entry(bautagebuch_data, job["date"],
+                                                                      transcribed_text=job["text"])
+                    if excel_output_path:
+                        self._finish(job, excel_path=excel_output_path)
+                    else:
+                        self._finish(job, error="No se pudo rellenar o guardar el archivo Excel.")
+                except Exception as e:
+                    traceback.print_exc()
+                    self._finish(job, error=f"Error inesperado al procesar la entrada: {e}")
@@ -0,0 +1,49 @@
+# entry_processing.py
+# Pasos comunes a todos los modos (interactivo, lote) una vez extraídos los datos del LLM.
+
+# Importar módulos del proyecto
+import Modulos.config as config
+import Modulos.excel_processing as excel_processing
+import Modulos.site_workbooks as site_workbooks
+import Modulos.entry_store as entry_store
+
+
+def complete_bautagebuch_data(bautagebuch_data, current_date_str):
+    """
+    Asegura que el campo "Datum" tenga un valor válido.
+    El schema JSON ya tiene "Datum" como campo esperado; si el LLM no lo llenó, se usa la fecha actual.
+    """
+    if "Datum" not in bautagebuch_data or not bautagebuch_data.get("Datum") \
+            or bautagebuch_data.get("Datum") == "YYYY-MM-DD":
+        bautagebuch_data["Datum"] = current_date_str
+    return bautagebuch_data
+
+
+def render_entry(bautagebuch_data, current_date_str, output_basename=None, transcribed_text=None, persist=True,
+                 on_saved=None, entry_key=None):
+    """
+    Guarda la entrada en el almacén local y genera sus representaciones (txt y Excel).
+    Si se indica output_basename, se usa como nombre (sin extensión) de ambos archivos
+    en lugar del nombre con marca de tiempo. Devuelve la ruta del Excel o None.
+    Con config.OUTPUT_MODE = "per_site_month" la entrada se añade al libro de su Baustelle y mes,
+    que se guarda por lotes: la ruta devuelta solo existe tras on_saved(ruta) (ver SiteWorkbookWriter.add).
+    persist=False solo regenera los archivos (p. ej. desde el propio almacén).
+    entry_key es la clave de la entrada en el almacén; si no se indica se calcula de los datos y la transcripción.
+    """
+    if persist and config.ENTRY_STORE_ENABLED:
+        try:
+            entry_store.get_store().add_entry(bautagebuch_data, transcribed_text)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la entrada en el almacén local: {e}")
+
+    if config.OUTPUT_MODE == "per_site_month":
+        # Una hoja más en el libro de la Baustelle y el mes; se guarda por lotes
+        # La clave evita hojas repetidas al volver a procesar o regenerar la misma entrada
+        key = entry_key or entry_store.entry_key(bautagebuch_data, transcribed_text)
+        return site_workbooks.get_writer().add(bautagebuch_data, current_date_str, on_saved=on_saved, entry_key=key)
+
+    txt_filename = f"{output_basename}.txt" if output_basename else None
+    excel_filename = f"{output_basename}.xlsx" if output_basename else None
+
+    excel_processing.save_extended_text_details(bautagebuch_data, current_date_str, output_filename=txt_filename)
+    return excel_processing.fill_excel_bautagebuch(bautagebuch_data, output_filename=excel_filename)
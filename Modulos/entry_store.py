@@ -0,0 +1,331 @@
+# entry_store.py
+# Almacén local (SQLite) de todas las entradas extraídas del Bautagebuch.
+# El dict del LLM se guarda completo y, además, en columnas indexadas (Datum, Baustelle,
+# Auftrag) con una fila por persona de "Personal", para consultas rápidas.
+# Los Excel y txt pasan a ser representaciones que se pueden regenerar desde aquí.
+#
+# Uso desde la línea de comandos:
+#   python -m Modulos.entry_store horas --baustelle "Haus A" --desde 2026-03-01 --hasta 2026-03-31
+#   python -m Modulos.entry_store maengel
+#   python -m Modulos.entry_store entradas --baustelle "Haus A"
+#   python -m Modulos.entry_store regenerar --desde 2026-03-01
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+# Importar módulos del proyecto
+import Modulos.config as config
+import Modulos.excel_processing as excel_processing
+import Modulos.result_cache as result_cache
+import Modulos.site_workbooks as site_workbooks
+
+# Textos que significan "sin información" en los campos libres del schema
+EMPTY_TEXT_VALUES = ("", "keine details extrahiert.", "keine", "unbekannt", "none", "n/a")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    entry_key TEXT,
+    datum TEXT NOT NULL,
+    baustelle TEXT,
+    auftrag TEXT,
+    auftraggeber_bauleiter TEXT,
+    bauueberwachung_verantwortlicher TEXT,
+    wetter TEXT,
+    temperatur TEXT,
+    wind TEXT,
+    ausgefuehrte_arbeiten TEXT,
+    maengel_nachtragsleistungen TEXT,
+    transcript TEXT,
+    data_json TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS personal (
+    id INTEGER PRIMARY KEY,
+    entry_id INTEGER NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    typ TEXT,
+    name TEXT,
+    von TEXT,
+    bis TEXT,
+    pause_minuten INTEGER,
+    arbeitszeit_stunden REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_key ON entries(entry_key);
+CREATE INDEX IF NOT EXISTS idx_entries_datum ON entries(datum);
+CREATE INDEX IF NOT EXISTS idx_entries_baustelle_datum ON entries(baustelle, datum);
+CREATE INDEX IF NOT EXISTS idx_entries_auftrag ON entries(auftrag);
+CREATE INDEX IF NOT EXISTS idx_personal_entry ON personal(entry_id);
+CREATE INDEX IF NOT EXISTS idx_personal_name ON personal(name);
+"""
+
+# Periodos para agrupar horas (los mismos en timesheet)
+PERIODS = ("dia", "semana", "mes")
+
+_ENTRY_COLUMNS = ("datum", "baustelle", "auftrag", "auftraggeber_bauleiter", "bauueberwachung_verantwortlicher",
+                  "wetter", "temperatur", "wind", "ausgefuehrte_arbeiten", "maengel_nachtragsleistungen",
+                  "transcript", "data_json")
+
+
+def period_label(datum, period):
+    """Etiqueta del periodo de una fecha YYYY-MM-DD: "2026-03-02", "2026-W10" (semana ISO) o "2026-03"."""
+    datum = str(datum)
+    if period == "dia":
+        return datum[:10]
+    if period == "mes":
+        return datum[:7]
+    try:
+        iso_year, iso_week, _ = date.fromisoformat(datum[:10]).isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    except ValueError:
+        return "desconocido"
+
+
+def entry_key(bautagebuch_data, transcribed_text=None):
+    """
+    Clave de idempotencia: la misma Baustelle, Datum y transcripción son la misma entrada,
+    aunque se procese otra vez (caché del LLM, lote con --force, reintentos).
+    """
+    content = transcribed_text if transcribed_text else bautagebuch_data
+    return result_cache.make_cache_key(_text(bautagebuch_data.get("Baustelle")),
+                                       _text(bautagebuch_data.get("Datum")), content)
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _pause_minutes(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0
+
+
+class EntryStore:
+    """Conexión al almacén SQLite (modo WAL), segura para varios hilos del mismo proceso."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.ENTRY_STORE_PATH
+        config.ensure_dir(os.path.dirname(self.db_path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._migrate()
+            self._conn.executescript(_SCHEMA)
+        self._conn.create_function("periodo", 2, period_label, deterministic=True)
+
+    def _migrate(self):
+        """Añade entry_key a almacenes creados sin ella y deja solo la última copia de cada entrada repetida."""
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if not columns or "entry_key" in columns:
+            return
+        with self._conn:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN entry_key TEXT")
+            rows = self._conn.execute("SELECT id, transcript, data_json FROM entries ORDER BY id DESC").fetchall()
+            keys, duplicates = {}, []
+            for row in rows:
+                key = entry_key(json.loads(row["data_json"]), row["transcript"])
+                if key in keys:
+                    duplicates.append((row["id"],))
+                else:
+                    keys[key] = row["id"]
+            self._conn.executemany("UPDATE entries SET entry_key = ? WHERE id = ?", list(keys.items()))
+            self._conn.executemany("DELETE FROM entries WHERE id = ?", duplicates)
+        if duplicates:
+            print(f"🧹 Almacén de entradas: {len(duplicates)} entrada(s) repetida(s) eliminada(s).")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_entry(self, bautagebuch_data, transcribed_text=None):
+        """
+        Guarda una entrada y sus filas de Personal. Si la entrada ya estaba (misma entry_key),
+        se sustituyen sus datos en lugar de duplicarla. Devuelve el id de la entrada.
+        """
+        personal_list = bautagebuch_data.get("Personal", []) or []
+        key = entry_key(bautagebuch_data, transcribed_text)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in _ENTRY_COLUMNS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO entries (entry_key, {', '.join(_ENTRY_COLUMNS)}, created_at)"
+                f" VALUES (?, {', '.join('?' for _ in _ENTRY_COLUMNS)}, ?)"
+                f" ON CONFLICT(entry_key) DO UPDATE SET {updates}",
+                (
+                    key,
+                    _text(bautagebuch_data.get("Datum", config.get_current_date_str())),
+                    _text(bautagebuch_data.get("Baustelle")),
+                    _text(bautagebuch_data.get("Auftrag")),
+                    _text(bautagebuch_data.get("Auftraggeber_Bauleiter")),
+                    _text(bautagebuch_data.get("Bauueberwachung_Verantwortlicher")),
+                    _text(bautagebuch_data.get("Wetter")),
+                    _text(bautagebuch_data.get("Temperatur")),
+                    _text(bautagebuch_data.get("Wind")),
+                    _text(bautagebuch_data.get("Ausgefuehrte_Arbeiten")),
+                    _text(bautagebuch_data.get("Maengel_Nachtragsleistungen")),
+                    transcribed_text,
+                    json.dumps(bautagebuch_data, ensure_ascii=False),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+            entry_id = self._conn.execute("SELECT id FROM entries WHERE entry_key = ?", (key,)).fetchone()["id"]
+            self._conn.execute("DELETE FROM personal WHERE entry_id = ?", (entry_id,))
+            self._conn.executemany(
+                "INSERT INTO personal (entry_id, position, typ, name, von, bis, pause_minuten, arbeitszeit_stunden)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (entry_id, position, _text(person.get("Baustellenpersonal_Typ")), _text(person.get("Name")),
+                     _text(person.get("von")), _text(person.get("bis")),
+                     _pause_minutes(person.get("Pause_Minuten", "0")), excel_processing.resolve_arbeitszeit(person))
+                    for position, person in enumerate(personal_list)
+                    if isinstance(person, dict)
+                ],
+            )
+        return entry_id
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def _filters(baustelle=None, date_from=None, date_to=None):
+        clauses, params = [], []
+        if baustelle:
+            clauses.append("e.baustelle = ?")
+            params.append(baustelle)
+        if date_from:
+            clauses.append("e.datum >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("e.datum <= ?")
+            params.append(date_to)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def hours_per_worker(self, baustelle=None, date_from=None, date_to=None, period="semana"):
+        """Horas por trabajador, Baustelle y periodo ("dia", "semana" ISO o "mes")."""
+        if period not in PERIODS:
+            raise ValueError(f"Periodo no válido: {period}")
+        where, params = self._filters(baustelle, date_from, date_to)
+        return self._query(
+            "SELECT p.name AS name, e.baustelle AS baustelle, periodo(e.datum, ?) AS periodo,"
+            " ROUND(SUM(p.arbeitszeit_stunden), 2) AS stunden, COUNT(DISTINCT e.id) AS entradas"
+            f" FROM personal p JOIN entries e ON e.id = p.entry_id{where}"
+            " GROUP BY p.name, e.baustelle, periodo ORDER BY periodo, e.baustelle, p.name",
+            [period] + params,
+        )
+
+    def personal_columns(self, baustelle=None, date_from=None, date_to=None):
+        """Filas de Personal como columnas (listas) para el cálculo vectorizado de timesheet."""
+        where, params = self._filters(baustelle, date_from, date_to)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.name, e.baustelle, e.datum, p.von, p.bis, p.pause_minuten"
+                f" FROM personal p JOIN entries e ON e.id = p.entry_id{where} ORDER BY e.datum, e.id, p.position",
+                params,
+            ).fetchall()
+        names = ("name", "baustelle", "datum", "von", "bis", "pause_minuten")
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        return {name: list(column) for name, column in zip(names, columns)}
+
+    def open_maengel(self, baustelle=None, date_from=None, date_to=None):
+        """Entradas cuyo campo Maengel_Nachtragsleistungen tiene contenido."""
+        where, params = self._filters(baustelle, date_from, date_to)
+        placeholders = ", ".join("?" for _ in EMPTY_TEXT_VALUES)
+        condition = f"LOWER(TRIM(COALESCE(e.maengel_nachtragsleistungen, ''))) NOT IN ({placeholders})"
+        where = f"{where} AND {condition}" if where else f" WHERE {condition}"
+        return self._query(
+            "SELECT e.id AS id, e.datum AS datum, e.baustelle AS baustelle, e.auftrag AS auftrag,"
+            f" e.maengel_nachtragsleistungen AS maengel FROM entries e{where} ORDER BY e.datum, e.id",
+            params + list(EMPTY_TEXT_VALUES),
+        )
+
+    def entries(self, baustelle=None, date_from=None, date_to=None):
+        """Devuelve [(id, entry_key, datos del Bautagebuch)] de las entradas que cumplen los filtros."""
+        where, params = self._filters(baustelle, date_from, date_to)
+        rows = self._query(f"SELECT e.id AS id, e.entry_key AS entry_key, e.data_json AS data_json"
+                           f" FROM entries e{where} ORDER BY e.datum, e.id", params)
+        return [(row["id"], row["entry_key"], json.loads(row["data_json"])) for row in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Almacén compartido del proceso, abierto la primera vez que se usa."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EntryStore()
+        return _store
+
+
+def regenerate_renderings(baustelle=None, date_from=None, date_to=None):
+    """Vuelve a generar los Excel/txt de las entradas guardadas. Devuelve cuántas se generaron."""
+    # Importación diferida: entry_processing usa este módulo para guardar las entradas
+    import Modulos.entry_processing as entry_processing
+
+    generated = 0
+    saved_to_workbooks = []  # per_site_month: una ruta por entrada guardada de verdad en su libro
+    for entry_id, key, bautagebuch_data in get_store().entries(baustelle, date_from, date_to):
+        datum = bautagebuch_data.get("Datum", config.get_current_date_str())
+        basename = f"Bautagebuch_{str(datum).replace('-', '')}_" \
+                   f"{excel_processing.safe_filename_part(bautagebuch_data.get('Baustelle', 'Unbekannt'))}_{entry_id}"
+        excel_path = entry_processing.render_entry(bautagebuch_data, datum, output_basename=basename, persist=False,
+                                                   on_saved=saved_to_workbooks.append, entry_key=key)
+        if excel_path and config.OUTPUT_MODE != "per_site_month":
+            generated += 1
+    site_workbooks.flush_all()
+    return generated + len(saved_to_workbooks)
+
+
+def _print_rows(rows):
+    if not rows:
+        print("(sin resultados)")
+        return
+    columns = list(rows[0].keys())
+    widths = {col: max(len(col), *(len(str(row[col])) for row in rows)) for col in columns}
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    for row in rows:
+        print("  ".join(str(row[col]).ljust(widths[col]) for col in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre el almacén de entradas del Bautagebuch")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("horas", "Horas por trabajador, Baustelle y periodo"),
+                            ("maengel", "Entradas con Mängel/Nachtragsleistungen abiertos"),
+                            ("entradas", "Lista de entradas guardadas"),
+                            ("regenerar", "Vuelve a generar los Excel/txt desde el almacén")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--baustelle")
+        sub.add_argument("--desde", help="Fecha inicial YYYY-MM-DD")
+        sub.add_argument("--hasta", help="Fecha final YYYY-MM-DD")
+        if name == "horas":
+            sub.add_argument("--periodo", choices=PERIODS, default="semana")
+    args = parser.parse_args(argv)
+
+    store = get_store()
+    if args.command == "horas":
+        _print_rows(store.hours_per_worker(args.baustelle, args.desde, args.hasta, args.periodo))
+    elif args.command == "maengel":
+        _print_rows(store.open_maengel(args.baustelle, args.desde, args.hasta))
+    elif args.command == "entradas":
+        _print_rows([{"id": entry_id, "Datum": data.get("Datum"), "Baustelle": data.get("Baustelle"),
+                      "Auftrag": data.get("Auftrag"), "Personal": len(data.get("Personal", []) or [])}
+                     for entry_id, _, data in store.entries(args.baustelle, args.desde, args.hasta)])
+    elif args.command == "regenerar":
+        generated = regenerate_renderings(args.baustelle, args.desde, args.hasta)
+        print(f"✅ {generated} entrada(s) regenerada(s).")
+
+
+if __name__ == "__main__":
+    main()
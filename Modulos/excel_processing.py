@@ -1,11 +1,15 @@
 # excel_processing.py
-import openpyxl
-from openpyxl import Workbook # Aunque no la usas directamente para crear, es buena práctica si se extiende
 from datetime import datetime, timedelta
 import os
 
 # Importar configuraciones
 import Modulos.config as config
+import Modulos.excel_template as excel_template
+import Modulos.lazy_modules as lazy_modules
+import Modulos.metrics as metrics
+
+openpyxl = lazy_modules.lazy_import("openpyxl")  # Solo hace falta si no se usa el escritor rápido
+
 
 def calculate_arbeitszeit(von_str, bis_str, pause_min_str):
     """
@@ -44,33 +48,50 @@ def calculate_arbeitszeit(von_str, bis_str, pause_min_str):
         return None
 
 
-def fill_excel_bautagebuch(bautagebuch_data):
+def resolve_arbeitszeit(person):
     """
-    Fills the Bautagebuch Excel template with data from the JSON object.
-    Uses template_path and output_dir from config.
+    Final working hours of one Personal entry: the JSON value if it is > 0,
+    otherwise calculated from von/bis/Pause_Minuten.
     """
-    template_path = config.EXCEL_TEMPLATE_PATH
-    output_dir = config.FILLED_EXCEL_DIR
+    von_str = person.get("von", "HH:MM") # Default to placeholder if missing
+    bis_str = person.get("bis", "HH:MM") # Default to placeholder if missing
+    pause_str = person.get("Pause_Minuten", "0")
+    arbeitszeit_json_str = person.get("Arbeitszeit_Stunden", "0.0")
+    final_arbeitszeit = 0.0
+    try: # Try to use valid Arbeitszeit_Stunden from JSON if > 0
+        json_val_as_float = float(arbeitszeit_json_str)
+        if json_val_as_float > 0:
+            final_arbeitszeit = round(json_val_as_float, 2)
+        else: # If 0.0 or invalid, trigger calculation
+            raise ValueError("Value is 0.0 or non-positive, attempt calculation")
+    except (ValueError, TypeError):
+        calculated_zeit = calculate_arbeitszeit(von_str, bis_str, pause_str)
+        if calculated_zeit is not None:
+            final_arbeitszeit = calculated_zeit
+        else: # Calculation failed, try original JSON value or default to 0.0
+            try:
+                final_arbeitszeit = round(float(arbeitszeit_json_str), 2)
+            except (ValueError, TypeError):
+                final_arbeitszeit = 0.0
+    return final_arbeitszeit
 
-    try:
-        wb = openpyxl.load_workbook(template_path)
-        ws = wb.active
-    except FileNotFoundError:
-        print(f"❌ Error: Template file not found at {template_path}")
-        return None
-    except Exception as e:
-        print(f"❌ Error loading Excel template: {e}")
-        return None
+
+def build_excel_cell_values(bautagebuch_data):
+    """
+    Maps the JSON object to the template cells.
+    Returns a dict {cell reference: value} in the order the cells are written.
+    """
+    cell_values = {}
 
     # --- Fill simple fields ---
-    ws['B3'] = bautagebuch_data.get("Baustelle", "Unbekannt")
-    ws['B7'] = bautagebuch_data.get("Auftraggeber_Bauleiter", "Unbekannt")
-    ws['B8'] = bautagebuch_data.get("Bauueberwachung_Verantwortlicher", "Unbekannt")
-    ws['E3'] = bautagebuch_data.get("Datum", config.get_current_date_str()) # Default to current if not in data
-    ws['E4'] = bautagebuch_data.get("Auftrag", "Unbekannt")
-    ws['B11'] = bautagebuch_data.get("Wetter", "Unbekannt")
-    ws['E11'] = bautagebuch_data.get("Temperatur", "None")
-    ws['H11'] = bautagebuch_data.get("Wind", "Unbekannt")
+    cell_values['B3'] = bautagebuch_data.get("Baustelle", "Unbekannt")
+    cell_values['B7'] = bautagebuch_data.get("Auftraggeber_Bauleiter", "Unbekannt")
+    cell_values['B8'] = bautagebuch_data.get("Bauueberwachung_Verantwortlicher", "Unbekannt")
+    cell_values['E3'] = bautagebuch_data.get("Datum", config.get_current_date_str()) # Default to current if not in data
+    cell_values['E4'] = bautagebuch_data.get("Auftrag", "Unbekannt")
+    cell_values['B11'] = bautagebuch_data.get("Wetter", "Unbekannt")
+    cell_values['E11'] = bautagebuch_data.get("Temperatur", "None")
+    cell_values['H11'] = bautagebuch_data.get("Wind", "Unbekannt")
 
     # --- Fill Personal Data ---
     personal_list = bautagebuch_data.get("Personal", [])
@@ -81,60 +102,112 @@ def fill_excel_bautagebuch(bautagebuch_data):
         current_row = start_row_personal + i
         if i < len(personal_list):
             person = personal_list[i]
-            ws[f'A{current_row}'] = person.get("Baustellenpersonal_Typ", "Unbekannt")
-            ws[f'B{current_row}'] = person.get("Name", "Unbekannt")
+            cell_values[f'A{current_row}'] = person.get("Baustellenpersonal_Typ", "Unbekannt")
+            cell_values[f'B{current_row}'] = person.get("Name", "Unbekannt")
             von_str = person.get("von", "HH:MM") # Default to placeholder if missing
             bis_str = person.get("bis", "HH:MM") # Default to placeholder if missing
             pause_str = person.get("Pause_Minuten", "0")
 
-            ws[f'C{current_row}'] = von_str
-            ws[f'D{current_row}'] = bis_str
+            cell_values[f'C{current_row}'] = von_str
+            cell_values[f'D{current_row}'] = bis_str
             try:
-                ws[f'E{current_row}'] = int(pause_str)
+                cell_values[f'E{current_row}'] = int(pause_str)
             except ValueError:
-                ws[f'E{current_row}'] = 0 # Default pause to 0 if invalid
-
-            arbeitszeit_json_str = person.get("Arbeitszeit_Stunden", "0.0")
-            final_arbeitszeit = 0.0
-            try: # Try to use valid Arbeitszeit_Stunden from JSON if > 0
-                json_val_as_float = float(arbeitszeit_json_str)
-                if json_val_as_float > 0:
-                    final_arbeitszeit = round(json_val_as_float, 2)
-                else: # If 0.0 or invalid, trigger calculation
-                    raise ValueError("Value is 0.0 or non-positive, attempt calculation")
-            except (ValueError, TypeError):
-                calculated_zeit = calculate_arbeitszeit(von_str, bis_str, pause_str)
-                if calculated_zeit is not None:
-                    final_arbeitszeit = calculated_zeit
-                else: # Calculation failed, try original JSON value or default to 0.0
-                    try:
-                        final_arbeitszeit = round(float(arbeitszeit_json_str), 2)
-                    except (ValueError, TypeError):
-                        final_arbeitszeit = 0.0
-            ws[f'F{current_row}'] = final_arbeitszeit
+                cell_values[f'E{current_row}'] = 0 # Default pause to 0 if invalid
+
+            cell_values[f'F{current_row}'] = resolve_arbeitszeit(person)
         else: # Clear rows if fewer entries than max
             for col_letter in ['A', 'B', 'C', 'D', 'E', 'F']:
-                 ws[f'{col_letter}{current_row}'] = ""
+                 cell_values[f'{col_letter}{current_row}'] = ""
 
     # --- Fill other text fields ---
-    ws['C24'] = bautagebuch_data.get("Ausgefuehrte_Arbeiten", "Keine Details extrahiert.")
-    ws['C29'] = bautagebuch_data.get("Montagegeraete", "Keine Details extrahiert.")
-    ws['C31'] = bautagebuch_data.get("Sonstige_Geraeteeinsaetze", "Keine Details extrahiert.")
-    ws['C33'] = bautagebuch_data.get("Materialanlieferungen", "Keine Details extrahiert.")
-    ws['C35'] = bautagebuch_data.get("Kundenanweisungen", "Keine Details extrahiert.")
-    ws['C37'] = bautagebuch_data.get("Informationen_Fremdfirmen_Fremdleistungen", "Keine Details extrahiert.")
-    ws['C41'] = bautagebuch_data.get("Maengel_Nachtragsleistungen", "Keine Details extrahiert.")
+    cell_values['C24'] = bautagebuch_data.get("Ausgefuehrte_Arbeiten", "Keine Details extrahiert.")
+    cell_values['C29'] = bautagebuch_data.get("Montagegeraete", "Keine Details extrahiert.")
+    cell_values['C31'] = bautagebuch_data.get("Sonstige_Geraeteeinsaetze", "Keine Details extrahiert.")
+    cell_values['C33'] = bautagebuch_data.get("Materialanlieferungen", "Keine Details extrahiert.")
+    cell_values['C35'] = bautagebuch_data.get("Kundenanweisungen", "Keine Details extrahiert.")
+    cell_values['C37'] = bautagebuch_data.get("Informationen_Fremdfirmen_Fremdleistungen", "Keine Details extrahiert.")
+    cell_values['C41'] = bautagebuch_data.get("Maengel_Nachtragsleistungen", "Keine Details extrahiert.")
 
-    # --- Save the filled workbook ---
+    return cell_values
+
+
+def safe_filename_part(name, fallback="Allgemein"):
+    """Sanitizes a name (e.g. the Baustelle) for use in a filename."""
+    name = str(name).replace(" ", "_").replace("/", "-")
+    valid_name = "".join(c for c in name if c.isalnum() or c in ('_', '-'))
+    return valid_name or fallback # Fallback if sanitization results in empty string
+
+
+def _default_output_filename(bautagebuch_data):
+    datum_for_filename = bautagebuch_data.get('Datum', config.get_current_date_str()).replace('-', '')
+    timestamp_filename = datetime.now().strftime("%Y%m%d_%H%M%S")
+    valid_baustelle_name = safe_filename_part(bautagebuch_data.get("Baustelle", "Unbekannt"))
+
+    return f"Bautagebuch_{datum_for_filename}_{valid_baustelle_name}_{timestamp_filename}.xlsx"
+
+
+def _fill_excel_fast(template_path, bautagebuch_data, output_dir, output_filename):
+    """
+    Fast path: patches only the sheet XML of the pre-parsed template (see excel_template).
+    Returns the output path, None on error, or False if openpyxl must be used instead.
+    """
     try:
-        datum_for_filename = bautagebuch_data.get('Datum', config.get_current_date_str()).replace('-', '')
-        timestamp_filename = datetime.now().strftime("%Y%m%d_%H%M%S")
-        baustelle_name = bautagebuch_data.get("Baustelle", "Unbekannt").replace(" ", "_").replace("/", "-")
-        # Sanitize Baustelle name for filename
-        valid_baustelle_name = "".join(c for c in baustelle_name if c.isalnum() or c in ('_', '-'))
-        if not valid_baustelle_name: valid_baustelle_name = "Allgemein" # Fallback if sanitization results in empty string
+        template = excel_template.get_template(template_path)
+    except FileNotFoundError:
+        print(f"❌ Error: Template file not found at {template_path}")
+        return None
+    except Exception as e:
+        print(f"⚠️ Fast Excel writer not available for this template ({e}), using openpyxl.")
+        return False
+
+    cell_values = build_excel_cell_values(bautagebuch_data)
+    sheet_xml = template.render_sheet(cell_values)
+    if sheet_xml is None: # A value openpyxl would convert differently (formula, date, ...)
+        return False
 
-        output_filename = f"Bautagebuch_{datum_for_filename}_{valid_baustelle_name}_{timestamp_filename}.xlsx"
+    try:
+        output_filename = output_filename or _default_output_filename(bautagebuch_data)
+        output_file_path = os.path.join(output_dir, output_filename)
+        template.save(sheet_xml, output_file_path)
+        print(f"\n✅ Bautagebuch Excel guardado en: {output_file_path}")
+        return output_file_path
+    except Exception as e:
+        print(f"❌ Error al guardar el archivo Excel: {e}")
+        return None
+
+
+@metrics.instrument("excel")
+def fill_excel_bautagebuch(bautagebuch_data, output_filename=None):
+    """
+    Fills the Bautagebuch Excel template with data from the JSON object.
+    Uses template_path and output_dir from config.
+    If output_filename is None, a timestamped name is generated.
+    """
+    template_path = config.EXCEL_TEMPLATE_PATH
+    output_dir = config.ensure_dir(config.FILLED_EXCEL_DIR)
+
+    if config.EXCEL_FAST_WRITER:
+        result = _fill_excel_fast(template_path, bautagebuch_data, output_dir, output_filename)
+        if result is not False:
+            return result
+
+    try:
+        wb = openpyxl.load_workbook(template_path)
+        ws = wb.active
+    except FileNotFoundError:
+        print(f"❌ Error: Template file not found at {template_path}")
+        return None
+    except Exception as e:
+        print(f"❌ Error loading Excel template: {e}")
+        return None
+
+    for cell_ref, value in build_excel_cell_values(bautagebuch_data).items():
+        ws[cell_ref] = value
+
+    # --- Save the filled workbook ---
+    try:
+        output_filename = output_filename or _default_output_filename(bautagebuch_data)
         output_file_path = os.path.join(output_dir, output_filename)
 
         wb.save(output_file_path)
@@ -145,28 +218,38 @@ def fill_excel_bautagebuch(bautagebuch_data):
         return None
 
 
-def save_extended_text_details(bautagebuch_data, current_date_str):
-    """Saves extended details to a text file."""
-    if not bautagebuch_data:
-        print("No hay datos para guardar en archivo de texto.")
-        return
-
+def format_extended_text_details(bautagebuch_data, current_date_str):
+    """Returns the text written to the extended details file."""
     # Usar la clave "Ausgefuehrte_Arbeiten" según el JSON_SCHEMA_FOR_LLM
     # Si el LLM produce otra clave como "ausgefuehrte_arbeiten_details" y quieres esa,
     # deberías ajustar el schema o cómo accedes a este dato aquí.
     extended_details = bautagebuch_data.get("Ausgefuehrte_Arbeiten", "No se proporcionaron detalles.")
-    timestamp_filename = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return (f"Datum: {bautagebuch_data.get('Datum', current_date_str)}\n" # 'Datum' con mayúscula
+            f"Baustelle: {bautagebuch_data.get('Baustelle', 'N/A')}\n\n" # 'Baustelle' con mayúscula
+            "Ausgeführte Arbeiten (Details):\n"
+            f"{extended_details}")
+
+
+@metrics.instrument("txt")
+def save_extended_text_details(bautagebuch_data, current_date_str, output_filename=None):
+    """
+    Saves extended details to a text file.
+    If output_filename is None, a timestamped name is generated.
+    """
+    if not bautagebuch_data:
+        print("No hay datos para guardar en archivo de texto.")
+        return None
+
+    if output_filename is None:
+        timestamp_filename = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"bautagebuch_extended_{timestamp_filename}.txt"
 
-    extended_txt_filename = os.path.join(
-        config.EXTENDED_TASKS_DIR,
-        f"bautagebuch_extended_{timestamp_filename}.txt"
-    )
+    extended_txt_filename = os.path.join(config.ensure_dir(config.EXTENDED_TASKS_DIR), output_filename)
     try:
         with open(extended_txt_filename, "w", encoding="utf-8") as f:
-            f.write(f"Datum: {bautagebuch_data.get('Datum', current_date_str)}\n") # 'Datum' con mayúscula
-            f.write(f"Baustelle: {bautagebuch_data.get('Baustelle', 'N/A')}\n\n") # 'Baustelle' con mayúscula
-            f.write("Ausgeführte Arbeiten (Details):\n")
-            f.write(extended_details)
+            f.write(format_extended_text_details(bautagebuch_data, current_date_str))
         print(f"\n📝 Detalles extendidos guardados en: {extended_txt_filename}")
+        return extended_txt_filename
     except Exception as e:
-        print(f"⚠️ Error al guardar el archivo de texto extendido: {e}")
\ No newline at end of file
+        print(f"⚠️ Error al guardar el archivo de texto extendido: {e}")
+        return None
\ No newline at end of file
@@ -0,0 +1,196 @@
+# excel_template.py
+# Fast writer for the Bautagebuch template: the xlsx (a zip) is read and its active sheet
+# is tokenized once. Each output only rebuilds the rows of the sheet XML that contain
+# filled cells; every other zip member is written back byte-for-byte.
+# Cell values are serialized the way openpyxl 3.1 does (inline strings, "%.16g" numbers),
+# so the content is the same as with openpyxl.load_workbook + save.
+import math
+import os
+import posixpath
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_SHEET_DATA_RE = re.compile(r'<sheetData\b[^>]*?(?:/>|>(.*?)</sheetData>)', re.S)
+_ROW_RE = re.compile(r'<row\b[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b[^>]*?(?:/>|>.*?</c>)', re.S)
+_ROW_NUM_RE = re.compile(r'\sr="(\d+)"')
+_CELL_REF_RE = re.compile(r'\sr="([A-Z]+)(\d+)"')
+_STYLE_RE = re.compile(r'\ss="(\d+)"')
+_REF_RE = re.compile(r'^([A-Z]+)(\d+)$')
+
+# Same rules as openpyxl.cell.cell (illegal XML characters, max string length, error codes)
+_ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+_MAX_STRING_LENGTH = 32767
+_ERROR_CODES = ('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A')
+
+
+class UnsupportedValue(Exception):
+    """A value the fast writer does not serialize; the caller falls back to openpyxl."""
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index
+
+
+def _split_ref(cell_ref):
+    match = _REF_RE.match(cell_ref)
+    if not match:
+        raise UnsupportedValue(f"Invalid cell reference: {cell_ref}")
+    return _column_index(match.group(1)), int(match.group(2))
+
+
+def _render_cell(cell_ref, style_attr, value):
+    """Serializes one <c> element like openpyxl's etree_write_cell."""
+    attrs = f' r="{cell_ref}"{style_attr}'
+    value_type = type(value)
+    if value is None:
+        return f'<c{attrs} t="n"/>'
+    if value_type is bool:
+        return f'<c{attrs} t="b"><v>{int(value)}</v></c>'
+    if value_type in (int, float):
+        if math.isnan(value) or math.isinf(value):
+            return f'<c{attrs} t="n"><v></v></c>'
+        return f'<c{attrs} t="n"><v>{"%.16g" % value}</v></c>'
+    if value_type is str:
+        value = value[:_MAX_STRING_LENGTH]
+        if _ILLEGAL_CHARACTERS_RE.search(value) or (len(value) > 1 and value.startswith("=")):
+            raise UnsupportedValue(f"{cell_ref}: formula or illegal characters")
+        if value in _ERROR_CODES:
+            return f'<c{attrs} t="e"><v>{escape(value)}</v></c>'
+        if value == "":
+            return f'<c{attrs} t="inlineStr"/>'
+        space = ' xml:space="preserve"' if value != value.strip() else ''
+        return f'<c{attrs} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+    raise UnsupportedValue(f"{cell_ref}: unsupported type {value_type.__name__}")
+
+
+class ExcelTemplate:
+    """A parsed xlsx template whose active sheet can be rendered with new cell values."""
+
+    def __init__(self, template_path):
+        with zipfile.ZipFile(template_path) as zf:
+            self._members = [(info, zf.read(info)) for info in zf.infolist()]
+        files = {info.filename: data for info, data in self._members}
+        self.sheet_path = self._find_active_sheet(files)
+
+        sheet_xml = files[self.sheet_path].decode("utf-8")
+        match = _SHEET_DATA_RE.search(sheet_xml)
+        if not match:
+            raise ValueError("sheetData not found in the active sheet")
+        self._prefix = sheet_xml[:match.start()]
+        self._suffix = sheet_xml[match.end():]
+
+        # Row tokens: row number -> (open tag, [(column, reference, cell xml)], original row xml)
+        self._rows = {}
+        for row_xml in _ROW_RE.findall(match.group(1) or ""):
+            open_tag = row_xml[:row_xml.index(">") + 1]
+            row_number = int(_ROW_NUM_RE.search(open_tag).group(1))
+            if open_tag.endswith("/>"):
+                open_tag = open_tag[:-2].rstrip() + ">"
+            cells = []
+            for cell_xml in _CELL_RE.findall(row_xml[len(open_tag):]):
+                ref_match = _CELL_REF_RE.search(cell_xml[:cell_xml.index(">") + 1])
+                cells.append((_column_index(ref_match.group(1)), ref_match.group(1) + ref_match.group(2), cell_xml))
+            self._rows[row_number] = (open_tag, cells, row_xml)
+
+    @staticmethod
+    def _find_active_sheet(files):
+        """Path of the sheet openpyxl's workbook.active would return (the activeTab)."""
+        workbook = ET.fromstring(files["xl/workbook.xml"])
+        active_tab = 0
+        view = workbook.find(f"{_MAIN_NS}bookViews/{_MAIN_NS}workbookView")
+        if view is not None:
+            active_tab = int(view.get("activeTab", 0))
+        sheets = workbook.findall(f"{_MAIN_NS}sheets/{_MAIN_NS}sheet")
+        rel_id = sheets[active_tab].get(f"{_REL_NS}id")
+
+        rels = ET.fromstring(files["xl/_rels/workbook.xml.rels"])
+        for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target")
+                if target.startswith("/"):
+                    return target.lstrip("/")
+                return posixpath.normpath(posixpath.join("xl", target))
+        raise ValueError(f"Relationship {rel_id} of the active sheet not found")
+
+    def _style_of(self, cell_xml):
+        if cell_xml is None:
+            return ""
+        match = _STYLE_RE.search(cell_xml[:cell_xml.index(">") + 1])
+        # openpyxl only writes s for styled cells (style id != 0)
+        return f' s="{match.group(1)}"' if match and match.group(1) != "0" else ""
+
+    def render_sheet(self, cell_values):
+        """
+        Returns the sheet XML with the given {reference: value} written,
+        or None if a value needs openpyxl (formulas, dates, illegal characters, ...).
+        """
+        patched_rows = {}
+        try:
+            for cell_ref, value in cell_values.items():
+                column, row_number = _split_ref(cell_ref)
+                patched_rows.setdefault(row_number, {})[column] = (cell_ref, value)
+
+            row_xmls = []
+            for row_number in sorted(set(self._rows) | set(patched_rows)):
+                patches = patched_rows.get(row_number)
+                if row_number in self._rows:
+                    open_tag, cells, row_xml = self._rows[row_number]
+                else:
+                    open_tag, cells, row_xml = f'<row r="{row_number}">', [], None
+                if not patches:
+                    row_xmls.append(row_xml)
+                    continue
+
+                existing = {column: (cell_ref, cell_xml) for column, cell_ref, cell_xml in cells}
+                parts = [open_tag]
+                for column in sorted(set(existing) | set(patches)):
+                    if column in patches:
+                        cell_ref, value = patches[column]
+                        original_xml = existing.get(column, (None, None))[1]
+                        parts.append(_render_cell(cell_ref, self._style_of(original_xml), value))
+                    else:
+                        parts.append(existing[column][1])
+                parts.append("</row>")
+                row_xmls.append("".join(parts))
+        except UnsupportedValue:
+            return None
+
+        return f"{self._prefix}<sheetData>{''.join(row_xmls)}</sheetData>{self._suffix}"
+
+    def save(self, sheet_xml, output_path):
+        """Writes the workbook with the rendered sheet; all other members are copied unchanged."""
+        sheet_bytes = sheet_xml.encode("utf-8")
+        with zipfile.ZipFile(output_path, "w") as zout:
+            for info, data in self._members:
+                # A fresh ZipInfo per output: writestr mutates it and templates are shared between threads
+                out_info = zipfile.ZipInfo(info.filename, info.date_time)
+                out_info.compress_type = info.compress_type
+                out_info.external_attr = info.external_attr
+                zout.writestr(out_info, sheet_bytes if info.filename == self.sheet_path else data)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(template_path):
+    """Parsed template for template_path, re-parsed only if the file changes."""
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), stat.st_mtime_ns, stat.st_size)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = ExcelTemplate(template_path)
+            _templates[key] = template
+        return template
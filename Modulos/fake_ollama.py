@@ -0,0 +1,195 @@
+# fake_ollama.py
+# Servidor HTTP local que imita la API de chat de Ollama con una respuesta JSON fija y una
+# latencia configurable. Permite medir y probar el programa sin GPU, sin modelo y sin red.
+#
+# Uso independiente (y después OLLAMA_HOST = "http://127.0.0.1:11435"):
+#   python -m Modulos.fake_ollama --puerto 11435 --latencia 1.5 --tokens-por-segundo 40
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Entrada de ejemplo con todos los campos de config.JSON_SCHEMA_FOR_LLM
+DEFAULT_RESPONSE = {
+    "Baustelle": "Musterstraße 12, Köln",
+    "Auftraggeber_Bauleiter": "Herr Becker",
+    "Bauueberwachung_Verantwortlicher": "Frau Schneider",
+    "Datum": "2026-03-02",
+    "Auftrag": "Fenstermontage 2. OG",
+    "Wetter": "bewölkt",
+    "Temperatur": "8",
+    "Wind": "schwach",
+    "Personal": [
+        {"Baustellenpersonal_Typ": "Monteur", "Name": "Jan Kowalski", "von": "07:00", "bis": "16:00",
+         "Pause_Minuten": "45", "Arbeitszeit_Stunden": "0.0"},
+        {"Baustellenpersonal_Typ": "Monteur", "Name": "Piotr Nowak", "von": "07:00", "bis": "15:30",
+         "Pause_Minuten": "30", "Arbeitszeit_Stunden": "0.0"},
+        {"Baustellenpersonal_Typ": "Helfer", "Name": "Ali Demir", "von": "07:30", "bis": "16:00",
+         "Pause_Minuten": "30", "Arbeitszeit_Stunden": "0.0"},
+    ],
+    "Ausgefuehrte_Arbeiten": "Zwölf Fensterelemente im 2. OG gesetzt, ausgerichtet und verschraubt. "
+                             "Anschlussfugen mit Kompriband abgedichtet.",
+    "Montagegeraete": "Glasheber, Akkuschrauber",
+    "Sonstige_Geraeteeinsaetze": "Autokran 2 Stunden für die Anlieferung",
+    "Materialanlieferungen": "12 Fensterelemente, 2 Paletten Montagematerial",
+    "Kundenanweisungen": "Keine Details extrahiert.",
+    "Informationen_Fremdfirmen_Fremdleistungen": "Gerüstbauer hat das Gerüst an der Nordseite erweitert.",
+    "Maengel_Nachtragsleistungen": "Ein Fensterelement mit Kratzer, Reklamation an den Hersteller.",
+}
+
+# Caracteres por "token" al trocear la respuesta (aprox. lo que genera un modelo de Ollama)
+_CHARS_PER_TOKEN = 4
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Responde a /api/chat (con y sin streaming) y a las rutas de estado que consulta el cliente."""
+
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args):
+        pass  # Sin una línea por petición en la consola
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": self.server.model_name, "model": self.server.model_name}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": f"ruta no soportada por el servidor simulado: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": "petición JSON no válida"})
+            return
+
+        with self.server.stats_lock:
+            self.server.requests_served += 1
+        content = json.dumps(self.server.response_for(request.get("format")), ensure_ascii=False)
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        tokens = [content[i:i + _CHARS_PER_TOKEN] for i in range(0, len(content), _CHARS_PER_TOKEN)]
+        stats = {
+            "prompt_eval_count": max(1, prompt_chars // _CHARS_PER_TOKEN),
+            "prompt_eval_duration": int(self.server.latency_seconds * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) / self.server.tokens_per_second * 1e9),
+            "load_duration": 0,
+        }
+        stats["total_duration"] = stats["prompt_eval_duration"] + stats["eval_duration"]
+        model = request.get("model") or self.server.model_name
+
+        # Tiempo hasta el primer token (evaluación del prompt)
+        time.sleep(self.server.latency_seconds)
+        if request.get("stream", True):
+            self._stream(model, tokens, stats)
+        else:
+            time.sleep(len(tokens) / self.server.tokens_per_second)
+            self._send_json(200, dict(model=model, created_at=_now(), done=True, done_reason="stop",
+                                      message={"role": "assistant", "content": content}, **stats))
+
+    def _stream(self, model, tokens, stats):
+        """Un objeto JSON por línea, como Ollama; la conexión se cierra al terminar (HTTP/1.0)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        delay = 1.0 / self.server.tokens_per_second
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                chunk = {"model": model, "created_at": _now(), "done": False,
+                         "message": {"role": "assistant", "content": token}}
+                self.wfile.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            final = dict(model=model, created_at=_now(), done=True, done_reason="stop",
+                         message={"role": "assistant", "content": ""}, **stats)
+            self.wfile.write(json.dumps(final).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente cerró el stream al tener el objeto completo
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Servidor simulado; cada petición se atiende en su propio hilo, como varias ranuras de Ollama."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency_seconds=1.0, tokens_per_second=40.0, response=None,
+                 model_name="fake-llm"):
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.latency_seconds = latency_seconds
+        self.tokens_per_second = max(tokens_per_second, 1e-3)
+        self.response = response if response is not None else DEFAULT_RESPONSE
+        self.model_name = model_name
+        self.requests_served = 0
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def response_for(self, output_schema):
+        """Con salida estructurada solo se devuelven los campos que pide el schema (p. ej. una sección)."""
+        properties = (output_schema or {}).get("properties") if isinstance(output_schema, dict) else None
+        if not properties:
+            return self.response
+        return {key: value for key, value in self.response.items() if key in properties}
+
+    def start_in_background(self):
+        """Atiende peticiones en un hilo daemon y devuelve la URL para config.OLLAMA_HOST."""
+        threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True).start()
+        return self.url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de chat de Ollama")
+    parser.add_argument("--puerto", type=int, default=11435)
+    parser.add_argument("--latencia", type=float, default=1.0, help="Segundos hasta el primer token")
+    parser.add_argument("--tokens-por-segundo", type=float, default=40.0)
+    parser.add_argument("--respuesta", help="Archivo JSON con la entrada que se devuelve (por defecto una de ejemplo)")
+    args = parser.parse_args(argv)
+
+    response = None
+    if args.respuesta:
+        with open(args.respuesta, "r", encoding="utf-8") as f:
+            response = json.load(f)
+    server = FakeOllamaServer(args.puerto, args.latencia, args.tokens_por_segundo, response)
+    print(f"🤖 Ollama simulado en {server.url} (latencia {args.latencia} s, {args.tokens_por_segundo} tokens/s). "
+          f"Ctrl+C para parar.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# lazy_modules.py
+# Importación diferida de dependencias pesadas (torch, whisper, ollama, openpyxl...).
+# lazy_import("torch") devuelve al instante un módulo sustituto; la importación real se hace
+# la primera vez que se accede a uno de sus atributos, p. ej. en el hilo de precarga.
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Módulo sustituto que importa el módulo real en el primer acceso a un atributo."""
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def load(self):
+        """Importa (si hace falta) y devuelve el módulo real."""
+        module = self.__dict__.get("_module")
+        if module is None:
+            # importlib ya serializa importaciones concurrentes del mismo módulo entre hilos
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __repr__(self):
+        state = "cargado" if "_module" in self.__dict__ else "sin cargar"
+        return f"<módulo diferido '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Devuelve el módulo si ya está importado o un LazyModule que lo importará al usarse."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
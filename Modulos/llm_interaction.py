@@ -1,78 +1,468 @@
 # llm_interaction.py
-import ollama
+import contextvars
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Importar configuraciones
 import Modulos.config as config
+import Modulos.result_cache as result_cache
+import Modulos.lazy_modules as lazy_modules
+import Modulos.metrics as metrics
+import Modulos.pre_extraction as pre_extraction
 
-def get_llm_prompt(transcribed_text, current_date_str):
-    """Genera el prompt para el LLM."""
-    prompt = f"""
+# El cliente de Ollama (httpx, pydantic) se importa al hacer la primera petición
+ollama = lazy_modules.lazy_import("ollama")
+
+# Versión del prompt: subirla cuando cambien los mensajes de get_llm_messages para invalidar la caché de extracciones
+PROMPT_VERSION = 2
+
+# Cliente de Ollama compartido: reutiliza el pool de conexiones HTTP entre entradas e hilos
+_ollama_client = None
+_ollama_client_lock = threading.Lock()
+# Pasa a False si el servidor rechaza el JSON Schema en format (Ollama < 0.5); se sigue con el prompt solo
+_structured_output_supported = True
+
+
+def get_ollama_client():
+    """Devuelve el cliente de Ollama compartido, creándolo la primera vez."""
+    global _ollama_client
+    with _ollama_client_lock:
+        if _ollama_client is None:
+            _ollama_client = ollama.Client(host=config.OLLAMA_HOST)
+        return _ollama_client
+
+
+def schema_template_to_json_schema(template):
+    """
+    Convierte la plantilla de ejemplo de config.JSON_SCHEMA_FOR_LLM (valores por defecto)
+    en un JSON Schema real para el parámetro format de Ollama (salida estructurada).
+    """
+    if isinstance(template, dict):
+        return {
+            "type": "object",
+            "properties": {key: schema_template_to_json_schema(value) for key, value in template.items()},
+            "required": list(template.keys()),
+        }
+    if isinstance(template, list):
+        item_schema = schema_template_to_json_schema(template[0]) if template else {"type": "string"}
+        return {"type": "array", "items": item_schema}
+    if isinstance(template, bool):
+        return {"type": "boolean"}
+    if isinstance(template, int):
+        return {"type": "integer"}
+    if isinstance(template, float):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+LLM_SCHEMA_TEMPLATE = json.loads(config.JSON_SCHEMA_FOR_LLM)
+LLM_OUTPUT_JSON_SCHEMA = schema_template_to_json_schema(LLM_SCHEMA_TEMPLATE)
+
+
+def get_llm_system_prompt(schema_text=None):
+    """
+    Parte fija del prompt (instrucciones y schema). Es idéntica en todas las entradas,
+    así Ollama puede reutilizar la evaluación de este prefijo entre peticiones.
+    """
+    schema_text = schema_text or config.JSON_SCHEMA_FOR_LLM
+    return f"""
 Du bist ein KI-Assistent, der darauf spezialisiert ist, transkribierte deutsche Spracheingaben von Baustellen zu analysieren und die relevanten Informationen für ein Bautagebuch zu extrahieren.
 Deine Aufgabe ist es, die Informationen gemäß der folgenden JSON-Struktur zu formatieren.
 Achte genau auf Details wie Namen, Ränge und Stunden der Arbeiter, den gesamten Arbeitszeitraum sowie die detaillierten Beschreibungen der Tätigkeiten.
-Das Datum für diesen Bericht ist {current_date_str}. Bitte verwende dieses Datum im Feld "Datum".
+Verwende im Feld "Datum" das Datum, das mit der Spracheingabe angegeben wird.
 Das JSON-Format muss exakt eingehalten werden. Fülle alle Felder des JSON-Schemas bestmöglich aus. Wenn Informationen für bestimmte Felder nicht explizit genannt werden, verwende die Standardwerte aus dem Schema (z.B. "Unbekannt", "None", leere Listen [] oder 0).
+Antworte ausschließlich mit dem JSON-Objekt.
+
+Gewünschtes JSON-Schema (fülle dieses Schema mit den extrahierten Daten):
+{schema_text}
+"""
+
+
+def get_llm_messages(transcribed_text, current_date_str, schema_text=None):
+    """Genera los mensajes para el LLM: prefijo fijo en el system prompt, datos variables al final."""
+    user_content = f"""Das Datum für diesen Bericht ist {current_date_str}.
 
 Hier ist die transkribierte Spracheingabe:
 "{transcribed_text}"
+"""
+    return [
+        {'role': 'system', 'content': get_llm_system_prompt(schema_text)},
+        {'role': 'user', 'content': user_content},
+    ]
 
-Bitte extrahiere die Informationen und gib sie im folgenden JSON-Format zurück.
 
-Gewünschtes JSON-Schema (fülle dieses Schema mit den extrahierten Daten):
-{config.JSON_SCHEMA_FOR_LLM}
-"""
-    return prompt
+def _format_llm_timings(response):
+    """Resume los tiempos que devuelve Ollama en el último mensaje (duraciones en nanosegundos)."""
+    if not response or response.get('prompt_eval_duration') is None:
+        return None
+    return {
+        "prompt_eval_count": response.get('prompt_eval_count', 0),
+        "prompt_eval_seconds": response.get('prompt_eval_duration', 0) / 1e9,
+        "eval_count": response.get('eval_count', 0),
+        "eval_seconds": (response.get('eval_duration') or 0) / 1e9,
+        "load_seconds": (response.get('load_duration') or 0) / 1e9,
+    }
+
+
+def _print_llm_timings(timings):
+    if timings:
+        print(f"⏱️ Ollama: prompt {timings['prompt_eval_count']} tokens en {timings['prompt_eval_seconds']:.2f} s, "
+              f"generación {timings['eval_count']} tokens en {timings['eval_seconds']:.2f} s")
+
+
+class IncrementalJSONObjectParser:
+    """
+    Analiza de forma incremental el primer objeto JSON de un texto que llega por trozos.
+    Ignora lo que haya antes de la primera llave (p. ej. un bloque ```json) y devuelve cada
+    campo de primer nivel en cuanto está completo. Cuando se cierra el objeto, complete es True
+    y el resto de la respuesta ya no hace falta.
+    """
+
+    def __init__(self):
+        self.complete = False
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member = []
+
+    @property
+    def object_text(self):
+        """Texto del objeto JSON recibido hasta ahora (desde la primera llave)."""
+        return "".join(self._buffer)
+
+    def feed(self, chunk):
+        """Procesa un trozo de texto. Devuelve la lista de (campo, valor) completados en él."""
+        completed = []
+        for char in chunk:
+            if self.complete:
+                break
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._buffer.append(char)
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+
+            if self._depth == 0:
+                # Se cerró el objeto de primer nivel
+                completed.extend(self._close_member())
+                self.complete = True
+            elif self._depth == 1 and char == ",":
+                completed.extend(self._close_member())
+            else:
+                self._member.append(char)
+        return completed
+
+    def _close_member(self):
+        member_text = "".join(self._member).strip()
+        self._member = []
+        if not member_text:
+            return []
+        try:
+            return list(json.loads("{" + member_text + "}").items())
+        except json.JSONDecodeError:
+            # Un campo mal formado no impide seguir; el objeto completo se valida al final
+            return []
+
+
+def parse_llm_json_response(llm_output_raw):
+    """Extrae y decodifica el bloque JSON de una respuesta completa del LLM. Devuelve dict o None."""
+    json_string_to_parse = None
+    try:
+        if "```json" in llm_output_raw:
+            json_block_start = llm_output_raw.find("```json") + len("```json")
+            json_block_end = llm_output_raw.rfind("```")
+            if json_block_start != -1 and json_block_end != -1 and json_block_start < json_block_end:
+                json_string_to_parse = llm_output_raw[json_block_start:json_block_end].strip()
+
+        if not json_string_to_parse: # Si no se encontró el bloque ```json
+            json_start_index = llm_output_raw.find('{')
+            json_end_index = llm_output_raw.rfind('}') + 1
+            if json_start_index != -1 and json_end_index > json_start_index:
+                json_string_to_parse = llm_output_raw[json_start_index:json_end_index]
+            else:
+                print("⚠️ No se pudo encontrar un objeto JSON válido en la respuesta del LLM (sin llaves {}).")
+                print("Respuesta recibida:", llm_output_raw)
+                return None
+
+        return json.loads(json_string_to_parse)
+
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Error al decodificar JSON de la respuesta del LLM: {e}")
+        print("String que intentó parsear:", json_string_to_parse if json_string_to_parse else llm_output_raw)
+        return None
+    except Exception as e_parse: # Captura otras excepciones durante el parseo
+        print(f"⚠️ Error inesperado al parsear la respuesta del LLM: {e_parse}")
+        print("Respuesta cruda:", llm_output_raw)
+        return None
+
+
+def _print_streamed_field(key, value):
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    print(f"   • {key}: {value}")
 
 
+def _chat_streaming(client, messages, output_schema):
+    """
+    Pide la respuesta en streaming y la analiza mientras llega. Devuelve
+    (datos o None, texto crudo recibido, tiempos de Ollama o None).
+    """
+    parser = IncrementalJSONObjectParser()
+    raw_chunks = []
+    final_chunk = None
+    stream = client.chat(
+        model=config.OLLAMA_MODEL_NAME,
+        messages=messages,
+        stream=True,
+        keep_alive=config.OLLAMA_KEEP_ALIVE,
+        format=output_schema,
+    )
+    try:
+        for chunk in stream:
+            if chunk.get('done'):
+                final_chunk = chunk
+            content = chunk['message']['content']
+            raw_chunks.append(content)
+            for key, value in parser.feed(content):
+                _print_streamed_field(key, value)
+            # Con salida estructurada el modelo termina justo al cerrar el objeto y se lee hasta
+            # el mensaje final (con los tiempos). Sin ella se corta aquí para no pagar la charla sobrante.
+            if parser.complete and output_schema is None:
+                break
+    finally:
+        # Cerrar el stream corta la conexión y Ollama deja de generar
+        stream.close()
+
+    timings = _format_llm_timings(final_chunk)
+    if parser.complete:
+        try:
+            return json.loads(parser.object_text), "".join(raw_chunks), timings
+        except json.JSONDecodeError:
+            pass
+    return None, "".join(raw_chunks), timings
+
+
+def _chat_json(messages, output_schema):
+    """
+    Envía los mensajes a Ollama y devuelve (datos extraídos o None, tiempos de Ollama o None).
+    Con output_schema se usa la salida estructurada de Ollama y la respuesta es JSON puro; si el
+    servidor no la admite se repite la petición sin schema y no se vuelve a pedir en este proceso.
+    """
+    global _structured_output_supported
+    if output_schema is None or not _structured_output_supported:
+        return _request_json(messages, None)
+    try:
+        return _request_json(messages, output_schema)
+    except ollama.ResponseError as e:
+        if e.status_code != 400:
+            raise
+        print(f"⚠️ Ollama no acepta la salida estructurada ({e.error}); requiere Ollama >= 0.5. "
+              f"Se repite la petición sin JSON Schema.")
+        _structured_output_supported = False
+        return _request_json(messages, None)
+
+
+def _request_json(messages, output_schema):
+    client = get_ollama_client()
+    if config.OLLAMA_STREAM_RESPONSE:
+        extracted_data, llm_output_raw, timings = _chat_streaming(client, messages, output_schema)
+        metrics.add(**(timings or {}))
+        if extracted_data is not None:
+            return extracted_data, timings
+        # El análisis incremental no encontró un objeto completo; se intenta con la respuesta entera
+        return parse_llm_json_response(llm_output_raw), timings
+
+    response = client.chat(
+        model=config.OLLAMA_MODEL_NAME,
+        messages=messages,
+        keep_alive=config.OLLAMA_KEEP_ALIVE,
+        format=output_schema,
+    )
+    timings = _format_llm_timings(response)
+    metrics.add(**(timings or {}))
+    return parse_llm_json_response(response['message']['content']), timings
+
+
+def schema_subset(keys):
+    """Devuelve (texto de la plantilla, JSON Schema) con solo los campos indicados del schema."""
+    template = {key: LLM_SCHEMA_TEMPLATE[key] for key in keys}
+    return json.dumps(template, indent=2, ensure_ascii=False), schema_template_to_json_schema(template)
+
+
+def _extract_section(section_name, keys, transcribed_text, current_date_str):
+    """Extrae solo los campos de una sección. Devuelve dict con esas claves o None."""
+    schema_text, section_schema = schema_subset(keys)
+    messages = get_llm_messages(transcribed_text, current_date_str, schema_text=schema_text)
+    output_schema = section_schema if config.OLLAMA_STRUCTURED_OUTPUT else None
+    section_data, timings = _chat_json(messages, output_schema)
+    if timings:
+        print(f"   ⏱️ [{section_name}] {timings['eval_count']} tokens en {timings['eval_seconds']:.2f} s")
+    if not isinstance(section_data, dict):
+        print(f"⚠️ La sección '{section_name}' no devolvió un objeto JSON válido.")
+        return None
+    # Los campos que falten toman el valor por defecto de la plantilla
+    return {key: section_data.get(key, LLM_SCHEMA_TEMPLATE[key]) for key in keys}
+
+
+def extract_sectioned_data_with_llm(transcribed_text, current_date_str, prefilled=None):
+    """
+    Extrae las secciones de config.LLM_EXTRACTION_SECTIONS con peticiones simultáneas
+    (como máximo config.LLM_SECTION_PARALLELISM) y las combina en el mismo dict que
+    produce la extracción completa. Los campos de prefilled (pre-extracción) no se piden.
+    Devuelve None si alguna sección falla.
+    """
+    prefilled = prefilled or {}
+    sections = {name: [key for key in keys if key not in prefilled]
+                for name, keys in config.LLM_EXTRACTION_SECTIONS.items()}
+    sections = {name: keys for name, keys in sections.items() if keys}
+    print(f"\n🧩 Extracción por secciones: {len(sections)} peticiones a Ollama "
+          f"(máx. {config.LLM_SECTION_PARALLELISM} simultáneas)...")
+    with ThreadPoolExecutor(max_workers=config.LLM_SECTION_PARALLELISM) as pool:
+        # Cada sección se ejecuta en el contexto actual para que sus tokens cuenten en la etapa "llm"
+        futures = {name: pool.submit(contextvars.copy_context().run, _extract_section, name, keys,
+                                     transcribed_text, current_date_str)
+                   for name, keys in sections.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"⚠️ Error en la sección '{name}': {e}")
+                results[name] = None
+
+    if any(section_data is None for section_data in results.values()):
+        return None
+    merged = dict(prefilled)
+    for section_data in results.values():
+        merged.update(section_data)
+    # Mismo orden de campos que el schema completo
+    return {key: merged.get(key, default) for key, default in LLM_SCHEMA_TEMPLATE.items()}
+
+
+def extract_reduced_data_with_llm(transcribed_text, current_date_str, prefilled):
+    """
+    Pide al LLM solo los campos que la pre-extracción no fijó y los combina con prefilled.
+    Devuelve None si la respuesta no es un objeto JSON válido.
+    """
+    keys = [key for key in LLM_SCHEMA_TEMPLATE if key not in prefilled]
+    schema_text, reduced_schema = schema_subset(keys)
+    messages = get_llm_messages(transcribed_text, current_date_str, schema_text=schema_text)
+    output_schema = reduced_schema if config.OLLAMA_STRUCTURED_OUTPUT else None
+    print(f"\n🧠 Enviando prompt reducido a Ollama ({len(keys)} de {len(LLM_SCHEMA_TEMPLATE)} campos, "
+          f"modelo: {config.OLLAMA_MODEL_NAME})...")
+    extracted_data, timings = _chat_json(messages, output_schema)
+    _print_llm_timings(timings)
+    if not isinstance(extracted_data, dict):
+        return None
+    merged = {key: extracted_data.get(key, LLM_SCHEMA_TEMPLATE[key]) for key in keys}
+    merged.update(prefilled)
+    return {key: merged[key] for key in LLM_SCHEMA_TEMPLATE}
+
+
+def _rule_prefilled_fields(transcribed_text, current_date_str):
+    """Campos de la pre-extracción por reglas, o {} si no aportan lo suficiente para cambiar el prompt."""
+    if not config.PRE_EXTRACTION_ENABLED:
+        return {}
+    try:
+        prefilled = pre_extraction.pre_extract(transcribed_text, current_date_str)
+    except Exception as e:
+        print(f"⚠️ Error en la pre-extracción por reglas: {e}")
+        return {}
+    saved_chars = len(json.dumps({key: value for key, value in prefilled.items() if key != "Datum"},
+                                 ensure_ascii=False))
+    metrics.annotate(prefilled_fields=len(prefilled), prefilled_chars=saved_chars)
+    if saved_chars < config.PRE_EXTRACTION_MIN_CHARS:
+        return {}
+    summary = ", ".join(f"{key} ({len(value)})" if isinstance(value, list) else key
+                        for key, value in prefilled.items())
+    print(f"\n⚡ Pre-extracción por reglas: {summary}")
+    return prefilled
+
+
+def _extraction_done(cache_key, extracted_data):
+    result_cache.llm_cache.put(cache_key, extracted_data)
+    try:
+        pre_extraction.remember_workers(extracted_data)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el personal conocido: {e}")
+    return extracted_data
+
+
+@metrics.instrument("llm")
 def extract_bautagebuch_data_with_llm(transcribed_text, current_date_str):
     """Extrae datos del texto transcrito usando el LLM."""
     if not transcribed_text:
         return None
 
-    prompt = get_llm_prompt(transcribed_text, current_date_str)
-    print(f"\n🧠 Enviando prompt a Ollama (modelo: {config.OLLAMA_MODEL_NAME})...")
+    cache_key = result_cache.make_cache_key(transcribed_text, current_date_str, config.JSON_SCHEMA_FOR_LLM,
+                                            config.OLLAMA_MODEL_NAME, PROMPT_VERSION)
+    extracted_data = result_cache.llm_cache.get(cache_key)
+    if extracted_data is not None:
+        print("\n♻️ Datos del Bautagebuch recuperados de la caché (sin llamar a Ollama).")
+        metrics.annotate(cache_hit=True)
+        return extracted_data
 
-    try:
-        client = ollama.Client(host=config.OLLAMA_HOST)
-        response = client.chat(
-            model=config.OLLAMA_MODEL_NAME,
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        llm_output_raw = response['message']['content']
-
-        # Lógica para extraer el bloque JSON de la respuesta del LLM
-        json_string_to_parse = None
+    # Horarios, pausas, tiempo y personal conocido se fijan con reglas; el LLM hace el resto
+    prefilled = _rule_prefilled_fields(transcribed_text, current_date_str)
+
+    if config.LLM_SECTIONED_EXTRACTION and len(transcribed_text) >= config.LLM_SECTIONED_MIN_CHARS:
         try:
-            if "```json" in llm_output_raw:
-                json_block_start = llm_output_raw.find("```json") + len("```json")
-                json_block_end = llm_output_raw.rfind("```")
-                if json_block_start != -1 and json_block_end != -1 and json_block_start < json_block_end:
-                    json_string_to_parse = llm_output_raw[json_block_start:json_block_end].strip()
-
-            if not json_string_to_parse: # Si no se encontró el bloque ```json
-                json_start_index = llm_output_raw.find('{')
-                json_end_index = llm_output_raw.rfind('}') + 1
-                if json_start_index != -1 and json_end_index > json_start_index:
-                    json_string_to_parse = llm_output_raw[json_start_index:json_end_index]
-                else:
-                    print("⚠️ No se pudo encontrar un objeto JSON válido en la respuesta del LLM (sin llaves {}).")
-                    print("Respuesta recibida:", llm_output_raw)
-                    return None
-
-            extracted_data = json.loads(json_string_to_parse)
-            print("\n📊 Datos JSON extraídos correctamente:")
-            print(json.dumps(extracted_data, indent=2, ensure_ascii=False))
-            return extracted_data
+            extracted_data = extract_sectioned_data_with_llm(transcribed_text, current_date_str, prefilled)
+        except Exception as e:
+            print(f"❌ Error en la extracción por secciones: {e}")
+            extracted_data = None
+        if extracted_data is not None:
+            print("\n📊 Datos JSON extraídos correctamente (por secciones).")
+            return _extraction_done(cache_key, extracted_data)
+        print("↩️ Se repite la extracción con una sola petición completa.")
+    elif prefilled:
+        try:
+            extracted_data = extract_reduced_data_with_llm(transcribed_text, current_date_str, prefilled)
+        except Exception as e:
+            print(f"❌ Error en la extracción con el prompt reducido: {e}")
+            extracted_data = None
+        if extracted_data is not None:
+            print("\n📊 Datos JSON extraídos correctamente (reglas + LLM):")
+            if not config.OLLAMA_STREAM_RESPONSE:
+                print(json.dumps(extracted_data, indent=2, ensure_ascii=False))
+            metrics.annotate(pre_extraction=True)
+            return _extraction_done(cache_key, extracted_data)
+        print("↩️ Se repite la extracción con el prompt completo.")
 
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Error al decodificar JSON de la respuesta del LLM: {e}")
-            print("String que intentó parsear:", json_string_to_parse if json_string_to_parse else llm_output_raw)
-            return None
-        except Exception as e_parse: # Captura otras excepciones durante el parseo
-            print(f"⚠️ Error inesperado al parsear la respuesta del LLM: {e_parse}")
-            print("Respuesta cruda:", llm_output_raw)
+    messages = get_llm_messages(transcribed_text, current_date_str)
+    output_schema = LLM_OUTPUT_JSON_SCHEMA if config.OLLAMA_STRUCTURED_OUTPUT else None
+    print(f"\n🧠 Enviando prompt a Ollama (modelo: {config.OLLAMA_MODEL_NAME})...")
+    metrics.annotate(model=config.OLLAMA_MODEL_NAME, transcript_chars=len(transcribed_text))
+
+    try:
+        extracted_data, timings = _chat_json(messages, output_schema)
+        _print_llm_timings(timings)
+        if extracted_data is None:
             return None
+        print("\n📊 Datos JSON extraídos correctamente:")
+        if not config.OLLAMA_STREAM_RESPONSE:  # En streaming los campos ya se mostraron según llegaban
+            print(json.dumps(extracted_data, indent=2, ensure_ascii=False))
+        return _extraction_done(cache_key, extracted_data)
 
     except Exception as e:
         print(f"❌ Error al comunicarse con Ollama: {e}")
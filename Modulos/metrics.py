@@ -0,0 +1,265 @@
+# metrics.py
+# Trazas ligeras por etapa: cada llamada a una función decorada con @instrument("etapa")
+# añade una línea JSON a METRICS_LOG_PATH con la entrada (trace_id), el tiempo de reloj,
+# si terminó bien, la memoria (RSS y VRAM) y los valores que la propia etapa anota con
+# annotate()/add() (duración del audio, RTF, tokens y tiempos de Ollama...).
+# Opcionalmente se mantiene además un archivo en formato de texto de Prometheus.
+#
+# Resumen p50/p95 por etapa desde la línea de comandos:
+#   python -m Modulos.metrics --desde 2026-03-01
+import argparse
+import contextlib
+import contextvars
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+
+# Importar configuraciones
+import Modulos.config as config
+
+try:
+    import resource  # Solo en Unix: pico de RSS del proceso
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # Opcional: RSS actual y pico de memoria en Windows
+except ImportError:
+    psutil = None
+
+# Entrada del Bautagebuch en curso y etapa en curso (valores que anota la etapa)
+_current_trace = contextvars.ContextVar("bautagebuch_trace", default=None)
+_current_span = contextvars.ContextVar("bautagebuch_span", default=None)
+
+_write_lock = threading.Lock()
+# Duraciones recientes de este proceso por etapa, para los cuantiles del archivo de Prometheus
+_recent_walls = defaultdict(lambda: deque(maxlen=1000))
+_run_counts = defaultdict(int)  # (etapa, estado) -> número de ejecuciones
+_wall_sums = defaultdict(float)
+
+# Campos numéricos que se resumen con p50/p95 en la CLI
+SUMMARY_FIELDS = ("wall_seconds", "audio_seconds", "rtf", "prompt_eval_count", "prompt_eval_seconds",
+                  "eval_count", "eval_seconds", "peak_rss_mb", "peak_vram_mb")
+
+
+@contextlib.contextmanager
+def trace(trace_id=None):
+    """Agrupa las etapas de una misma entrada bajo un trace_id (nuevo si no se indica)."""
+    token = _current_trace.set(trace_id or uuid.uuid4().hex[:12])
+    try:
+        yield _current_trace.get()
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace_id():
+    return _current_trace.get()
+
+
+def annotate(**values):
+    """Asigna valores a la etapa en curso (no hace nada fuera de una etapa instrumentada)."""
+    span = _current_span.get()
+    if span is not None:
+        with span["lock"]:
+            span["values"].update(values)
+
+
+def add(**values):
+    """Suma valores numéricos a la etapa en curso (p. ej. tokens de varias peticiones)."""
+    span = _current_span.get()
+    if span is not None:
+        with span["lock"]:
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    span["values"][key] = span["values"].get(key, 0) + value
+
+
+def _memory_snapshot():
+    """RSS actual y pico del proceso en MB (lo que esté disponible en este sistema)."""
+    snapshot = {}
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        snapshot["rss_mb"] = memory.rss / 1024 ** 2
+        if hasattr(memory, "peak_wset"):  # Windows
+            snapshot["peak_rss_mb"] = memory.peak_wset / 1024 ** 2
+    if resource is not None and "peak_rss_mb" not in snapshot:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        snapshot["peak_rss_mb"] = peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    return snapshot
+
+
+def _cuda():
+    """torch.cuda solo si torch ya está cargado y hay GPU (las métricas no cargan torch)."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return torch.cuda
+
+
+def instrument(stage):
+    """Decorador que registra cada llamada a la función como una etapa de la entrada en curso."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.METRICS_ENABLED:
+                return func(*args, **kwargs)
+            span = {"values": {}, "lock": threading.Lock()}
+            token = _current_span.set(span)
+            cuda = _cuda()
+            if cuda is not None:
+                # Con etapas simultáneas en la GPU el pico es compartido (aproximado)
+                cuda.reset_peak_memory_stats()
+            status = "error"
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                status = "ok" if result is not None and result is not False else "sin_resultado"
+                return result
+            finally:
+                wall_seconds = time.perf_counter() - start
+                _current_span.reset(token)
+                values = dict(span["values"])
+                if cuda is not None:
+                    values["peak_vram_mb"] = cuda.max_memory_allocated() / 1024 ** 2
+                record(stage, wall_seconds, status, **values)
+        return wrapper
+    return decorator
+
+
+def record(stage, wall_seconds, status="ok", **values):
+    """Escribe una línea en el log JSONL de métricas (y actualiza el archivo de Prometheus)."""
+    if not config.METRICS_ENABLED:
+        return None
+    entry = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "trace_id": current_trace_id(),
+        "stage": stage,
+        "status": status,
+        "wall_seconds": round(wall_seconds, 4),
+        "pid": os.getpid(),
+    }
+    entry.update(_memory_snapshot())
+    entry.update(values)
+    entry = {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _write_lock:
+        try:
+            config.ensure_dir(os.path.dirname(config.METRICS_LOG_PATH))
+            # Una sola escritura en modo append por línea: los procesos del pool de Excel comparten el archivo
+            with open(config.METRICS_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"⚠️ No se pudieron guardar las métricas: {e}")
+        _recent_walls[stage].append(wall_seconds)
+        _run_counts[(stage, status)] += 1
+        _wall_sums[stage] += wall_seconds
+        if config.METRICS_PROMETHEUS_PATH:
+            _write_prometheus()
+    return entry
+
+
+def percentile(values, q):
+    """Percentil q (0-100) por rango más cercano; None si no hay valores."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _write_prometheus():
+    """Reescribe el archivo de Prometheus (formato de texto) con las métricas de este proceso."""
+    lines = [
+        "# HELP bautagebuch_stage_runs_total Ejecuciones de cada etapa por estado.",
+        "# TYPE bautagebuch_stage_runs_total counter",
+    ]
+    for (stage, status), count in sorted(_run_counts.items()):
+        lines.append(f'bautagebuch_stage_runs_total{{stage="{stage}",status="{status}"}} {count}')
+    lines += [
+        "# HELP bautagebuch_stage_seconds Tiempo de reloj por etapa (cuantiles de las últimas 1000).",
+        "# TYPE bautagebuch_stage_seconds summary",
+    ]
+    for stage, walls in sorted(_recent_walls.items()):
+        for quantile in (0.5, 0.95):
+            lines.append(f'bautagebuch_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                         f'{percentile(list(walls), quantile * 100):.6f}')
+        count = sum(n for (s, _), n in _run_counts.items() if s == stage)
+        lines.append(f'bautagebuch_stage_seconds_sum{{stage="{stage}"}} {_wall_sums[stage]:.6f}')
+        lines.append(f'bautagebuch_stage_seconds_count{{stage="{stage}"}} {count}')
+    path = config.METRICS_PROMETHEUS_PATH
+    try:
+        config.ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ No se pudo escribir el archivo de Prometheus: {e}")
+
+
+def load_records(path=None, date_from=None, date_to=None):
+    """Lee el log JSONL; date_from/date_to (YYYY-MM-DD) filtran por la fecha del registro."""
+    records = []
+    try:
+        with open(path or config.METRICS_LOG_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea cortada (p. ej. el proceso terminó a mitad de escritura)
+                day = entry.get("ts", "")[:10]
+                if (date_from and day < date_from) or (date_to and day > date_to):
+                    continue
+                records.append(entry)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def summarize(records):
+    """{etapa: {"runs", "errors", campo: (p50, p95)}} para los campos de SUMMARY_FIELDS presentes."""
+    by_stage = defaultdict(list)
+    for entry in records:
+        by_stage[entry.get("stage")].append(entry)
+    summary = {}
+    for stage, entries in by_stage.items():
+        stage_summary = {"runs": len(entries), "errors": sum(1 for e in entries if e.get("status") != "ok")}
+        for field in SUMMARY_FIELDS:
+            values = [e[field] for e in entries if isinstance(e.get(field), (int, float))]
+            if values:
+                stage_summary[field] = (percentile(values, 50), percentile(values, 95))
+        summary[stage] = stage_summary
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen p50/p95 por etapa del log de métricas")
+    parser.add_argument("--archivo", help=f"Log JSONL (por defecto {config.METRICS_LOG_PATH})")
+    parser.add_argument("--desde", help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument("--hasta", help="Fecha final YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.archivo, args.desde, args.hasta)
+    if not records:
+        print("(sin métricas registradas)")
+        return
+    traces = {entry.get("trace_id") for entry in records if entry.get("trace_id")}
+    print(f"{len(records)} registros de {len(traces)} entrada(s)\n")
+    for stage, stage_summary in sorted(summarize(records).items(), key=lambda item: str(item[0])):
+        print(f"{stage}: {stage_summary['runs']} ejecuciones, {stage_summary['errors']} sin resultado/errores")
+        for field in SUMMARY_FIELDS:
+            if field in stage_summary:
+                p50, p95 = stage_summary[field]
+                print(f"    {field:<22} p50 {p50:>10.3f}   p95 {p95:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+# pre_extraction.py
+# Pre-extracción por reglas, sin LLM, de los campos regulares del dictado: horarios
+# ("von 7 bis 16 Uhr", "von sieben bis halb fünf"), pausas ("45 Minuten Pause", "eine halbe
+# Stunde Pause"), temperatura, viento y tiempo, y el personal conocido de cada Baustelle
+# (KNOWN_WORKERS_PATH). Solo se devuelven los campos en los que las reglas no tienen dudas;
+# el resto (y los textos libres) los sigue extrayendo el LLM con un schema reducido.
+#
+# Formato de KNOWN_WORKERS_PATH (se amplía solo con cada entrada extraída si KNOWN_WORKERS_LEARN):
+#   {"Musterstraße 12, Köln": {"Alias": ["Musterstraße"],
+#                              "Personal": [{"Name": "Jan Kowalski", "Baustellenpersonal_Typ": "Monteur",
+#                                            "Alias": ["Jan"]}]}}
+import functools
+import json
+import os
+import re
+import threading
+
+# Importar configuraciones
+import Modulos.config as config
+
+# --- Números dictados ---
+
+_UNITS = {"ein": 1, "zwei": 2, "drei": 3, "vier": 4, "fünf": 5, "sechs": 6, "sieben": 7, "acht": 8, "neun": 9}
+_TENS = {"zwanzig": 20, "dreißig": 30, "dreissig": 30, "vierzig": 40, "fünfzig": 50}
+NUMBER_WORDS = {
+    "null": 0, "eins": 1, "eine": 1, "einer": 1, "zwo": 2,
+    "zehn": 10, "elf": 11, "zwölf": 12, "dreizehn": 13, "vierzehn": 14, "fünfzehn": 15,
+    "sechzehn": 16, "siebzehn": 17, "achtzehn": 18, "neunzehn": 19,
+}
+NUMBER_WORDS.update(_UNITS)
+NUMBER_WORDS.update(_TENS)
+NUMBER_WORDS.update({f"{unit}und{tens}": unit_value + tens_value
+                     for unit, unit_value in _UNITS.items() for tens, tens_value in _TENS.items()})
+
+# Palabras más largas primero para que "vierzehn" no se quede en "vier"
+_NUM = r"(?:\d{1,2}|" + "|".join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r")"
+
+
+def _number(token):
+    token = token.strip().lower()
+    return int(token) if token.isdigit() else NUMBER_WORDS.get(token)
+
+
+# --- Patrones ---
+
+def _time_pattern(name):
+    """Hora dictada: "7", "7:30", "7.30", "7 Uhr 30", "sieben", "halb acht"."""
+    return (rf"(?:halb\s+(?P<{name}_half>{_NUM})"
+            rf"|(?P<{name}_hour>{_NUM})(?:\s*[:.]\s*(?P<{name}_min>\d{{2}})|\s+Uhr\s+(?P<{name}_umin>{_NUM}))?)")
+
+
+_TIME_RANGE_RE = re.compile(
+    rf"(?P<prefix>\b(?:von|ab)\s+)?\b{_time_pattern('von')}\s*(?:Uhr\s*)?(?:bis|-|–)\s*{_time_pattern('bis')}"
+    rf"(?P<suffix>\s*Uhr)?(?!\w)",
+    re.IGNORECASE)
+
+_PAUSE_HOURS = {"halbe": 30, "halben": 30, "dreiviertel": 45, "viertel": 15, "anderthalb": 90,
+                "eineinhalb": 90, "eine": 60, "einer": 60, "1": 60}
+_PAUSE_HOURS_RE = r"(?:eine\s+|einer\s+)?(?:halben?|dreiviertel|viertel|anderthalb|eineinhalb)|eine|einer|1"
+_PAUSE_DURATION = (rf"(?:(?P<minutes>{_NUM})\s*(?:Minuten|Min\.?)(?!\w)"
+                   rf"|(?P<hours>{_PAUSE_HOURS_RE})\s+Stunden?(?!\w))")
+_PAUSE_RES = (
+    re.compile(rf"\b{_PAUSE_DURATION}\s*(?:Mittags)?pause\b", re.IGNORECASE),
+    re.compile(rf"\b(?:Mittags)?pause\s*(?:von|war|betrug|:)?\s*{_PAUSE_DURATION}", re.IGNORECASE),
+)
+_NO_PAUSE_RE = re.compile(r"\b(?:keine|ohne)\s+(?:Mittags)?pause\b", re.IGNORECASE)
+
+_TEMPERATURE_RE = re.compile(
+    rf"(?P<sign>\b(?:minus|plus)\s+|-\s?)?(?<![\w,])(?P<value>\d{{1,2}}(?:,\d)?|{_NUM})"
+    rf"\s*(?:Grad(?:\s+Celsius)?|°\s*C?)(?!\w)",
+    re.IGNORECASE)
+# El "Grad" de un ángulo ("45 Grad gebogen") no es una temperatura: sin "°" ni "Grad Celsius",
+# la palabra vecina (saltando las de relleno) tiene que ser de tiempo o temperatura
+_WEATHER_WORD_RE = re.compile(
+    r"(?:Wetter|\w*temperatur\w*|warm|kalt|kühl|frisch|Frost|frostig|Wind|windig|windstill|Sonne|sonnig|"
+    r"bewölkt|bedeckt|Regen|regnerisch|Schnee|Nebel|neblig|heiter|trocken)",
+    re.IGNORECASE)
+_TEMPERATURE_FILLER_WORDS = {"bei", "etwa", "ca", "circa", "rund", "um", "die", "knapp", "nur", "über", "unter",
+                             "es", "war", "waren", "ist", "sind", "hatte", "hatten", "hat", "mit", "und", "heute",
+                             "morgens", "mittags", "nachmittags", "tagsüber", "schon", "noch", "bereits"}
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+_WIND_RES = (
+    (re.compile(r"\b(?:windstill|kein(?:en)?\s+Wind|ohne\s+Wind)\b", re.IGNORECASE), lambda m: "windstill"),
+    (re.compile(r"\b(?P<level>leicht|schwach|mäßig|mässig|frisch|stark|kräftig|böig|stürmisch)(?:e[nmrs]?)?\s+"
+                r"(?:Wind|Winde|Böen)\b", re.IGNORECASE),
+     lambda m: m.group("level").lower().replace("mässig", "mäßig")),
+    (re.compile(rf"\bWindstärke\s+(?P<force>\d{{1,2}}|{_NUM})\b", re.IGNORECASE),
+     lambda m: f"Windstärke {_number(m.group('force'))}"),
+    (re.compile(r"\b(?:Sturm|stürmisch)\b", re.IGNORECASE), lambda m: "stürmisch"),
+)
+
+_WEATHER_TERMS = (
+    (re.compile(r"\b(?:sonnig|Sonne|Sonnenschein)\b", re.IGNORECASE), "sonnig"),
+    (re.compile(r"\bheiter\b", re.IGNORECASE), "heiter"),
+    (re.compile(r"\b(?:bewölkt|wolkig)\b", re.IGNORECASE), "bewölkt"),
+    (re.compile(r"\bbedeckt\b", re.IGNORECASE), "bedeckt"),
+    (re.compile(r"\b(?:Regen|regnerisch|Nieselregen|Schauer)\b", re.IGNORECASE), "Regen"),
+    (re.compile(r"\b(?:Schnee|Schneefall)\b", re.IGNORECASE), "Schnee"),
+    (re.compile(r"\bNebel\b", re.IGNORECASE), "Nebel"),
+    (re.compile(r"\bFrost\b", re.IGNORECASE), "Frost"),
+    (re.compile(r"\bGewitter\b", re.IGNORECASE), "Gewitter"),
+)
+
+# Frases sin nombres cuyo horario vale para todo el personal ("Arbeitszeit heute von 7 bis 16 Uhr")
+_CREW_WIDE_RE = re.compile(r"\b(?:alle|allesamt|wir|Arbeitszeit|Kolonne|Team|Truppe|gesamte)\b", re.IGNORECASE)
+# Frases en las que un nombre conocido no significa que esa persona trabajó con el horario común
+_ABSENCE_RE = re.compile(r"\b(?:krank\w*|Urlaub|fehlt\w*|abwesend|frei|nicht\s+(?:da|dabei|gekommen|anwesend))\b",
+                         re.IGNORECASE)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+# Palabras que indican una persona sin nombre conocido ("der neue Helfer von 7 bis 12")
+_PERSON_WORD_RE = re.compile(
+    r"\b(?:Herr|Frau|Kolleg\w*|Mitarbeiter\w*|Azubi\w*|Lehrling\w*|Praktikant\w*|Aushilfe\w*|"
+    r"Leiharbeiter\w*|Subunternehmer\w*|Helfer\w*|Monteur\w*|Polier\w*|Vorarbeiter\w*|Elektriker\w*|"
+    r"Fahrer\w*|Neue[nrm]?)\b")
+# Palabras en mayúscula habituales en las frases de horarios que no son nombres
+_NON_NAME_WORDS = {
+    "uhr", "pause", "mittagspause", "minute", "minuten", "min", "stunde", "stunden", "halb", "halbe", "viertel",
+    "arbeitszeit", "baustelle", "kolonne", "team", "truppe", "wir", "alle", "allesamt", "gesamte", "beide",
+    "heute", "gestern", "morgen", "morgens", "mittags", "nachmittags", "abends", "dann", "danach", "anschließend",
+    "außerdem", "zusammen", "auch", "und", "ich", "er", "sie", "es", "der", "die", "das", "den", "dem", "von",
+    "ab", "bis", "um", "mit", "ohne", "keine", "kein", "montag", "dienstag", "mittwoch", "donnerstag",
+    "freitag", "samstag", "sonntag",
+} | set(NUMBER_WORDS)
+
+
+def _clock(match, name):
+    """"HH:MM" de la hora capturada por _time_pattern(name), o None si no es una hora válida."""
+    half = match.group(f"{name}_half")
+    if half is not None:
+        hour, minute = _number(half), 0
+        if hour is None:
+            return None
+        hour, minute = hour - 1, 30  # "halb acht" = 7:30
+    else:
+        hour = _number(match.group(f"{name}_hour"))
+        minute_text = match.group(f"{name}_min") or match.group(f"{name}_umin")
+        minute = _number(minute_text) if minute_text else 0
+    if hour is None or minute is None or not (0 <= hour <= 24 and 0 <= minute <= 59):
+        return None
+    return f"{hour % 24:02d}:{minute:02d}"
+
+
+def _afternoon_end(von, bis):
+    """
+    (von, bis) con "bis" de la tarde si se dictó en formato de 12 horas ("von sieben bis halb
+    fünf" = 07:00-16:30), o None si el horario sigue siendo ambiguo (turno de noche,
+    "von 13 bis 12", "von 8 bis 8").
+    """
+    if bis < von and von <= "12:00" and bis <= "12:00":
+        bis = f"{int(bis[:2]) + 12:02d}{bis[2:]}"
+    return (von, bis) if bis > von else None
+
+
+def find_time_ranges(text):
+    """
+    [(inicio, fin, "HH:MM", "HH:MM")] de los horarios dictados en text. Los horarios que no
+    se pueden interpretar sin dudas aparecen con None en lugar de las horas.
+    """
+    ranges = []
+    for match in _TIME_RANGE_RE.finditer(text):
+        # "2 bis 3 Paletten" no es un horario: hace falta "von"/"ab", "Uhr", "HH:MM" o "halb"
+        if not (match.group("prefix") or match.group("suffix") or "uhr" in match.group(0).lower()
+                or match.group("von_min") or match.group("bis_min")
+                or match.group("von_half") or match.group("bis_half")):
+            continue
+        von, bis = _clock(match, "von"), _clock(match, "bis")
+        clocks = _afternoon_end(von, bis) if von and bis else None
+        ranges.append((match.start(), match.end()) + (clocks or (None, None)))
+    return ranges
+
+
+def find_pauses(text):
+    """[(inicio, minutos)] de las pausas dictadas en text, en orden de aparición."""
+    pauses = {}
+    for pattern in _PAUSE_RES:
+        for match in pattern.finditer(text):
+            if match.group("minutes"):
+                minutes = _number(match.group("minutes"))
+            else:
+                minutes = _PAUSE_HOURS.get(re.sub(r"^einer?\s+", "", match.group("hours").lower()))
+            if minutes is not None:
+                pauses.setdefault(match.start(), minutes)
+    for match in _NO_PAUSE_RE.finditer(text):
+        pauses.setdefault(match.start(), 0)
+    return sorted(pauses.items())
+
+
+def _next_content_word(words):
+    return next((word for word in words if word.lower() not in _TEMPERATURE_FILLER_WORDS), None)
+
+
+def _is_temperature(sentence, match):
+    """"°"/"Grad Celsius", o una palabra de tiempo justo antes o después de "N Grad"."""
+    if "°" in match.group(0) or "celsius" in match.group(0).lower():
+        return True
+    before = _next_content_word(reversed(_WORD_RE.findall(sentence[:match.start()])))
+    after = _next_content_word(_WORD_RE.findall(sentence[match.end():]))
+    return any(word and _WEATHER_WORD_RE.fullmatch(word) for word in (before, after))
+
+
+def find_temperatures(sentence):
+    """([temperaturas], número de "N Grad" de la frase descartados como temperatura)."""
+    values, rejected = [], 0
+    for match in _TEMPERATURE_RE.finditer(sentence):
+        value_text = match.group("value").replace(",", ".")
+        value = float(value_text) if value_text[0].isdigit() else _number(value_text)
+        if value is None or not _is_temperature(sentence, match):
+            rejected += 1
+            continue
+        sign = (match.group("sign") or "").strip().lower()
+        if sign in ("minus", "-"):
+            value = -value
+        if -40 <= value <= 45:
+            values.append(value)
+        else:
+            rejected += 1
+    return values, rejected
+
+
+def _format_temperature(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}".replace(".", ",")
+
+
+def find_wind(text):
+    found = []
+    for pattern, normalize in _WIND_RES:
+        for match in pattern.finditer(text):
+            value = normalize(match)
+            if value not in found:
+                found.append(value)
+    return found
+
+
+def find_weather_terms(text):
+    """Términos de tiempo en orden de aparición, sin repetir."""
+    hits = sorted((match.start(), term) for pattern, term in _WEATHER_TERMS for match in pattern.finditer(text))
+    terms = []
+    for _, term in hits:
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+# --- Personal conocido por Baustelle ---
+
+_known_workers_lock = threading.Lock()
+_known_workers_cache = {"mtime": None, "sites": {}}
+
+
+def load_known_workers():
+    """Contenido de KNOWN_WORKERS_PATH (recargado si el archivo cambió), o {} si no existe."""
+    path = config.KNOWN_WORKERS_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _known_workers_lock:
+        if _known_workers_cache["mtime"] != mtime:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    sites = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ No se pudo leer el personal conocido ({path}): {e}")
+                sites = {}
+            _known_workers_cache.update(mtime=mtime, sites=sites if isinstance(sites, dict) else {})
+        return _known_workers_cache["sites"]
+
+
+@functools.lru_cache(maxsize=4096)
+def _phrase_pattern(phrase):
+    """Frase como palabras completas, sin distinguir mayúsculas ni espacios."""
+    words = [re.escape(word) for word in phrase.split()]
+    return re.compile(r"(?<!\w)" + r"\s+".join(words) + r"(?!\w)", re.IGNORECASE) if words else None
+
+
+def _mention_spans(text, phrases):
+    """[(inicio, fin)] de todas las apariciones de las frases en text."""
+    spans = []
+    for phrase in phrases:
+        pattern = _phrase_pattern(phrase) if isinstance(phrase, str) else None
+        if pattern:
+            spans.extend(match.span() for match in pattern.finditer(text))
+    return spans
+
+
+def _mentions(text, phrases):
+    """Posición de la primera aparición de alguna de las frases en text, o None."""
+    spans = _mention_spans(text, phrases)
+    return min(spans)[0] if spans else None
+
+
+def detect_site(text, sites):
+    """Nombre de la única Baustelle conocida que se menciona en text, o None."""
+    mentioned = [name for name, site in sites.items()
+                 if _mentions(text, [name] + list((site or {}).get("Alias") or [])) is not None]
+    return mentioned[0] if len(mentioned) == 1 else None
+
+
+def _known_people(sites, site_name):
+    """Personal conocido (el de la Baustelle detectada tiene prioridad si un nombre se repite)."""
+    ordered_sites = ([site_name] if site_name else []) + [name for name in sites if name != site_name]
+    people = {}
+    for name in ordered_sites:
+        for person in (sites.get(name) or {}).get("Personal", []):
+            if isinstance(person, dict) and person.get("Name"):
+                people.setdefault(person["Name"].casefold(), person)
+    return list(people.values())
+
+
+def remember_workers(bautagebuch_data):
+    """Añade a KNOWN_WORKERS_PATH el personal con nombre de una entrada extraída (si KNOWN_WORKERS_LEARN)."""
+    if not config.KNOWN_WORKERS_LEARN or not bautagebuch_data:
+        return
+    site_name = str(bautagebuch_data.get("Baustelle") or "").strip()
+    people = [person for person in bautagebuch_data.get("Personal") or []
+              if isinstance(person, dict) and str(person.get("Name", "")).strip()
+              and str(person.get("Name")).strip().lower() not in ("unbekannt", "none")]
+    if not site_name or site_name.lower() == "unbekannt" or not people:
+        return
+    sites = json.loads(json.dumps(load_known_workers()))  # Copia: la caché no se modifica hasta guardar
+    site = sites.setdefault(site_name, {"Alias": [], "Personal": []})
+    known = {str(person.get("Name", "")).casefold() for person in site.setdefault("Personal", [])}
+    added = [{"Name": str(person["Name"]).strip(),
+              "Baustellenpersonal_Typ": person.get("Baustellenpersonal_Typ", "Unbekannt"), "Alias": []}
+             for person in people if str(person["Name"]).strip().casefold() not in known]
+    if not added:
+        return
+    site["Personal"].extend(added)
+    path = config.KNOWN_WORKERS_PATH
+    try:
+        config.ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sites, f, indent=2, ensure_ascii=False)
+        with _known_workers_lock:
+            os.replace(tmp_path, path)
+        print(f"👷 Personal conocido de '{site_name}': {', '.join(person['Name'] for person in added)} añadido(s).")
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el personal conocido: {e}")
+
+
+# --- Pre-extracción ---
+
+def _sentences(text):
+    """[(inicio, frase)] del texto dividido por signos de final de frase."""
+    sentences, position = [], 0
+    for part in _SENTENCE_SPLIT_RE.split(text):
+        start = text.find(part, position)
+        sentences.append((start, part))
+        position = start + len(part)
+    return sentences
+
+
+def _has_unknown_person(sentence, known_phrases):
+    """True si la frase nombra a alguien que no está en known_phrases (nombres, alias, Baustellen)."""
+    if _PERSON_WORD_RE.search(sentence):
+        return True
+    known_spans = _mention_spans(sentence, known_phrases)
+    for match in _WORD_RE.finditer(sentence):
+        word = match.group(0)
+        if not word[0].isupper() or word.lower() in _NON_NAME_WORDS:
+            continue
+        if not any(start <= match.start() < end for start, end in known_spans):
+            return True
+    return False
+
+
+def extract_personal(text, people, other_phrases=()):
+    """
+    Lista Personal si cada persona conocida mencionada tiene un horario sin ambigüedad
+    y no queda ningún horario sin dueño; None si las reglas no están seguras.
+    other_phrases son palabras en mayúscula que no son personas (p. ej. las Baustellen).
+    """
+    ranges = find_time_ranges(text)
+    pauses = find_pauses(text)
+    if not ranges or not people or any(time_range[2] is None for time_range in ranges):
+        return None
+    known_phrases = list(other_phrases)
+    for person in people:
+        known_phrases += [person["Name"]] + list(person.get("Alias") or [])
+
+    assigned = []  # (posición del nombre, persona, horario o None, pausa o None)
+    crew_ranges, crew_pauses = [], set()
+    for start, sentence in _sentences(text):
+        end = start + len(sentence)
+        named = []
+        for person in people:
+            position = _mentions(sentence, [person["Name"]] + list(person.get("Alias") or []))
+            if position is not None:
+                named.append((position, person))
+        sentence_ranges = [r for r in ranges if start <= r[0] < end]
+        sentence_pauses = {minutes for position, minutes in pauses if start <= position < end}
+        if (named or sentence_ranges) and _has_unknown_person(sentence, known_phrases):
+            return None  # Alguien que no está en el personal conocido: que lo extraiga el LLM
+        if not named:
+            if _CREW_WIDE_RE.search(sentence):
+                crew_ranges.extend(sentence_ranges)
+                crew_pauses.update(sentence_pauses)
+            elif sentence_ranges:
+                return None  # Horario de alguien que no está en el personal conocido
+            continue
+        if len(sentence_ranges) > 1 or len(sentence_pauses) > 1 or _ABSENCE_RE.search(sentence):
+            return None  # Varias horas o pausas en la misma frase, o alguien que faltó: que lo resuelva el LLM
+        time_range = sentence_ranges[0] if sentence_ranges else None
+        pause = next(iter(sentence_pauses)) if sentence_pauses else None
+        assigned.extend((start + position, person, time_range, pause) for position, person in named)
+
+    if not assigned:
+        return None
+    # Horario y pausa comunes solo de frases para todo el personal ("Arbeitszeit von 7 bis 16 Uhr"),
+    # nunca los de otra persona
+    crew_range = crew_ranges[0] if len({(r[2], r[3]) for r in crew_ranges}) == 1 else None
+    default_pause = next(iter(crew_pauses)) if len(crew_pauses) == 1 else (0 if not pauses else None)
+
+    by_person = {}  # nombre -> (persona, {horarios dictados}, {pausas dictadas}), en orden de mención
+    for _, person, time_range, pause in sorted(assigned, key=lambda item: item[0]):
+        _, person_ranges, person_pauses = by_person.setdefault(person["Name"].casefold(), (person, set(), set()))
+        if time_range is not None:
+            person_ranges.add(time_range)
+        if pause is not None:
+            person_pauses.add(pause)
+
+    personal = []
+    for person, person_ranges, person_pauses in by_person.values():
+        if len(person_ranges) > 1 or len(person_pauses) > 1:
+            return None  # Varios horarios para la misma persona (p. ej. mañana y tarde): que lo sume el LLM
+        time_range = next(iter(person_ranges)) if person_ranges else crew_range
+        pause = next(iter(person_pauses)) if person_pauses else default_pause
+        if time_range is None or pause is None:
+            return None
+        personal.append({
+            "Baustellenpersonal_Typ": person.get("Baustellenpersonal_Typ") or "Unbekannt",
+            "Name": person["Name"],
+            "von": time_range[2],
+            "bis": time_range[3],
+            "Pause_Minuten": str(pause),
+            "Arbeitszeit_Stunden": "0.0",  # Se calcula desde von/bis/Pause al rellenar el Excel
+        })
+    return personal
+
+
+def extract_weather(text):
+    """{"Temperatur", "Wind", "Wetter"} que se pueden fijar sin dudas (puede estar vacío)."""
+    fields = {}
+    temperatures, temperature_sentences, ambiguous = set(), [], False
+    for _, sentence in _sentences(text):
+        values, rejected = find_temperatures(sentence)
+        if values:
+            temperatures.update(values)
+            temperature_sentences.append(sentence)
+            # "minus 3 Grad, dann am Nachmittag 6 Grad": el segundo valor no se reconoce, pero existe
+            ambiguous = ambiguous or rejected > 0
+    if len(temperatures) == 1 and not ambiguous:
+        fields["Temperatur"] = _format_temperature(temperatures.pop())
+
+    wind = find_wind(text)
+    if len(wind) == 1:
+        fields["Wind"] = wind[0]
+
+    # Los términos de tiempo ("bedeckt", "Regen") solo cuentan en frases que hablan del tiempo
+    weather_sentences = [sentence for _, sentence in _sentences(text)
+                         if re.search(r"\bWetter\b", sentence, re.IGNORECASE)
+                         or sentence in temperature_sentences or find_wind(sentence)]
+    terms = find_weather_terms(" ".join(weather_sentences))
+    if terms:
+        fields["Wetter"] = ", ".join(terms)
+    return fields
+
+
+def pre_extract(transcribed_text, current_date_str):
+    """
+    Campos del schema que las reglas rellenan con seguridad: {campo: valor}.
+    El Datum siempre es el de la entrada (el prompt pide al LLM exactamente lo mismo).
+    """
+    fields = {"Datum": current_date_str}
+    fields.update(extract_weather(transcribed_text))
+
+    sites = load_known_workers()
+    site_name = detect_site(transcribed_text, sites) if sites else None
+    if site_name:
+        fields["Baustelle"] = site_name
+    site_phrases = [phrase for name, site in sites.items() for phrase in [name] + list((site or {}).get("Alias") or [])]
+    personal = extract_personal(transcribed_text, _known_people(sites, site_name), site_phrases)
+    if personal:
+        fields["Personal"] = personal
+    return fields
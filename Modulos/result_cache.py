@@ -0,0 +1,142 @@
+# result_cache.py
+# Caché en disco, direccionada por contenido, para resultados caros de recalcular
+# (extracciones del LLM y transcripciones de Whisper).
+import hashlib
+import json
+import os
+import threading
+
+# Importar configuraciones
+import Modulos.config as config
+
+
+def make_cache_key(*parts):
+    """Hash SHA-256 estable de las partes que determinan un resultado."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def file_content_hash(file_path):
+    """SHA-256 del contenido de un archivo (independiente del nombre o la ruta)."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Guarda valores JSON en archivos <directorio>/<clave[:2]>/<clave>.json.
+    Cuando el tamaño total supera max_bytes se expulsan las entradas usadas hace más
+    tiempo (la fecha de modificación del archivo se actualiza en cada acierto).
+    """
+
+    def __init__(self, name, directory, max_bytes):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = None  # ruta -> tamaño, se construye la primera vez que hace falta
+
+    def _path_for(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Devuelve el valor guardado para key o None si no está en la caché."""
+        if not config.CACHE_ENABLED:
+            return None
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # Marca la entrada como usada recientemente para el LRU
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Guarda value (serializable a JSON) bajo key y aplica el límite de tamaño."""
+        if not config.CACHE_ENABLED:
+            return
+        path = self._path_for(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar en la caché '{self.name}': {e}")
+            return
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[path] = len(data)
+            self._evict(sizes)
+
+    def _load_sizes(self):
+        if self._sizes is None:
+            self._sizes = {}
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    if filename.endswith(".json"):
+                        path = os.path.join(root, filename)
+                        try:
+                            self._sizes[path] = os.path.getsize(path)
+                        except OSError:
+                            pass
+        return self._sizes
+
+    def _evict(self, sizes):
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0.0
+
+        for path in sorted(sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= sizes.pop(path)
+
+    def stats_line(self):
+        total = self.hits + self.misses
+        ratio = f"{self.hits / total:.0%}" if total else "-"
+        return f"  Caché {self.name}: {self.hits} aciertos, {self.misses} fallos (tasa de acierto {ratio})"
+
+
+llm_cache = ResultCache("LLM", os.path.join(config.CACHE_DIR, "llm"), config.LLM_CACHE_MAX_BYTES)
+transcription_cache = ResultCache("Whisper", os.path.join(config.CACHE_DIR, "whisper"),
+                                  config.TRANSCRIPTION_CACHE_MAX_BYTES)
+
+
+def print_cache_stats():
+    """Imprime las estadísticas de acierto de las cachés usadas en este proceso."""
+    caches = [cache for cache in (llm_cache, transcription_cache) if cache.hits or cache.misses]
+    if caches:
+        print("--- Estadísticas de caché ---")
+        for cache in caches:
+            print(cache.stats_line())
@@ -0,0 +1,463 @@
+# server.py
+# Modo servidor (python main.py --serve): varias personas envían dictados por HTTP desde sus
+# tabletas y todos los procesa un único proceso dueño de Whisper, en lugar de un main.py (y
+# una copia del modelo en RAM/VRAM) por persona.
+#
+# El proceso principal atiende HTTP con asyncio y solo guarda los audios recibidos y el estado
+# de los trabajos. El proceso del modelo toma de la cola los dictados pendientes, transcribe a
+# la vez todos los que haya (hasta WHISPER_BATCH_SIZE, ver transcribe_audio_files) y pasa cada
+# texto a un pool de hilos que hace la extracción con Ollama y escribe el txt y el Excel. Con
+# más dictados en cola los lotes de Whisper son mayores, sin más memoria por usuario.
+#
+# API (JSON):
+#   POST /api/dictados?fecha=YYYY-MM-DD&nombre=audio.m4a   cuerpo = archivo de audio -> 202 {"id", ...}
+#   GET  /api/dictados/<id>                                 estado del trabajo
+#   GET  /api/dictados/<id>/excel                           descarga del xlsx generado
+#   GET  /api/estado                                        cola, capacidad y proceso del modelo
+# Si la cola está llena se responde 429 con Retry-After sin leer el audio; si el proceso
+# del modelo no está disponible, 503.
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+# Importar configuraciones y módulos del proyecto
+import Modulos.config as config
+import Modulos.audio_processing as audio_processing
+import Modulos.llm_interaction as llm_interaction
+import Modulos.entry_processing as entry_processing
+import Modulos.site_workbooks as site_workbooks
+import Modulos.metrics as metrics
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Estados de un trabajo; los dos últimos son finales
+STATUS_QUEUED = "en_cola"
+STATUS_TRANSCRIBING = "transcribiendo"
+STATUS_EXTRACTING = "extrayendo"
+STATUS_SAVING = "guardando"
+STATUS_DONE = "terminado"
+STATUS_ERROR = "error"
+FINAL_STATUSES = (STATUS_DONE, STATUS_ERROR)
+
+_READ_CHUNK_BYTES = 1024 * 1024
+_IDLE_CONNECTION_SECONDS = 60
+
+
+# --- Proceso del modelo ---
+
+def _extract_and_render(job, transcribed_text, events):
+    """Hilo del pool del proceso del modelo: LLM, txt y Excel de un dictado ya transcrito."""
+    with metrics.trace(job["id"]):
+        try:
+            events.put((STATUS_EXTRACTING, job["id"], {"texto": transcribed_text}))
+            bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(transcribed_text, job["date"])
+            if not bautagebuch_data:
+                events.put((STATUS_ERROR, job["id"], {"error": "No se pudieron extraer los datos del Bautagebuch."}))
+                return
+            entry_processing.complete_bautagebuch_data(bautagebuch_data, job["date"])
+            events.put((STATUS_SAVING, job["id"], {}))
+            saved_workbooks = []
+            excel_path = entry_processing.render_entry(
+                bautagebuch_data, job["date"], transcribed_text=transcribed_text,
+                output_basename=f"Bautagebuch_{job['date'].replace('-', '')}_{job['id']}",
+                on_saved=saved_workbooks.append)
+            if config.OUTPUT_MODE == "per_site_month":
+                site_workbooks.flush_all()  # El libro debe estar en disco antes de ofrecer la descarga
+                excel_path = saved_workbooks[0] if saved_workbooks else None
+            if not excel_path:
+                events.put((STATUS_ERROR, job["id"], {"error": "No se pudo rellenar o guardar el archivo Excel."}))
+                return
+            events.put((STATUS_DONE, job["id"], {"excel": excel_path, "datos": bautagebuch_data}))
+        except Exception as e:
+            events.put((STATUS_ERROR, job["id"], {"error": f"Error inesperado al procesar el dictado: {e}"}))
+
+
+def _next_batch(jobs):
+    """Bloquea hasta el siguiente dictado y añade los que ya esperan en la cola. (lote, parar)."""
+    job = jobs.get()
+    if job is None:
+        return [], True
+    batch = [job]
+    while len(batch) < max(config.WHISPER_BATCH_SIZE, 1):
+        try:
+            job = jobs.get_nowait()
+        except queue.Empty:
+            break
+        if job is None:
+            return batch, True
+        batch.append(job)
+    return batch, False
+
+
+def model_worker(jobs, events):
+    """
+    Proceso dueño del modelo Whisper. Lee trabajos de jobs hasta recibir None y comunica
+    cada cambio de estado por events como (estado, id, valores).
+    """
+    # Ctrl+C llega a todo el grupo de procesos; el proceso principal decide cuándo parar (shutdown)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        audio_processing.get_whisper_model()
+    except Exception as e:
+        events.put(("sin_modelo", None, {"error": f"No se pudo cargar el modelo Whisper: {e}"}))
+        return
+    events.put(("listo", None, {}))
+
+    with ThreadPoolExecutor(max_workers=config.BATCH_LLM_WORKERS, thread_name_prefix="llm") as llm_pool:
+        stop = False
+        while not stop:
+            batch, stop = _next_batch(jobs)
+            if not batch:
+                break
+            for job in batch:
+                events.put((STATUS_TRANSCRIBING, job["id"], {"lote": len(batch)}))
+            start = time.perf_counter()
+            try:
+                texts = audio_processing.transcribe_audio_files([job["audio_path"] for job in batch])
+            except Exception as e:
+                texts = [None] * len(batch)
+                print(f"❌ Error al transcribir el lote: {e}")
+            share = (time.perf_counter() - start) / len(batch)
+            for job, transcribed_text in zip(batch, texts):
+                try:
+                    os.remove(job["audio_path"])
+                except OSError:
+                    pass
+                with metrics.trace(job["id"]):
+                    metrics.record("transcripcion", share, "ok" if transcribed_text else "sin_resultado",
+                                   batch_size=len(batch))
+                if not transcribed_text:
+                    events.put((STATUS_ERROR, job["id"], {"error": "No se pudo obtener la transcripción."}))
+                    continue
+                llm_pool.submit(_extract_and_render, job, transcribed_text, events)
+    site_workbooks.flush_all()
+
+
+# --- Servidor HTTP (proceso principal) ---
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class TranscriptionServer:
+    """Servidor HTTP asyncio mínimo con la cola de dictados y el proceso del modelo."""
+
+    def __init__(self, host=None, port=None, max_queued_jobs=None):
+        self.host = host or config.SERVER_HOST
+        self.port = port or config.SERVER_PORT
+        self.max_queued_jobs = max_queued_jobs or config.SERVER_MAX_QUEUED_JOBS
+        self.upload_dir = config.ensure_dir(config.SERVER_UPLOAD_DIR or os.path.join(tempfile.gettempdir(),
+                                                                                     "bautagebuch_uploads"))
+        self.jobs = OrderedDict()  # id -> estado del trabajo, en orden de llegada
+        self.active_jobs = 0  # Aceptados y no terminados (cuentan para la contrapresión)
+        self.model_state = "cargando"
+        self._job_seconds = None  # Media móvil de la duración de un trabajo, para Retry-After
+        # "spawn" también en Linux: el proceso del modelo no hereda hilos ni un contexto CUDA a medias
+        context = multiprocessing.get_context("spawn")
+        self._job_queue = context.Queue()
+        self._events = context.Queue()
+        self._worker = context.Process(target=model_worker, args=(self._job_queue, self._events),
+                                       name="bautagebuch-modelo", daemon=True)
+        self._closing = False
+
+    # --- Estado de los trabajos ---
+
+    def _queue_position(self, job_id):
+        position = 0
+        for other_id, job in self.jobs.items():
+            if job["status"] == STATUS_QUEUED:
+                position += 1
+            if other_id == job_id:
+                return position
+        return None
+
+    def _public_job(self, job):
+        payload = {key: job[key] for key in ("id", "status", "fecha", "creado", "actualizado", "lote",
+                                             "texto", "datos", "error") if job.get(key) is not None}
+        if job["status"] == STATUS_QUEUED:
+            payload["posicion"] = self._queue_position(job["id"])
+        if job["status"] == STATUS_DONE:
+            payload["excel_url"] = f"/api/dictados/{job['id']}/excel"
+        return payload
+
+    def _apply_event(self, status, job_id, values):
+        if job_id is None:
+            self.model_state = status
+            if status == "sin_modelo":
+                print(f"❌ {values.get('error')}")
+                self._fail_active_jobs(values.get("error"))
+            else:
+                print("✅ Proceso del modelo listo.")
+            return
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return
+        job.update(values)
+        job["status"] = status
+        job["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        if status in FINAL_STATUSES:
+            self._job_finished(job)
+            icon = "✅" if status == STATUS_DONE else "❌"
+            print(f"{icon} Dictado {job_id}: {job.get('excel') or job.get('error')}")
+
+    def _job_finished(self, job):
+        self.active_jobs -= 1
+        elapsed = time.monotonic() - job["_recibido"]
+        self._job_seconds = elapsed if self._job_seconds is None else 0.8 * self._job_seconds + 0.2 * elapsed
+        finished = [job_id for job_id, other in self.jobs.items() if other["status"] in FINAL_STATUSES]
+        for job_id in finished[:max(0, len(finished) - config.SERVER_FINISHED_JOBS_KEPT)]:
+            del self.jobs[job_id]
+
+    def _fail_active_jobs(self, error):
+        # Copia: _job_finished puede borrar trabajos terminados de self.jobs
+        for job in list(self.jobs.values()):
+            if job["status"] not in FINAL_STATUSES:
+                job.update(status=STATUS_ERROR, error=error)
+                self._job_finished(job)
+
+    async def _pump_events(self):
+        """Aplica los cambios de estado que envía el proceso del modelo y vigila que siga vivo."""
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            try:
+                status, job_id, values = await loop.run_in_executor(None, self._events.get, True, 1.0)
+            except queue.Empty:
+                if not self._worker.is_alive() and self.model_state != "detenido":
+                    self.model_state = "detenido"
+                    print(f"❌ El proceso del modelo terminó (código {self._worker.exitcode}).")
+                    self._fail_active_jobs("El proceso del modelo terminó inesperadamente.")
+                continue
+            self._apply_event(status, job_id, values)
+
+    def _retry_after_seconds(self):
+        """Estimación del tiempo hasta que se libere un hueco en la cola."""
+        batch = max(config.WHISPER_BATCH_SIZE, 1)
+        return max(5, math.ceil((self._job_seconds or 30.0) / batch))
+
+    # --- Rutas ---
+
+    def _check_accepting(self):
+        if self._closing or self.model_state in ("sin_modelo", "detenido"):
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "El proceso del modelo no está disponible.")
+        if self.active_jobs >= self.max_queued_jobs:
+            raise HttpError(HTTPStatus.TOO_MANY_REQUESTS,
+                            f"Hay {self.active_jobs} dictados en proceso (máximo {self.max_queued_jobs}). "
+                            "Inténtalo de nuevo más tarde.",
+                            {"Retry-After": str(self._retry_after_seconds())})
+
+    async def _create_job(self, reader, writer, headers, query):
+        self._check_accepting()  # Antes de leer el audio: con la cola llena no se recibe el cuerpo
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Envía el audio con Content-Length.")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Falta Content-Length.")
+        if length <= 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "El cuerpo de la petición debe ser el archivo de audio.")
+        if length > config.SERVER_MAX_UPLOAD_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"El audio supera {config.SERVER_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        date_str = query.get("fecha", [None])[0] or config.get_current_date_str()
+        try:
+            datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "fecha debe tener el formato YYYY-MM-DD.")
+        extension = os.path.splitext(query.get("nombre", [""])[0])[1].lower()
+        if extension not in config.BATCH_AUDIO_EXTENSIONS:
+            extension = ".audio"  # FFmpeg detecta el formato por el contenido
+
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+
+        job_id = uuid.uuid4().hex[:12]
+        audio_path = os.path.join(self.upload_dir, f"{job_id}{extension}")
+        # Se reserva el hueco antes de recibir el audio para que las subidas simultáneas no superen el límite
+        self.active_jobs += 1
+        try:
+            with open(audio_path, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = await reader.read(min(remaining, _READ_CHUNK_BYTES))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            self.active_jobs -= 1
+            try:
+                os.remove(audio_path)
+            except OSError:
+                pass
+            raise
+
+        now = datetime.now().isoformat(timespec="seconds")
+        job = {"id": job_id, "status": STATUS_QUEUED, "fecha": date_str, "creado": now, "actualizado": now,
+               "_recibido": time.monotonic()}
+        self.jobs[job_id] = job
+        self._job_queue.put({"id": job_id, "date": date_str, "audio_path": audio_path})
+        print(f"📥 Dictado {job_id} recibido ({length / 1024:.0f} KB, {self.active_jobs} en proceso).")
+        return HTTPStatus.ACCEPTED, self._public_job(job), {"Location": f"/api/dictados/{job_id}"}
+
+    def _get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No existe el dictado {job_id}.")
+        return job
+
+    async def _download_excel(self, job_id):
+        job = self._get_job(job_id)
+        if job["status"] != STATUS_DONE:
+            raise HttpError(HTTPStatus.CONFLICT, f"El dictado está en estado '{job['status']}'.")
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(None, _read_file, job["excel"])
+        except OSError:
+            raise HttpError(HTTPStatus.GONE, "El archivo Excel ya no existe.")
+        filename = os.path.basename(job["excel"])
+        # Las cabeceras van en latin-1: nombre ASCII de reserva y el nombre real en UTF-8 (RFC 6266)
+        ascii_name = filename.encode("ascii", "replace").decode("ascii").replace('"', "_")
+        return body, {"Content-Type": XLSX_CONTENT_TYPE,
+                      "Content-Disposition": f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"}
+
+    def _server_status(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "modelo": self.model_state,
+            "en_proceso": self.active_jobs,
+            "capacidad": self.max_queued_jobs,
+            "lote_whisper": max(config.WHISPER_BATCH_SIZE, 1),
+            "trabajos": counts,
+            "segundos_por_trabajo": round(self._job_seconds, 1) if self._job_seconds is not None else None,
+        }
+
+    async def _route(self, method, target, headers, reader, writer):
+        """Devuelve (estado, cuerpo, cabeceras); el cuerpo es un dict (JSON) o bytes."""
+        if config.SERVER_TOKEN and headers.get("authorization") != f"Bearer {config.SERVER_TOKEN}":
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Falta el token o no es válido.",
+                            {"WWW-Authenticate": "Bearer"})
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["api", "estado"] and method == "GET":
+            return HTTPStatus.OK, self._server_status(), {}
+        if parts == ["api", "dictados"] and method == "POST":
+            return await self._create_job(reader, writer, headers, parse_qs(url.query))
+        if len(parts) == 3 and parts[:2] == ["api", "dictados"] and method == "GET":
+            return HTTPStatus.OK, self._public_job(self._get_job(parts[2])), {}
+        if len(parts) == 4 and parts[:2] == ["api", "dictados"] and parts[3] == "excel" and method == "GET":
+            body, extra_headers = await self._download_excel(parts[2])
+            return HTTPStatus.OK, body, extra_headers
+        raise HttpError(HTTPStatus.NOT_FOUND, f"Ruta no encontrada: {method} {url.path}")
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:  # Conexiones persistentes de HTTP/1.1
+                request_line = await asyncio.wait_for(reader.readline(), _IDLE_CONNECTION_SECONDS)
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await _send(writer, HTTPStatus.BAD_REQUEST, {"error": "Petición HTTP no válida."}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                try:
+                    status, body, extra_headers = await self._route(method.upper(), target, headers, reader, writer)
+                except HttpError as e:
+                    status, body, extra_headers = e.status, {"error": str(e)}, e.headers
+                    # Si quedó un cuerpo sin leer (p. ej. audio rechazado por la cola llena), se cierra
+                    keep_alive = keep_alive and not int(headers.get("content-length") or 0)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, body, extra_headers = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}, {}
+                    keep_alive = False
+                await _send(writer, status, body, extra_headers, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._worker.start()
+        pump = asyncio.create_task(self._pump_events())
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"🌐 Servidor de dictados en http://{self.host}:{self.port} "
+              f"(cola máx. {self.max_queued_jobs}, lote Whisper {max(config.WHISPER_BATCH_SIZE, 1)}). "
+              f"Ctrl+C para parar.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._closing = True
+            await pump
+
+    def shutdown(self, timeout=60):
+        """Termina los trabajos ya en la cola del proceso del modelo y lo detiene."""
+        if not self._worker.is_alive():
+            return
+        print(f"\n⏳ Deteniendo el proceso del modelo ({self.active_jobs} dictado(s) sin terminar)...")
+        self._job_queue.put(None)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            self._worker.terminate()
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _send(writer, status, body, headers=None, close=False):
+    headers = dict(headers or {})
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        headers.setdefault("Content-Type", "application/json; charset=utf-8")
+    headers["Content-Length"] = str(len(body))
+    headers["Connection"] = "close" if close else "keep-alive"
+    status = HTTPStatus(status)
+    head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + \
+           "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def run_server(host=None, port=None):
+    """Arranca el servidor y el proceso del modelo hasta Ctrl+C."""
+    server = TranscriptionServer(host, port)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    print("--- Servidor detenido ---")
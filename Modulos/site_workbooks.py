@@ -0,0 +1,256 @@
+# site_workbooks.py
+# Modo de salida consolidado: todas las entradas de una Baustelle en un mes van como hojas
+# a un único libro <Baustelle>_<AAAA-MM>.xlsx, con una hoja "Index" y un índice JSON al lado
+# (<libro>.index.json) para buscar entradas sin abrir ningún Excel.
+# Las entradas se acumulan en memoria y los libros se guardan por lotes.
+import atexit
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+
+# Importar módulos del proyecto
+import Modulos.config as config
+import Modulos.excel_processing as excel_processing
+import Modulos.lazy_modules as lazy_modules
+
+openpyxl = lazy_modules.lazy_import("openpyxl")
+
+TEMPLATE_SHEET = "Vorlage"
+INDEX_SHEET = "Index"
+INDEX_HEADER = ["Hoja", "Datum", "Baustelle", "Auftrag", "Personal", "Arbeitszeit (h)", "Guardado"]
+
+
+# Formatos de fecha que puede devolver el LLM además de YYYY-MM-DD
+_DATUM_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d/%m/%y")
+
+
+def normalize_datum(datum, fallback=None):
+    """
+    Devuelve datum como YYYY-MM-DD. Las fechas que no se pueden interpretar se sustituyen
+    por fallback (por defecto, la fecha actual): acaban en nombres de libro y de hoja.
+    """
+    text = str(datum or "").strip()
+    for date_format in _DATUM_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return fallback or config.get_current_date_str()
+
+
+def site_workbook_path(baustelle, datum):
+    """Ruta del libro consolidado de una Baustelle para el mes de datum."""
+    month = normalize_datum(datum)[:7]
+    site_name = excel_processing.safe_filename_part(baustelle)
+    return os.path.join(config.SITE_WORKBOOKS_DIR, f"{site_name}_{month}.xlsx")
+
+
+def _index_path(workbook_path):
+    return workbook_path + ".index.json"
+
+
+def _load_index(workbook_path):
+    try:
+        with open(_index_path(workbook_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def find_entries(baustelle, month=None):
+    """
+    Devuelve las entradas indexadas de una Baustelle (opcionalmente de un mes "YYYY-MM")
+    leyendo solo los índices JSON. Cada entrada incluye la ruta del libro en "workbook".
+    """
+    site_name = excel_processing.safe_filename_part(baustelle)
+    pattern = f"{site_name}_{month}.xlsx.index.json" if month else f"{site_name}_????-??.xlsx.index.json"
+    entries = []
+    for index_file in sorted(glob.glob(os.path.join(config.SITE_WORKBOOKS_DIR, pattern))):
+        workbook_path = index_file[:-len(".index.json")]
+        for entry in _load_index(workbook_path):
+            entries.append(dict(entry, workbook=workbook_path))
+    return entries
+
+
+def _new_site_workbook():
+    """Libro nuevo: hoja Index + la plantilla oculta, que se copia para cada entrada."""
+    wb = openpyxl.load_workbook(config.EXCEL_TEMPLATE_PATH)
+    template_ws = wb.active
+    template_ws.title = TEMPLATE_SHEET
+    template_ws.sheet_view.tabSelected = False
+    template_ws.sheet_state = "hidden"
+    index_ws = wb.create_sheet(INDEX_SHEET, 0)
+    index_ws.append(INDEX_HEADER)
+    wb.active = 0
+    return wb
+
+
+def _unique_sheet_title(wb, datum):
+    # datum ya viene normalizado (YYYY-MM-DD); los nombres de hoja tienen como máximo 31 caracteres
+    base = str(datum)[:20]
+    number = 1
+    while f"{base} #{number}" in wb.sheetnames:
+        number += 1
+    return f"{base} #{number}"
+
+
+class SiteWorkbookWriter:
+    """Acumula entradas y las escribe en los libros por Baustelle y mes cada flush_every entradas."""
+
+    def __init__(self, flush_every=None):
+        self.flush_every = flush_every or config.SITE_WORKBOOK_FLUSH_EVERY
+        self._pending = {}  # ruta del libro -> [(datos, fecha, on_saved, clave de la entrada)]
+        self._pending_count = 0
+        self._lock = threading.Lock()
+
+    def add(self, bautagebuch_data, current_date_str, on_saved=None, entry_key=None):
+        """
+        Añade una entrada al búfer. Devuelve la ruta del libro en el que se guardará.
+        La entrada solo está en disco cuando se llama a on_saved(ruta); si el guardado
+        falla, vuelve al búfer y se reintenta en el siguiente flush.
+        Una entrada con la misma entry_key que otra ya guardada en el libro sustituye su hoja.
+        """
+        datum = normalize_datum(bautagebuch_data.get("Datum"), current_date_str)
+        workbook_path = site_workbook_path(bautagebuch_data.get("Baustelle", "Unbekannt"), datum)
+        with self._lock:
+            self._pending.setdefault(workbook_path, []).append(
+                (bautagebuch_data, current_date_str, on_saved, entry_key))
+            self._pending_count += 1
+            should_flush = self._pending_count >= self.flush_every
+        print(f"\n🗂️ Entrada añadida a {workbook_path} (se guarda por lotes).")
+        if should_flush:
+            self.flush()
+        return workbook_path
+
+    def flush(self):
+        """
+        Guarda todas las entradas pendientes: un load/save por libro, no por entrada (cada flush
+        reescribe el libro completo; agrupar entradas es lo que reparte ese coste).
+        Las entradas de un libro que no se puede guardar (p. ej. abierto en Excel) siguen
+        pendientes. Devuelve cuántas entradas quedan sin guardar.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+            for workbook_path, entries in pending.items():
+                try:
+                    self._write_entries(workbook_path, entries)
+                except Exception as e:
+                    self._pending[workbook_path] = entries
+                    self._pending_count += len(entries)
+                    print(f"❌ Error al guardar el libro {workbook_path}: {e}. "
+                          f"{len(entries)} entrada(s) siguen pendientes (¿está abierto en Excel?).")
+                    continue
+                print(f"✅ {len(entries)} entrada(s) guardada(s) en: {workbook_path}")
+                for _, _, on_saved, _ in entries:
+                    if on_saved:
+                        on_saved(workbook_path)
+            return self._pending_count
+
+    def _write_entries(self, workbook_path, entries):
+        wb = openpyxl.load_workbook(workbook_path) if os.path.exists(workbook_path) else _new_site_workbook()
+        template_ws = wb[TEMPLATE_SHEET]
+        index_ws = wb[INDEX_SHEET]
+        index = _load_index(workbook_path)
+        indexed = {record["entry_key"]: record for record in index if record.get("entry_key")}
+        saved_at = datetime.now().isoformat(timespec="seconds")
+        details = []
+
+        for bautagebuch_data, current_date_str, _, key in entries:
+            datum = normalize_datum(bautagebuch_data.get("Datum"), current_date_str)
+            previous = indexed.get(key) if key else None
+            ws = wb.copy_worksheet(template_ws)
+            ws.sheet_state = "visible"
+            if previous and previous["sheet"] in wb.sheetnames:
+                # La entrada ya está en el libro (regenerar, lote con --force): se sustituye su hoja
+                old_ws = wb[previous["sheet"]]
+                position = wb.index(old_ws)
+                wb.remove(old_ws)
+                ws.title = previous["sheet"]
+                wb.move_sheet(ws, position - wb.index(ws))
+            else:
+                if previous:
+                    index.remove(previous)  # Su hoja se borró del libro: se vuelve a añadir
+                previous = None
+                ws.title = _unique_sheet_title(wb, datum)
+            cell_values = excel_processing.build_excel_cell_values(bautagebuch_data)
+            for cell_ref, value in cell_values.items():
+                ws[cell_ref] = value
+
+            hours = sum(value for ref, value in cell_values.items()
+                        if ref.startswith("F") and isinstance(value, (int, float)))
+            record = {
+                "sheet": ws.title,
+                "Datum": datum,
+                "Baustelle": bautagebuch_data.get("Baustelle", "Unbekannt"),
+                "Auftrag": bautagebuch_data.get("Auftrag", "Unbekannt"),
+                "Personal": len(bautagebuch_data.get("Personal", []) or []),
+                "Arbeitszeit_Stunden": round(hours, 2),
+                "saved_at": saved_at,
+                "entry_key": key,
+            }
+            row_values = [record["sheet"], record["Datum"], str(record["Baustelle"]), str(record["Auftrag"]),
+                          record["Personal"], record["Arbeitszeit_Stunden"], saved_at]
+            if previous:
+                index[index.index(previous)] = record
+                row = next(row for row in range(2, index_ws.max_row + 1)
+                           if index_ws.cell(row=row, column=1).value == ws.title)
+                for column, value in enumerate(row_values, start=1):
+                    index_ws.cell(row=row, column=column, value=value)
+            else:
+                index.append(record)
+                index_ws.append(row_values)
+                index_ws.cell(row=index_ws.max_row, column=1).hyperlink = f"#'{ws.title}'!A1"
+                # El txt es un registro que solo crece: una entrada sustituida no se vuelve a añadir
+                details.append(excel_processing.format_extended_text_details(bautagebuch_data, current_date_str))
+            if key:
+                indexed[key] = record
+
+        # Libro e índice se preparan en temporales y se sustituyen juntos: si algo falla antes,
+        # no cambia nada en disco y las entradas se pueden reintentar sin duplicar hojas
+        config.ensure_dir(os.path.dirname(workbook_path))
+        tmp_path = workbook_path + ".tmp"
+        index_tmp_path = _index_path(workbook_path) + ".tmp"
+        wb.save(tmp_path)
+        with open(index_tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, workbook_path)
+        # Con el libro sustituido las entradas ya están guardadas: lo que falle después solo se avisa
+        try:
+            os.replace(index_tmp_path, _index_path(workbook_path))
+            with open(os.path.splitext(workbook_path)[0] + ".txt", "a", encoding="utf-8") as f:
+                for text in details:
+                    f.write(text + "\n\n" + "-" * 40 + "\n\n")
+        except OSError as e:
+            print(f"⚠️ Libro guardado, pero no se pudo actualizar su índice o su txt ({workbook_path}): {e}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Escritor compartido del proceso; las entradas pendientes se guardan también al salir."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SiteWorkbookWriter()
+            atexit.register(_flush_at_exit)
+        return _writer
+
+
+def _flush_at_exit():
+    unsaved = _writer.flush()
+    if unsaved:
+        hint = " Siguen en el almacén local (python -m Modulos.entry_store regenerar)." \
+            if config.ENTRY_STORE_ENABLED else ""
+        print(f"⚠️ {unsaved} entrada(s) no se pudieron guardar en su libro.{hint}")
+
+
+def flush_all():
+    """Guarda las entradas pendientes del escritor compartido, si lo hay. Devuelve cuántas quedan sin guardar."""
+    if _writer is not None:
+        return _writer.flush()
+    return 0
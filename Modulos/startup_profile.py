@@ -0,0 +1,68 @@
+# startup_profile.py
+# Desglose del tiempo de importación al arrancar (python main.py --profile-startup).
+# Se lanza un intérprete aparte con "-X importtime" y se resumen los módulos de primer nivel
+# que más tardan: primero lo que se importa al arrancar main.py y después las dependencias
+# pesadas que ahora se cargan en segundo plano o al usarse por primera vez.
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+# Dependencias que main.py ya no importa al arrancar (ver Modulos/lazy_modules.py)
+DEFERRED_MODULES = ("torch", "whisper", "torchaudio", "numpy", "speech_recognition", "ollama", "openpyxl")
+
+
+def parse_importtime(stderr_text):
+    """
+    Convierte la salida de "-X importtime" en [(módulo, propio_us, acumulado_us, profundidad)].
+    Cada línea tiene la forma "import time:  self | cumulative | <sangría>módulo".
+    """
+    rows = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Cabecera "self [us] | cumulative | imported package"
+        name_field = parts[2][1:]
+        depth = (len(name_field) - len(name_field.lstrip(" "))) // 2
+        rows.append((name_field.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def _profile_imports(code):
+    """Ejecuta code en un intérprete con -X importtime. Devuelve (filas, segundos de reloj)."""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=project_dir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        print(f"⚠️ El intérprete de perfilado terminó con errores: {errors[-1] if errors else completed.returncode}")
+    return parse_importtime(completed.stderr), elapsed
+
+
+def _print_breakdown(title, rows, elapsed, top):
+    total_us = sum(row[2] for row in rows if row[3] == 0)
+    print(f"\n{title}: {total_us / 1e6:.3f} s importando ({elapsed:.3f} s de reloj con el intérprete)")
+    # Módulos de primer nivel y lo que importa cada uno directamente (acumulado, incluye sus dependencias)
+    heaviest = sorted((row for row in rows if row[3] <= 1), key=lambda row: row[2], reverse=True)
+    for name, _, cumulative_us, depth in heaviest[:top]:
+        print(f"  {cumulative_us / 1e3:9.1f} ms  {'  ' * depth}{name}")
+
+
+def print_startup_profile(top=15):
+    """Imprime el desglose de importaciones del arranque y de las dependencias diferidas."""
+    rows, elapsed = _profile_imports("import main")
+    _print_breakdown("--- Arranque (import main)", rows, elapsed, top)
+
+    available = [name for name in DEFERRED_MODULES if _is_installed(name)]
+    if available:
+        rows, elapsed = _profile_imports("import " + ", ".join(available))
+        _print_breakdown("--- Dependencias diferidas (segundo plano / primer uso)", rows, elapsed, top)
+
+
+def _is_installed(module_name):
+    return importlib.util.find_spec(module_name) is not None
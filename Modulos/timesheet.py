@@ -0,0 +1,174 @@
+# timesheet.py
+# Cálculo vectorizado de Arbeitszeit para muchas filas de Personal a la vez (p. ej. la
+# conciliación mensual de nóminas) y agregados por trabajador, Baustelle y periodo.
+# Los resultados coinciden exactamente con excel_processing.calculate_arbeitszeit fila a fila.
+#
+# Las horas se analizan una sola vez por valor distinto (en un mes hay pocos "07:00",
+# "16:30", ... repetidos miles de veces) y el resto del cálculo son operaciones de NumPy.
+#
+# Uso desde la línea de comandos (sobre el almacén de entradas):
+#   python -m Modulos.timesheet --desde 2026-03-01 --hasta 2026-03-31 --periodo mes
+import argparse
+import re
+
+import numpy as np
+
+# Importar módulos del proyecto
+import Modulos.excel_processing as excel_processing
+import Modulos.entry_store as entry_store
+
+# Misma expresión que genera time.strptime para "%H:%M"
+_TIME_RE = re.compile(r"(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)", re.IGNORECASE)
+_PLACEHOLDERS = ("unbekannt", "hh:mm", "")
+# Con pausas más grandes timedelta desborda; esas filas se calculan con la función escalar
+_MAX_SAFE_PAUSE_MINUTES = 10 ** 12
+
+
+def _factorize(values):
+    """Devuelve (códigos por fila, lista de valores distintos) sin exigir que los valores sean ordenables."""
+    codes = np.empty(len(values), dtype=np.intp)
+    uniques = []
+    positions = {}
+    for i, value in enumerate(values):
+        try:
+            key = (type(value), value)
+            code = positions.get(key)
+            if code is None:
+                code = positions[key] = len(uniques)
+                uniques.append(value)
+        except TypeError:  # Valor no hashable (lista, dict...): se trata por separado
+            code = len(uniques)
+            uniques.append(value)
+        codes[i] = code
+    return codes, uniques
+
+
+def _time_to_minutes(value):
+    """Minutos desde medianoche de "HH:MM", o -1 si calculate_arbeitszeit lo rechazaría."""
+    if not isinstance(value, str) or ":" not in value or value.lower() in _PLACEHOLDERS:
+        return -1
+    match = _TIME_RE.fullmatch(value)
+    if not match:
+        return -1
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def _pause_to_minutes(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0  # Default to 0 if pause is not a valid number or None
+
+
+def parse_times(values):
+    """Array int64 de minutos desde medianoche; -1 donde la hora no es válida."""
+    codes, uniques = _factorize(values)
+    return np.array([_time_to_minutes(value) for value in uniques], dtype=np.int64)[codes]
+
+
+def calculate_arbeitszeit_batch(von_values, bis_values, pause_values):
+    """
+    Versión vectorizada de calculate_arbeitszeit para secuencias de igual longitud.
+    Devuelve un array float64 de horas con NaN donde calculate_arbeitszeit devolvería None.
+    """
+    n = len(von_values)
+    if not (len(bis_values) == len(pause_values) == n):
+        raise ValueError("von, bis y pause deben tener la misma longitud")
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+
+    pause_codes, pause_uniques = _factorize(pause_values)
+    pause_unique_minutes = [_pause_to_minutes(value) for value in pause_uniques]
+    pause_is_safe = np.array([abs(p) <= _MAX_SAFE_PAUSE_MINUTES for p in pause_unique_minutes])[pause_codes]
+    pause = np.array([p if abs(p) <= _MAX_SAFE_PAUSE_MINUTES else 0 for p in pause_unique_minutes],
+                     dtype=np.int64)[pause_codes]
+
+    von = parse_times(von_values)
+    bis = parse_times(bis_values)
+    valid = (von >= 0) & (bis >= 0)
+
+    # Trabajo nocturno: si bis es anterior a von, termina al día siguiente
+    duration = np.where(bis < von, bis + 1440, bis) - von
+    seconds = (duration - pause) * 60
+
+    # round() de Python (redondeo decimal exacto) solo sobre los valores distintos
+    unique_seconds, inverse = np.unique(seconds[valid], return_inverse=True)
+    rounded = np.array([round(s / 3600.0, 2) for s in unique_seconds.tolist()], dtype=np.float64)
+    valid_hours = rounded[inverse]
+
+    hours = np.full(n, np.nan, dtype=np.float64)
+    hours[valid] = np.where(valid_hours > 0.0, valid_hours, 0.0)  # Ensure non-negative, como max(0.0, x)
+
+    # Pausas fuera de rango: se delega en la función escalar para reproducir su resultado
+    for i in np.flatnonzero(~pause_is_safe):
+        result = excel_processing.calculate_arbeitszeit(von_values[i], bis_values[i], pause_values[i])
+        hours[i] = np.nan if result is None else result
+    return hours
+
+
+def aggregate_hours(hours, workers, sites, dates, period="mes"):
+    """
+    Suma las horas por (trabajador, Baustelle, periodo), con periodo "dia", "semana" (ISO) o "mes".
+    Las filas sin horas válidas (NaN) cuentan como filas pero no suman.
+    Devuelve una lista de dicts ordenada por periodo, Baustelle y trabajador.
+    """
+    hours = np.asarray(hours, dtype=np.float64)
+    if len(hours) == 0:
+        return []
+    worker_codes, worker_uniques = _factorize([str(w) for w in workers])
+    site_codes, site_uniques = _factorize([str(s) for s in sites])
+    date_codes, date_uniques = _factorize(dates)
+    period_of_date = [entry_store.period_label(d, period) for d in date_uniques]
+    period_codes, period_uniques = _factorize(period_of_date)
+    period_codes = period_codes[date_codes]
+
+    combined = (worker_codes * len(site_uniques) + site_codes) * len(period_uniques) + period_codes
+    groups, inverse = np.unique(combined, return_inverse=True)
+    valid = ~np.isnan(hours)
+    totals = np.bincount(inverse, weights=np.where(valid, hours, 0.0), minlength=len(groups))
+    rows = np.bincount(inverse, minlength=len(groups))
+    invalid_rows = np.bincount(inverse, weights=~valid, minlength=len(groups))
+
+    report = []
+    for group, total, row_count, invalid_count in zip(groups.tolist(), totals.tolist(), rows.tolist(),
+                                                       invalid_rows.tolist()):
+        rest, period_code = divmod(group, len(period_uniques))
+        worker_code, site_code = divmod(rest, len(site_uniques))
+        report.append({
+            "name": worker_uniques[worker_code],
+            "baustelle": site_uniques[site_code],
+            "periodo": period_uniques[period_code],
+            "stunden": round(total, 2),
+            "filas": row_count,
+            "filas_sin_horas": int(invalid_count),
+        })
+    report.sort(key=lambda row: (row["periodo"], row["baustelle"], row["name"]))
+    return report
+
+
+def report_from_store(baustelle=None, date_from=None, date_to=None, period="mes"):
+    """Recalcula las horas de todas las filas de Personal del almacén y las agrega por periodo."""
+    columns = entry_store.get_store().personal_columns(baustelle, date_from, date_to)
+    hours = calculate_arbeitszeit_batch(columns["von"], columns["bis"], columns["pause_minuten"])
+    return aggregate_hours(hours, columns["name"], columns["baustelle"], columns["datum"], period)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Informe de horas por trabajador, Baustelle y periodo")
+    parser.add_argument("--baustelle")
+    parser.add_argument("--desde", help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument("--hasta", help="Fecha final YYYY-MM-DD")
+    parser.add_argument("--periodo", choices=entry_store.PERIODS, default="mes")
+    args = parser.parse_args(argv)
+
+    report = report_from_store(args.baustelle, args.desde, args.hasta, args.periodo)
+    if not report:
+        print("(sin resultados)")
+        return
+    for row in report:
+        print(f"{row['periodo']}  {row['baustelle']:<25} {row['name']:<25} {row['stunden']:>8.2f} h"
+              f"  ({row['filas']} filas, {row['filas_sin_horas']} sin horas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# transcription_backends.py
+# Backends de transcripción: cómo se carga y se ejecuta el modelo Whisper en cada tipo de
+# hardware (GPU en fp16, CPU en fp32 o CPU con cuantización dinámica int8), elección
+# automática del modelo según la memoria disponible y el RTF objetivo, y registro del
+# RTF (segundos de cálculo por segundo de audio) conseguido en cada transcripción.
+#
+# Uso desde la línea de comandos (RTF medidos y modelo que se elegiría ahora):
+#   python -m Modulos.transcription_backends
+import ctypes
+import json
+import os
+import threading
+
+# Importar configuraciones
+import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
+
+torch = lazy_modules.lazy_import("torch")
+whisper = lazy_modules.lazy_import("whisper")
+
+try:
+    import psutil  # Opcional: núcleos físicos y memoria disponible más precisos
+except ImportError:
+    psutil = None
+
+# Modelos candidatos de mayor a menor con la memoria que necesitan (GB, según el README de Whisper)
+MODEL_CANDIDATES = [("large-v2", 10), ("medium", 5), ("small", 2), ("base", 1), ("tiny", 1)]
+
+# RTF aproximados con 4 hilos de CPU, solo hasta que haya medidas propias en TRANSCRIPTION_STATS_PATH
+_ESTIMATED_RTF = {
+    "cpu-int8": {"large-v2": 1.5, "medium": 0.7, "small": 0.25, "base": 0.08, "tiny": 0.04},
+    "cpu-fp32": {"large-v2": 3.0, "medium": 1.4, "small": 0.5, "base": 0.15, "tiny": 0.08},
+}
+_ESTIMATE_THREADS = 4
+
+
+def physical_cpu_count():
+    if psutil is not None:
+        count = psutil.cpu_count(logical=False)
+        if count:
+            return count
+    return os.cpu_count() or 1
+
+
+def cpu_thread_count():
+    return config.TORCH_NUM_THREADS or physical_cpu_count()
+
+
+class _MemoryStatusEx(ctypes.Structure):
+    _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+
+def available_memory_gb(device="cpu"):
+    """Memoria libre (GB) de la GPU o de la RAM, o None si no se puede averiguar."""
+    try:
+        if device.startswith("cuda"):
+            free_bytes, _ = torch.cuda.mem_get_info()
+            return free_bytes / 1024 ** 3
+        if psutil is not None:
+            return psutil.virtual_memory().available / 1024 ** 3
+        if os.name == "nt":
+            status = _MemoryStatusEx()
+            status.dwLength = ctypes.sizeof(_MemoryStatusEx)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys / 1024 ** 3
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024 ** 3
+    except Exception:
+        return None
+
+
+class TranscriptionBackend:
+    """Carga un modelo Whisper y ejecuta model.transcribe con las opciones de su hardware."""
+
+    name = None
+    device = None
+    fp16 = False
+
+    def is_available(self):
+        return True
+
+    def load(self, model_name):
+        return whisper.load_model(model_name, device=self.device)
+
+    def transcribe(self, model, audio, **options):
+        return model.transcribe(audio, fp16=self.fp16, **options)
+
+
+class CudaFp16Backend(TranscriptionBackend):
+    name = "cuda-fp16"
+    device = "cuda"
+    fp16 = True
+
+    def is_available(self):
+        return torch.cuda.is_available()
+
+
+_cpu_threads_configured = False
+
+
+def configure_cpu_threads():
+    """Ajusta los hilos de PyTorch a los núcleos físicos (o a TORCH_NUM_THREADS) una sola vez."""
+    global _cpu_threads_configured
+    if _cpu_threads_configured:
+        return
+    threads = cpu_thread_count()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(max(1, min(4, threads // 2)))
+    except RuntimeError:
+        pass  # Solo se puede cambiar antes del primer trabajo en paralelo de PyTorch
+    _cpu_threads_configured = True
+    print(f"🧵 PyTorch usará {threads} hilo(s) de CPU.")
+
+
+class CpuFp32Backend(TranscriptionBackend):
+    name = "cpu-fp32"
+    device = "cpu"
+
+    def load(self, model_name):
+        configure_cpu_threads()
+        return super().load(model_name)
+
+
+def quantize_whisper_model(model):
+    """Cuantización dinámica int8 de las capas lineales (pesos int8, activaciones en fp32)."""
+    # quantize_dynamic solo sustituye módulos cuyo tipo es exactamente nn.Linear, y Whisper usa
+    # una subclase (whisper.model.Linear) que solo adapta el dtype de los pesos en forward
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class CpuInt8Backend(CpuFp32Backend):
+    name = "cpu-int8"
+
+    def load(self, model_name):
+        return quantize_whisper_model(super().load(model_name))
+
+
+BACKENDS = {backend.name: backend for backend in (CudaFp16Backend(), CpuInt8Backend(), CpuFp32Backend())}
+
+
+def get_backend(name=None):
+    """
+    Backend por nombre (None = config.TRANSCRIPTION_BACKEND). "default" elige GPU o CPU fp32,
+    "auto" GPU o CPU int8.
+    """
+    name = name or config.TRANSCRIPTION_BACKEND
+    if name in ("default", "auto"):
+        cpu_backend = "cpu-int8" if name == "auto" else "cpu-fp32"
+        name = "cuda-fp16" if BACKENDS["cuda-fp16"].is_available() else cpu_backend
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend de transcripción desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+
+
+# --- RTF medidos ---
+_stats_lock = threading.Lock()
+
+
+def _load_stats():
+    try:
+        with open(config.TRANSCRIPTION_STATS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _stats_key(backend_name, model_name):
+    return f"{backend_name}|{model_name}"
+
+
+def record_rtf(backend_name, model_name, audio_seconds, elapsed_seconds):
+    """Imprime el RTF de una transcripción y lo acumula en TRANSCRIPTION_STATS_PATH. Devuelve el RTF."""
+    if audio_seconds <= 0:
+        return None
+    rtf = elapsed_seconds / audio_seconds
+    print(f"⏱️ RTF {rtf:.2f} ({audio_seconds:.1f} s de audio en {elapsed_seconds:.1f} s; "
+          f"{model_name}, {backend_name})")
+    with _stats_lock:
+        stats = _load_stats()
+        entry = stats.setdefault(_stats_key(backend_name, model_name),
+                                 {"audio_seconds": 0.0, "elapsed_seconds": 0.0, "runs": 0})
+        entry["audio_seconds"] += audio_seconds
+        entry["elapsed_seconds"] += elapsed_seconds
+        entry["runs"] += 1
+        entry["threads"] = cpu_thread_count()
+        try:
+            os.makedirs(os.path.dirname(config.TRANSCRIPTION_STATS_PATH), exist_ok=True)
+            tmp_path = config.TRANSCRIPTION_STATS_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=2)
+            os.replace(tmp_path, config.TRANSCRIPTION_STATS_PATH)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el RTF medido: {e}")
+    return rtf
+
+
+def measured_rtf(backend_name, model_name):
+    """RTF medio medido para (backend, modelo), o None si aún no hay medidas."""
+    entry = _load_stats().get(_stats_key(backend_name, model_name))
+    if not entry or entry["audio_seconds"] <= 0:
+        return None
+    return entry["elapsed_seconds"] / entry["audio_seconds"]
+
+
+def expected_rtf(backend_name, model_name):
+    """RTF medido si lo hay; si no, la estimación aproximada escalada a los hilos disponibles."""
+    rtf = measured_rtf(backend_name, model_name)
+    if rtf is not None:
+        return rtf
+    estimate = _ESTIMATED_RTF.get(backend_name, {}).get(model_name)
+    if estimate is None:
+        return None  # Sin estimación (GPU): se asume que cumple el objetivo
+    return estimate * _ESTIMATE_THREADS / cpu_thread_count()
+
+
+def select_model(backend, target_rtf=None):
+    """El mayor modelo que cabe en la memoria libre y cuyo RTF esperado no supera target_rtf."""
+    target_rtf = target_rtf or config.TRANSCRIPTION_TARGET_RTF
+    memory_gb = available_memory_gb(backend.device)
+    for model_name, required_gb in MODEL_CANDIDATES:
+        if memory_gb is not None and required_gb > memory_gb:
+            continue
+        rtf = expected_rtf(backend.name, model_name)
+        if rtf is None or rtf <= target_rtf:
+            return model_name
+    return MODEL_CANDIDATES[-1][0]
+
+
+def main():
+    backend = get_backend()
+    memory_gb = available_memory_gb(backend.device)
+    memory_text = f"{memory_gb:.1f} GB libres" if memory_gb is not None else "memoria libre desconocida"
+    print(f"Backend: {backend.name} ({memory_text}, {cpu_thread_count()} hilo(s) de CPU)")
+    print(f"Modelo elegido con RTF objetivo {config.TRANSCRIPTION_TARGET_RTF}: {select_model(backend)}")
+    stats = _load_stats()
+    if not stats:
+        print("(aún no hay RTF medidos)")
+        return
+    print("\nRTF medidos:")
+    for key, entry in sorted(stats.items()):
+        backend_name, model_name = key.split("|", 1)
+        rtf = entry["elapsed_seconds"] / entry["audio_seconds"] if entry["audio_seconds"] else float("nan")
+        print(f"  {backend_name:<10} {model_name:<10} RTF {rtf:5.2f}  "
+              f"({entry['runs']} transcripciones, {entry['audio_seconds'] / 60:.1f} min de audio)")
+
+
+if __name__ == "__main__":
+    main()
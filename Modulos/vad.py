@@ -0,0 +1,126 @@
+# vad.py
+# Detección de voz (VAD) por energía y tasa de cruces por cero, sin modelos ni red.
+# Se analiza el audio en tramas de VAD_FRAME_MS con operaciones de NumPy sobre todas
+# las tramas a la vez; los tramos de silencio largos se eliminan antes de pasar el
+# audio a Whisper, conservando un mapa de tiempos hacia la grabación original.
+
+# Importar configuraciones
+import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
+
+np = lazy_modules.lazy_import("numpy")
+
+# Las consonantes sordas ("s", "sch", "f") tienen poca energía pero muchos cruces por cero;
+# se aceptan hasta estos dB por debajo del umbral si su ZCR es alta
+_ZCR_ENERGY_SLACK_DB = 6.0
+
+
+def settings_signature():
+    """Parámetros que afectan al audio recortado (forman parte de la clave de caché), o None sin VAD."""
+    if not config.VAD_ENABLED:
+        return None
+    return [config.VAD_FRAME_MS, config.VAD_ENERGY_MARGIN_DB, config.VAD_MIN_ENERGY_DB,
+            config.VAD_ZCR_THRESHOLD, config.VAD_PADDING_MS, config.VAD_MIN_SILENCE_MS]
+
+
+class VadResult:
+    """Audio sin silencios y los tramos (en muestras) de la grabación original que se conservaron."""
+
+    def __init__(self, samples, segments, sample_rate, original_length):
+        self.samples = samples
+        self.segments = segments  # array (n, 2) de [inicio, fin) en muestras originales
+        self.sample_rate = sample_rate
+        self.original_length = original_length
+
+    @property
+    def original_seconds(self):
+        return self.original_length / self.sample_rate
+
+    @property
+    def kept_seconds(self):
+        return len(self.samples) / self.sample_rate
+
+    @property
+    def removed_seconds(self):
+        return self.original_seconds - self.kept_seconds
+
+    def to_original_time(self, seconds):
+        """Convierte un instante del audio recortado (p. ej. de un segmento de Whisper) al original."""
+        if len(self.segments) == 0:
+            return seconds
+        lengths = self.segments[:, 1] - self.segments[:, 0]
+        trimmed_starts = np.cumsum(lengths) - lengths
+        position = seconds * self.sample_rate
+        index = max(int(np.searchsorted(trimmed_starts, position, side="right")) - 1, 0)
+        return (self.segments[index, 0] + position - trimmed_starts[index]) / self.sample_rate
+
+    def summary_line(self):
+        percent = 100.0 * self.removed_seconds / self.original_seconds if self.original_length else 0.0
+        return (f"✂️ VAD: {self.removed_seconds:.1f} s de silencio eliminados de {self.original_seconds:.1f} s "
+                f"({percent:.0f}%), {len(self.segments)} tramo(s) con voz.")
+
+
+def frame_features(samples, frame_length):
+    """Energía (dBFS) y tasa de cruces por cero de cada trama; la última se rellena con ceros."""
+    n_frames = -(-len(samples) // frame_length)
+    padded = np.zeros(n_frames * frame_length, dtype=np.float32)
+    padded[:len(samples)] = samples
+    frames = padded.reshape(n_frames, frame_length)
+    # einsum evita el array temporal de frames ** 2 en grabaciones largas
+    power = np.einsum("ij,ij->i", frames, frames) / frame_length
+    energy_db = 10.0 * np.log10(power + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_length - 1)
+    return energy_db, zcr
+
+
+def _speech_runs(mask):
+    """Inicios y finales (exclusivos) de los tramos True de una máscara booleana."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+
+def speech_segments(samples, sample_rate):
+    """Tramos [inicio, fin) en muestras que contienen voz, ya con margen y silencios cortos unidos."""
+    frame_length = max(int(sample_rate * config.VAD_FRAME_MS / 1000), 2)
+    energy_db, zcr = frame_features(samples, frame_length)
+    if len(energy_db) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Umbral adaptativo: ruido de fondo (percentil 10) más un margen, nunca por debajo del mínimo absoluto
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + config.VAD_ENERGY_MARGIN_DB, config.VAD_MIN_ENERGY_DB)
+    speech = (energy_db > threshold) | \
+             ((energy_db > threshold - _ZCR_ENERGY_SLACK_DB) & (zcr > config.VAD_ZCR_THRESHOLD))
+
+    starts, ends = _speech_runs(speech)
+    if len(starts) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Margen alrededor de cada tramo y unión de los separados por silencios cortos
+    pad_frames = int(config.VAD_PADDING_MS / config.VAD_FRAME_MS)
+    min_silence_frames = max(int(config.VAD_MIN_SILENCE_MS / config.VAD_FRAME_MS), 1)
+    starts = np.maximum(starts - pad_frames, 0)
+    ends = np.minimum(ends + pad_frames, len(speech))
+    keep_gap = (starts[1:] - ends[:-1]) >= min_silence_frames
+    starts = np.concatenate((starts[:1], starts[1:][keep_gap]))
+    ends = np.concatenate((ends[:-1][keep_gap], ends[-1:]))
+
+    segments = np.stack((starts, ends), axis=1).astype(np.int64) * frame_length
+    np.minimum(segments, len(samples), out=segments)
+    return segments
+
+
+def trim_silence(samples, sample_rate):
+    """
+    Elimina los silencios largos de un array float32 mono.
+    Si no se detecta voz, el resultado tiene 0 muestras; quien llama decide qué hacer.
+    """
+    segments = speech_segments(samples, sample_rate)
+    if len(segments) == 1 and segments[0, 0] == 0 and segments[0, 1] == len(samples):
+        trimmed = samples
+    elif len(segments):
+        trimmed = np.concatenate([samples[start:end] for start, end in segments])
+    else:
+        trimmed = samples[:0]
+    return VadResult(trimmed, segments, sample_rate, len(samples))
@@ -1,35 +1,71 @@
 # main.py
 from datetime import datetime
+import argparse
+import threading
 import traceback
-import torch  # Para la comprobación inicial de CUDA
 
-# Importar módulos del proyecto
+# Importar módulos del proyecto (las dependencias pesadas se cargan al usarse, ver lazy_modules)
 import Modulos.config as config
+import Modulos.lazy_modules as lazy_modules
 import Modulos.audio_processing as audio_processing
 import Modulos.llm_interaction as llm_interaction
-import Modulos.excel_processing as excel_processing
+import Modulos.entry_processing as entry_processing
+import Modulos.entry_pipeline as entry_pipeline
+import Modulos.batch_processing as batch_processing
+import Modulos.result_cache as result_cache
+import Modulos.site_workbooks as site_workbooks
+import Modulos.transcription_backends as transcription_backends
+import Modulos.metrics as metrics
+
+torch = lazy_modules.lazy_import("torch")  # Para la comprobación inicial de CUDA
 
 
 def perform_initial_checks():
     """Realiza y muestra comprobaciones iniciales del sistema."""
-    print("--- Comprobaciones Iniciales ---")
-    print(f"PyTorch version: {torch.__version__}")
+    # Se imprime todo de una vez: en modo interactivo se ejecuta en segundo plano
+    lines = ["--- Comprobaciones Iniciales ---", f"PyTorch version: {torch.__version__}"]
     cuda_available = torch.cuda.is_available()
-    print(f"CUDA available: {cuda_available}")
+    lines.append(f"CUDA available: {cuda_available}")
     if cuda_available:
-        print(f"CUDA version: {torch.version.cuda}")
+        lines.append(f"CUDA version: {torch.version.cuda}")
+        try:
+            lines.append(f"GPU name: {torch.cuda.get_device_name(0)}")
+            lines.append(f"GPU capability: {torch.cuda.get_device_capability(0)}")
+        except Exception as e:
+            lines.append(f"Error al obtener detalles de la GPU: {e}")
+    lines.append(f"Backend de transcripción: {transcription_backends.get_backend().name}")
+    lines.append("-" * 30)
+    print("\n" + "\n".join(lines))
+
+
+def start_background_startup(preload_model=True):
+    """
+    Comprobaciones iniciales y precarga de Whisper en un hilo de fondo, para que la
+    lista de micrófonos aparezca sin esperar a importar torch/whisper. Devuelve el hilo.
+    """
+    def _startup():
         try:
-            print(f"GPU name: {torch.cuda.get_device_name(0)}")
-            print(f"GPU capability: {torch.cuda.get_device_capability(0)}")
+            perform_initial_checks()
         except Exception as e:
-            print(f"Error al obtener detalles de la GPU: {e}")
-    print("-" * 30)
+            print(f"\n⚠️ Error en las comprobaciones iniciales: {e}")
+        if preload_model:
+            try:
+                audio_processing.get_whisper_model()
+            except Exception as e:
+                print(f"\n⚠️ No se pudo precargar el modelo Whisper: {e}")
+
+    thread = threading.Thread(target=_startup, name="startup", daemon=True)
+    thread.start()
+    return thread
 
 
 def main_workflow():
     """Flujo principal de la aplicación Bautagebuch."""
     print("--- Sistema de Llenado de Bautagebuch por Voz ---")
 
+    # Comprobaciones y carga de Whisper en segundo plano mientras el usuario elige el micrófono
+    start_background_startup(preload_model=config.WHISPER_PRELOAD_AT_STARTUP)
+
     # Seleccionar micrófono (actualiza config.SELECTED_MICROPHONE_INDEX)
     audio_processing.listar_y_seleccionar_microfono()
 
@@ -43,68 +79,153 @@ def main_workflow():
         # Si se eligió predeterminado, se usará.
         pass  # La configuración del micrófono ya está gestionada.
 
-    while True:
-        current_date_str = config.get_current_date_str()
-        print(f"\n--- Nueva Entrada para el Bautagebuch ({current_date_str}) ---")
-
-        # 1. Grabar audio
-        # record_audio_until_stopped usará config.SELECTED_MICROPHONE_INDEX internamente
-        audio_data_combinado = audio_processing.record_audio_until_stopped(stop_event_text="parar")
+    if config.PIPELINE_MODE:
+        pipelined_entry_loop()
+    else:
+        sequential_entry_loop()
 
-        if audio_data_combinado == "STOP_PROGRAM":
-            print("Programa finalizado por el usuario.")
-            break
-        if not audio_data_combinado:
-            print("No se pudo obtener el audio.")
-            if input("¿Quieres intentar grabar de nuevo? (s/n): ").lower() != 's':
-                break
-            continue
+    site_workbooks.flush_all()
+    result_cache.print_cache_stats()
+    print("\n--- Sistema finalizado ---")
 
-        # 2. Transcribir el audio combinado
-        transcribed_text = audio_processing.transcribe_with_whisper(audio_data_combinado)
-        if not transcribed_text:
-            print("No se pudo obtener la transcripción.")
-            if input("¿Quieres intentar grabar de nuevo (desde el principio)? (s/n): ").lower() != 's':
-                break
-            continue
 
-        # 3. Extraer Datos con LLM
-        bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(transcribed_text, current_date_str)
-        if not bautagebuch_data:
-            print("No se pudieron extraer los datos del Bautagebuch.")
-            if input("¿Quieres intentar grabar de nuevo (desde el principio)? (s/n): ").lower() != 's':
+def pipelined_entry_loop():
+    """
+    Graba las entradas una tras otra; cada grabación terminada se procesa en segundo
+    plano (transcripción, LLM, txt/Excel) mientras el usuario dicta la siguiente.
+    """
+    pipeline = entry_pipeline.EntryPipeline()
+    try:
+        while True:
+            current_date_str = config.get_current_date_str()
+            pending = pipeline.pending_count()
+            pending_info = f", {pending} en proceso" if pending else ""
+            print(f"\n--- Nueva Entrada para el Bautagebuch ({current_date_str}{pending_info}) ---")
+
+            # Todas las etapas de esta entrada comparten un trace_id en el log de métricas
+            with metrics.trace():
+                # En modo streaming la transcripción avanza mientras se graba
+                transcriber = audio_processing.StreamingTranscriber() if config.STREAMING_TRANSCRIPTION else None
+                audio_data_combinado = audio_processing.record_audio_until_stopped(
+                    stop_event_text="parar", on_phrase=transcriber.feed if transcriber else None)
+
+                if audio_data_combinado == "STOP_PROGRAM" or not audio_data_combinado:
+                    if transcriber:
+                        transcriber.cancel()
+                    if audio_data_combinado == "STOP_PROGRAM":
+                        print("Programa finalizado por el usuario.")
+                        break
+                    print("No se pudo obtener el audio.")
+                    if input("¿Quieres intentar grabar de nuevo? (s/n): ").lower() != 's':
+                        break
+                    continue
+
+                pipeline.submit(current_date_str, audio_data=audio_data_combinado, transcriber=transcriber)
+
+            if input("\n¿Quieres realizar otra entrada para el Bautagebuch? (s/n): ").lower() != 's':
                 break
-            continue
+    finally:
+        pipeline.close()
 
-        # Asegurarse de que el campo "Datum" tenga un valor, usando el del schema y el actual.
-        # El schema JSON ya tiene "Datum" como campo esperado.
-        if "Datum" not in bautagebuch_data or not bautagebuch_data.get("Datum") \
-                or bautagebuch_data.get("Datum") == "YYYY-MM-DD":  # Si el LLM no lo llenó
-            bautagebuch_data["Datum"] = current_date_str
 
-        # 4. Guardar detalles en archivo de texto y rellenar Excel
-        excel_processing.save_extended_text_details(bautagebuch_data, current_date_str)
+def sequential_entry_loop():
+    """Graba y procesa cada entrada de forma secuencial antes de pasar a la siguiente."""
+    while True:
+        current_date_str = config.get_current_date_str()
+        print(f"\n--- Nueva Entrada para el Bautagebuch ({current_date_str}) ---")
 
-        if bautagebuch_data:  # Solo si tenemos datos
-            excel_output_path = excel_processing.fill_excel_bautagebuch(bautagebuch_data)
-            if excel_output_path:
-                # El mensaje de éxito ya se imprime dentro de fill_excel_bautagebuch
-                pass
+        # Todas las etapas de esta entrada comparten un trace_id en el log de métricas
+        with metrics.trace():
+            # 1-2. Grabar y transcribir el audio
+            # record_audio_until_stopped usará config.SELECTED_MICROPHONE_INDEX internamente
+            if config.STREAMING_TRANSCRIPTION:
+                # La transcripción avanza mientras se graba; al parar solo queda la última ventana
+                transcribed_text = audio_processing.record_and_transcribe_streaming(stop_event_text="parar")
+                if transcribed_text == "STOP_PROGRAM":
+                    print("Programa finalizado por el usuario.")
+                    break
             else:
+                audio_data_combinado = audio_processing.record_audio_until_stopped(stop_event_text="parar")
+
+                if audio_data_combinado == "STOP_PROGRAM":
+                    print("Programa finalizado por el usuario.")
+                    break
+                if not audio_data_combinado:
+                    print("No se pudo obtener el audio.")
+                    if input("¿Quieres intentar grabar de nuevo? (s/n): ").lower() != 's':
+                        break
+                    continue
+
+                try:
+                    transcribed_text = audio_processing.transcribe_with_whisper(audio_data_combinado)
+                finally:
+                    audio_data_combinado.close()  # Libera el búfer de captura (y su archivo temporal)
+
+            if not transcribed_text:
+                print("No se pudo obtener la transcripción.")
+                if input("¿Quieres intentar grabar de nuevo (desde el principio)? (s/n): ").lower() != 's':
+                    break
+                continue
+
+            # 3. Extraer Datos con LLM
+            bautagebuch_data = llm_interaction.extract_bautagebuch_data_with_llm(transcribed_text, current_date_str)
+            if not bautagebuch_data:
+                print("No se pudieron extraer los datos del Bautagebuch.")
+                if input("¿Quieres intentar grabar de nuevo (desde el principio)? (s/n): ").lower() != 's':
+                    break
+                continue
+
+            # Asegurarse de que el campo "Datum" tenga un valor, usando el del schema y el actual.
+            entry_processing.complete_bautagebuch_data(bautagebuch_data, current_date_str)
+
+            # 4. Guardar detalles en archivo de texto y rellenar Excel
+            excel_output_path = entry_processing.render_entry(bautagebuch_data, current_date_str,
+                                                              transcribed_text=transcribed_text)
+            if not excel_output_path:
+                # El mensaje de éxito ya se imprime dentro de fill_excel_bautagebuch
                 print("⚠️ No se pudo rellenar o guardar el archivo Excel.")
-        else:  # Aunque este caso es poco probable si los pasos anteriores tuvieron éxito
-            print("⚠️ No hay datos del Bautagebuch para procesar en Excel.")
 
         if input("\n¿Quieres realizar otra entrada para el Bautagebuch? (s/n): ").lower() != 's':
             break
 
-    print("\n--- Sistema finalizado ---")
+
+def parse_arguments():
+    """Argumentos de línea de comandos. Sin argumentos se usa el modo interactivo con micrófono."""
+    parser = argparse.ArgumentParser(description="Sistema de Llenado de Bautagebuch por Voz")
+    parser.add_argument("--batch", metavar="RUTA",
+                        help="Procesa sin interacción una carpeta o patrón glob de archivos de audio")
+    parser.add_argument("--llm-workers", type=int, default=None,
+                        help=f"Peticiones simultáneas a Ollama en modo lote (por defecto {config.BATCH_LLM_WORKERS})")
+    parser.add_argument("--excel-workers", type=int, default=None,
+                        help=f"Procesos que escriben Excel en modo lote (por defecto {config.BATCH_EXCEL_WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocesa también los archivos que ya figuran como procesados")
+    parser.add_argument("--serve", action="store_true",
+                        help="Modo servidor: recibe dictados por HTTP y los procesa con un único proceso del modelo")
+    parser.add_argument("--host", default=None, help=f"Dirección del servidor (por defecto {config.SERVER_HOST})")
+    parser.add_argument("--port", type=int, default=None, help=f"Puerto del servidor (por defecto {config.SERVER_PORT})")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Muestra el desglose del tiempo de importación al arrancar y termina")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    perform_initial_checks()
+    args = parse_arguments()
     try:
-        main_workflow()
+        if args.profile_startup:
+            # Importación diferida: solo hace falta para este diagnóstico
+            import Modulos.startup_profile as startup_profile
+            startup_profile.print_startup_profile()
+        elif args.serve:
+            # Importación diferida: asyncio y multiprocessing solo hacen falta en este modo
+            import Modulos.server as server
+            server.run_server(args.host, args.port)
+        elif args.batch:
+            perform_initial_checks()
+            batch_processing.run_batch(args.batch, llm_workers=args.llm_workers,
+                                       excel_workers=args.excel_workers, force=args.force)
+        else:
+            main_workflow()
     except KeyboardInterrupt:
         print("\n👋 Programa interrumpido por el usuario (Ctrl+C general).")
     except Exception as e_main:
@@ -0,0 +1,5 @@
+# Las pruebas importan los módulos como el programa (import Modulos.x) desde la raíz del repositorio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+# El escritor rápido de la plantilla (excel_template) debe dar el mismo contenido que openpyxl
+import json
+import os
+
+import openpyxl
+import pytest
+
+import Modulos.config as config
+import Modulos.excel_processing as excel_processing
+import Modulos.excel_template as excel_template
+import Modulos.fake_ollama as fake_ollama
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BautagebuchVorlage.xlsx")
+
+
+def _entry(**changes):
+    data = json.loads(json.dumps(fake_ollama.DEFAULT_RESPONSE))
+    data.update(changes)
+    return data
+
+
+ENTRIES = [
+    _entry(),
+    _entry(Personal=[], Wetter="", Temperatur=None),
+    _entry(Baustelle="  Haus A  ", Auftrag="#N/A", Ausgefuehrte_Arbeiten="Fenster <OG> & Türen \"neu\"\nZeile 2"),
+    _entry(Personal=[{"Baustellenpersonal_Typ": "Helfer", "Name": "Ali", "von": "22:00", "bis": "02:30",
+                      "Pause_Minuten": "abc", "Arbeitszeit_Stunden": 0}]),
+]
+
+
+def _cells(path):
+    ws = openpyxl.load_workbook(path).active
+    return {cell.coordinate: (cell.value, cell.style_id, cell.data_type)
+            for row in ws.iter_rows() for cell in row}
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EXCEL_TEMPLATE_PATH", TEMPLATE_PATH)
+    monkeypatch.setattr(config, "FILLED_EXCEL_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "METRICS_ENABLED", False)
+    return tmp_path
+
+
+@pytest.mark.parametrize("entry", ENTRIES)
+def test_fast_writer_matches_openpyxl(entry, output_dir, monkeypatch):
+    monkeypatch.setattr(config, "EXCEL_FAST_WRITER", True)
+    fast_path = excel_processing.fill_excel_bautagebuch(entry, output_filename="fast.xlsx")
+    monkeypatch.setattr(config, "EXCEL_FAST_WRITER", False)
+    slow_path = excel_processing.fill_excel_bautagebuch(entry, output_filename="openpyxl.xlsx")
+    assert fast_path and slow_path
+    assert _cells(fast_path) == _cells(slow_path)
+
+
+def test_render_sheet_leaves_formulas_to_openpyxl():
+    template = excel_template.ExcelTemplate(TEMPLATE_PATH)
+    assert template.render_sheet({"A1": "=SUM(B1:B2)"}) is None
+    assert template.render_sheet({"A1": "Text"}) is not None
+
+
+def test_get_template_is_cached():
+    assert excel_template.get_template(TEMPLATE_PATH) is excel_template.get_template(TEMPLATE_PATH)
@@ -0,0 +1,48 @@
+# El análisis incremental de la respuesta en streaming debe dar lo mismo que parse_llm_json_response
+import json
+
+import pytest
+
+import Modulos.fake_ollama as fake_ollama
+import Modulos.llm_interaction as llm_interaction
+
+ENTRY = dict(fake_ollama.DEFAULT_RESPONSE,
+             Kundenanweisungen='Tür "B" {links} versetzen, Pfad C:\\Bau\\',
+             Materialanlieferungen="[2 Paletten], 3 × Silikon")
+
+RESPONSES = [
+    json.dumps(ENTRY, ensure_ascii=False),
+    json.dumps(ENTRY, ensure_ascii=False, indent=2),
+    "Hier ist das JSON:\n```json\n" + json.dumps(ENTRY, ensure_ascii=False, indent=2) + "\n```\n",
+    "Gerne! " + json.dumps(ENTRY) + "\nIch hoffe, das hilft.",
+]
+
+
+def _feed(text, chunk_size):
+    parser = llm_interaction.IncrementalJSONObjectParser()
+    fields = []
+    for start in range(0, len(text), chunk_size):
+        fields.extend(parser.feed(text[start:start + chunk_size]))
+    return parser, fields
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 10_000])
+@pytest.mark.parametrize("response", RESPONSES)
+def test_streamed_fields_match_full_parse(response, chunk_size):
+    expected = llm_interaction.parse_llm_json_response(response)
+    parser, fields = _feed(response, chunk_size)
+    assert parser.complete
+    assert json.loads(parser.object_text) == expected
+    # Cada campo de primer nivel se entrega una vez, en orden, en cuanto se cierra
+    assert fields == list(expected.items())
+
+
+def test_stops_at_the_end_of_the_first_object():
+    parser, _ = _feed('{"Baustelle": "Haus A"} {"Baustelle": "Haus B"}', 5)
+    assert json.loads(parser.object_text) == {"Baustelle": "Haus A"}
+
+
+def test_incomplete_object_is_not_complete():
+    parser, fields = _feed('{"Baustelle": "Haus A", "Personal": [{"Name": "Jan"', 4)
+    assert not parser.complete
+    assert fields == [("Baustelle", "Haus A")]
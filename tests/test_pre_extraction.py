@@ -0,0 +1,78 @@
+# Reglas de pre-extracción: solo deben rellenar los campos sin ambigüedad y dejar el resto al LLM
+import json
+
+import pytest
+
+import Modulos.config as config
+import Modulos.pre_extraction as pre_extraction
+
+PEOPLE = [
+    {"Name": "Jan Kowalski", "Baustellenpersonal_Typ": "Monteur", "Alias": ["Jan"]},
+    {"Name": "Piotr Nowak", "Baustellenpersonal_Typ": "Helfer", "Alias": ["Piotr"]},
+]
+
+
+def _times(personal):
+    return [(person["Name"], person["von"], person["bis"], person["Pause_Minuten"]) for person in personal]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Jan Kowalski und Piotr Nowak von sieben bis sechzehn Uhr, fünfundvierzig Minuten Pause.",
+     [("Jan Kowalski", "07:00", "16:00", "45"), ("Piotr Nowak", "07:00", "16:00", "45")]),
+    ("Jan von sieben bis halb fünf, eine halbe Stunde Pause.", [("Jan Kowalski", "07:00", "16:30", "30")]),
+    ("Jan von 7:15 bis 15:45 Uhr ohne Pause. Piotr von 8 bis 17 Uhr mit 60 Minuten Pause.",
+     [("Jan Kowalski", "07:15", "15:45", "0"), ("Piotr Nowak", "08:00", "17:00", "60")]),
+    ("Arbeitszeit für alle von 7 bis 16 Uhr, 45 Minuten Pause. Jan und Piotr waren da.",
+     [("Jan Kowalski", "07:00", "16:00", "45"), ("Piotr Nowak", "07:00", "16:00", "45")]),
+])
+def test_extract_personal(text, expected):
+    assert _times(pre_extraction.extract_personal(text, PEOPLE)) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # Pausa o horario de otra persona
+    "Jan von 7 bis 16 Uhr mit 30 Minuten Pause. Piotr von 8 bis 17 Uhr.",
+    "Jan von 7 bis 16 Uhr. Piotr war auch da.",
+    # Dos turnos de la misma persona
+    "Jan von 6 bis 14 Uhr. Nachmittags Jan von 15 bis 18 Uhr.",
+    # Horarios que no se pueden pasar a la tarde sin dudas
+    "Jan von 13 bis 12 Uhr.",
+    "Jan von 8 bis 8 Uhr.",
+    "Jan von 22 bis 6 Uhr.",
+    # Alguien que no está en el personal conocido
+    "Jan und Herr Becker von 7 bis 16 Uhr, 30 Minuten Pause.",
+    "Jan von 7 bis 16 Uhr, Markus von 8 bis 17 Uhr, 30 Minuten Pause.",
+    # Sin horario
+    "Jan hat die Fenster eingebaut.",
+])
+def test_extract_personal_leaves_ambiguous_cases_to_the_llm(text):
+    assert pre_extraction.extract_personal(text, PEOPLE) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Wetter bewölkt, acht Grad, schwacher Wind.", {"Wetter": "bewölkt", "Temperatur": "8", "Wind": "schwach"}),
+    ("Heute sonnig bei minus 3 Grad.", {"Wetter": "sonnig", "Temperatur": "-3"}),
+    ("Wetter sonnig, 20 Grad. Das Blech wurde um 45 Grad gebogen.", {"Wetter": "sonnig", "Temperatur": "20"}),
+    ("Morgens minus 3 Grad, dann am Nachmittag 6 Grad.", {}),
+    ("Das Rohr mit 90 Grad Bogen verlegt.", {}),
+])
+def test_extract_weather(text, expected):
+    assert pre_extraction.extract_weather(text) == expected
+
+
+def test_time_ranges_need_a_time_marker():
+    assert pre_extraction.find_time_ranges("2 bis 3 Paletten geliefert.") == []
+    assert [r[2:] for r in pre_extraction.find_time_ranges("von 7 bis 16 Uhr")] == [("07:00", "16:00")]
+
+
+def test_pre_extract_uses_the_known_workers_of_the_site(tmp_path, monkeypatch):
+    path = tmp_path / "personal.json"
+    path.write_text(json.dumps({"Musterstraße 12, Köln": {"Alias": ["Musterstraße"], "Personal": PEOPLE}}),
+                    encoding="utf-8")
+    monkeypatch.setattr(config, "KNOWN_WORKERS_PATH", str(path))
+    fields = pre_extraction.pre_extract("Baustelle Musterstraße. Jan von 7 bis 16 Uhr, 30 Minuten Pause.",
+                                        "2026-03-02")
+    assert fields["Datum"] == "2026-03-02"
+    assert fields["Baustelle"] == "Musterstraße 12, Köln"
+    assert _times(fields["Personal"]) == [("Jan Kowalski", "07:00", "16:00", "30")]
+    assert fields["Personal"][0]["Baustellenpersonal_Typ"] == "Monteur"
@@ -0,0 +1,58 @@
+# Equivalencia del cálculo vectorizado de timesheet con excel_processing.calculate_arbeitszeit
+import itertools
+import math
+import random
+
+import pytest
+
+import Modulos.excel_processing as excel_processing
+import Modulos.timesheet as timesheet
+
+TIMES = ["07:00", "16:30", "7:5", "00:00", "23:59", "24:00", "12:60", "07:00:00", " 07:00", "07:00 ",
+         "07.00", "7 Uhr", "Unbekannt", "HH:MM", "hh:mm", "", None, 7, ["07:00"]]
+PAUSES = ["0", "30", "45", "-30", " 30", "30.5", 30, 30.5, "abc", "None", None, "", 600, 10 ** 15]
+
+
+def _scalar(von, bis, pause):
+    result = excel_processing.calculate_arbeitszeit(von, bis, pause)
+    return math.nan if result is None else result
+
+
+def _assert_same(expected, actual):
+    assert len(expected) == len(actual)
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        assert (math.isnan(e) and math.isnan(a)) or e == a, f"fila {i}: {e!r} != {a!r}"
+
+
+def test_batch_matches_scalar_on_all_combinations():
+    rows = list(itertools.product(TIMES, TIMES, PAUSES))
+    von, bis, pause = (list(column) for column in zip(*rows))
+    _assert_same([_scalar(*row) for row in rows], timesheet.calculate_arbeitszeit_batch(von, bis, pause).tolist())
+
+
+def test_batch_matches_scalar_on_random_rows():
+    rng = random.Random(13)
+    times = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(0, 60, 5)]
+    rows = [(rng.choice(times), rng.choice(times), str(rng.randrange(0, 120, 15))) for _ in range(20_000)]
+    von, bis, pause = (list(column) for column in zip(*rows))
+    _assert_same([_scalar(*row) for row in rows], timesheet.calculate_arbeitszeit_batch(von, bis, pause).tolist())
+
+
+def test_batch_rejects_columns_of_different_length():
+    with pytest.raises(ValueError):
+        timesheet.calculate_arbeitszeit_batch(["07:00"], ["16:00", "17:00"], ["30"])
+
+
+def test_aggregate_hours_groups_by_iso_week():
+    hours = [8.0, 7.5, math.nan, 6.0]
+    workers = ["Jan", "Jan", "Jan", "Piotr"]
+    sites = ["Haus A"] * 4
+    # 2026-01-01 es jueves de la semana ISO 1; 2025-12-29 es lunes de la misma semana
+    dates = ["2025-12-29", "2026-01-01", "2026-01-02", "2026-01-05"]
+    report = timesheet.aggregate_hours(hours, workers, sites, dates, period="semana")
+    assert report == [
+        {"name": "Jan", "baustelle": "Haus A", "periodo": "2026-W01", "stunden": 15.5, "filas": 3,
+         "filas_sin_horas": 1},
+        {"name": "Piotr", "baustelle": "Haus A", "periodo": "2026-W02", "stunden": 6.0, "filas": 1,
+         "filas_sin_horas": 0},
+    ]
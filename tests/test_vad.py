@@ -0,0 +1,73 @@
+# VAD: las tramas vectorizadas coinciden con un cálculo trama a trama y el mapa de tiempos
+# devuelve, para cada muestra del audio recortado, su posición en la grabación original
+import math
+
+import numpy as np
+import pytest
+
+import Modulos.vad as vad
+
+SAMPLE_RATE = 16000
+
+
+def _tone(seconds, frequency=180.0, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def _silence(seconds, rng):
+    return rng.normal(0, 0.0005, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+
+@pytest.fixture
+def dictation():
+    """Silencio 1,5 s, voz 1 s, silencio 3 s, voz 2 s, silencio 0,4 s (corto: se conserva), voz 1 s, silencio 2 s."""
+    rng = np.random.default_rng(15)
+    parts = [_silence(1.5, rng), _tone(1.0), _silence(3.0, rng), _tone(2.0, 220), _silence(0.4, rng),
+             _tone(1.0, 140), _silence(2.0, rng)]
+    return np.concatenate(parts)
+
+
+def test_frame_features_match_per_frame_loop(dictation):
+    frame_length = 480
+    energy_db, zcr = vad.frame_features(dictation, frame_length)
+    for index in range(len(energy_db)):
+        frame = np.zeros(frame_length, dtype=np.float64)
+        chunk = dictation[index * frame_length:(index + 1) * frame_length]
+        frame[:len(chunk)] = chunk
+        expected_db = 10.0 * math.log10(float(np.mean(frame ** 2)) + 1e-10)
+        crossings = sum(1 for a, b in zip(frame[:-1], frame[1:]) if math.copysign(1, a) != math.copysign(1, b))
+        assert energy_db[index] == pytest.approx(expected_db, abs=1e-3)
+        assert zcr[index] == pytest.approx(crossings / (frame_length - 1))
+
+
+def test_long_silences_are_removed(dictation):
+    result = vad.trim_silence(dictation, SAMPLE_RATE)
+    # Los dos tramos separados por 0,4 s se unen; el silencio de 3 s y los extremos se eliminan
+    assert len(result.segments) == 2
+    assert 3.5 < result.removed_seconds < 6.5
+    assert result.original_seconds == pytest.approx(len(dictation) / SAMPLE_RATE)
+
+
+def test_time_map_points_to_the_same_samples(dictation):
+    result = vad.trim_silence(dictation, SAMPLE_RATE)
+    rng = np.random.default_rng(0)
+    positions = np.concatenate((rng.integers(0, len(result.samples), 500),
+                                np.cumsum(result.segments[:, 1] - result.segments[:, 0])[:-1]))
+    for position in positions.tolist():
+        original = round(result.to_original_time(position / SAMPLE_RATE) * SAMPLE_RATE)
+        assert dictation[original] == result.samples[position]
+
+
+def test_speech_with_only_short_pauses_is_returned_unchanged():
+    rng = np.random.default_rng(1)
+    speech = np.concatenate([part for _ in range(10) for part in (_tone(0.2), _silence(0.1, rng))] + [_tone(0.2)])
+    result = vad.trim_silence(speech, SAMPLE_RATE)
+    assert result.samples is speech
+    assert result.to_original_time(1.25) == pytest.approx(1.25)
+
+
+def test_silence_only_gives_no_samples():
+    result = vad.trim_silence(np.zeros(SAMPLE_RATE * 2, dtype=np.float32), SAMPLE_RATE)
+    assert len(result.samples) == 0 and len(result.segments) == 0
+    assert result.to_original_time(0.5) == 0.5